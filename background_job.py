@@ -0,0 +1,27 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+import time
+
+
+class JobSignals(QObject):
+    # QRunnable isn't a QObject, so it needs this to report back to the GUI thread
+    finished = pyqtSignal(object, float, str)  # result, seconds, error ("" on success)
+
+
+class BackgroundJob(QRunnable):
+    # Runs function(*args, **kwargs) on a thread pool and reports the result back on the GUI thread through
+    # signals.finished. For long computations on data that doesn't change under them (compiled trees,
+    # model snapshots). Keep a reference to the job until it reported back
+    def __init__(self, function, *args, **kwargs):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            result, error = self.function(*self.args, **self.kwargs), ""
+        except Exception as e:
+            result, error = None, str(e) or type(e).__name__
+        self.signals.finished.emit(result, time.perf_counter() - start, error)
@@ -0,0 +1,70 @@
+from PyQt5.QtCore import QCoreApplication, QObject, QThreadPool, pyqtSignal
+import time
+from background_job import BackgroundJob
+from skill_tree_model import save_tree
+
+
+def write_snapshot(filepath, snapshot, token):
+    # Serializes a TreeSnapshot and writes it atomically. Returns "" on success or the error message
+    try:
+        save_tree(filepath, snapshot, token)
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return ""
+
+
+class BackgroundSaver(QObject):
+    # Serializes and writes tree snapshots on a thread pool of its own so the GUI never waits on json,
+    # and waiting for saves never waits on unrelated BackgroundJobs (simulations, layouts) as well.
+    # Saves to the same file never overlap: while one is running only the newest requested snapshot
+    # is kept, older queued ones are reported as "superseded".
+    saved = pyqtSignal(str, str, float, str)  # filepath, token, seconds, error ("" on success)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.running = {}  # filepath -> BackgroundJob
+        self.queued = {}  # filepath -> (snapshot, token)
+
+    def save(self, filepath, snapshot, token):
+        if filepath in self.running:
+            replaced = self.queued.get(filepath)
+            self.queued[filepath] = (snapshot, token)
+            if replaced:
+                self.saved.emit(filepath, replaced[1], 0.0, "superseded")
+            return
+        self.start(filepath, snapshot, token)
+
+    def start(self, filepath, snapshot, token):
+        job = BackgroundJob(save_tree, filepath, snapshot, token)
+        job.signals.finished.connect(
+            lambda result, seconds, error: self.on_job_finished(filepath, token, seconds, error))
+        self.running[filepath] = job  # keep the job (and its signals) alive until it reported back
+        self.pool.start(job)
+
+    def on_job_finished(self, filepath, token, seconds, error):
+        self.running.pop(filepath, None)
+        self.saved.emit(filepath, token, seconds, error)
+        if filepath in self.queued:
+            snapshot, token = self.queued.pop(filepath)
+            self.start(filepath, snapshot, token)
+
+    def is_busy(self):
+        return bool(self.running or self.queued)
+
+    def wait(self):
+        # Blocks until every running and queued save reported back
+        while self.is_busy():
+            self.pool.waitForDone()
+            QCoreApplication.processEvents()  # deliver the finished signals
+
+    def save_now(self, filepath, snapshot, token):
+        # Blocking save on the calling thread, for when the app is about to exit. A queued save of the
+        # same file is dropped and reported as superseded, like save() does
+        self.pool.waitForDone()
+        replaced = self.queued.pop(filepath, None)
+        if replaced:
+            self.saved.emit(filepath, replaced[1], 0.0, "superseded")
+        start = time.perf_counter()
+        error = write_snapshot(filepath, snapshot, token)
+        return time.perf_counter() - start, error
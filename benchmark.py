@@ -0,0 +1,213 @@
+# Performance benchmarks of the editor on synthetic trees (see synthetic_tree.py). Runs the real
+# MainWindow without a display (QT_QPA_PLATFORM=offscreen), one fresh process per tree size so peak
+# memory is per size, and stores the results as JSON named after the current git commit.
+#     python benchmark.py [--sizes 1000 10000 100000 500000] [--seed 0] [--tracemalloc]
+#     python benchmark.py --compare benchmark_results/old.json benchmark_results/new.json
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmark_results")
+HOVER_SAMPLES = 1000
+DRAG_NODES = 100
+DRAG_FRAMES = 30
+AUTOSAVE_EDITS = 100
+BULK_DELETE_FRACTION = 0.01
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def current_rss_bytes():
+    # Resident memory right now (ru_maxrss is only the peak). None where /proc isn't available
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def benchmark_size(size, seed, trace_memory):
+    # Runs every benchmark on one tree size inside the current process. Returns a result dict
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QPoint
+    from PyQt5.QtTest import QTest
+    from skill_node import NODE_RADIUS
+    from synthetic_tree import generate_tree
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    rng = random.Random(seed)
+    result = {"nodes": size}
+    workdir = tempfile.mkdtemp(prefix="skill_tree_benchmark_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # MainWindow always works on skill_tree/ in the working directory
+    try:
+        os.makedirs("skill_tree")
+        save_file = "skill_tree/skill_tree.json"
+        generate_tree(size, seed=seed).save(save_file)
+        result["file_mb"] = round(os.path.getsize(save_file) / 1e6, 2)
+
+        from main_window import MainWindow
+        gc.collect()
+        rss_before = current_rss_bytes()
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        window = MainWindow()
+        result["load_s"] = round(time.perf_counter() - start, 4)
+        gc.collect()
+        if trace_memory:
+            traced, peak = tracemalloc.get_traced_memory()
+            result["load_peak_traced_mb"] = round(peak / 1e6, 1)
+            result["python_bytes_per_node"] = round(traced / size)  # model + python side of the scene
+            tracemalloc.stop()
+        if rss_before is not None:
+            # Everything the loaded tree costs: model, scene items, Qt's side of them, journal, undo
+            result["bytes_per_node"] = round((current_rss_bytes() - rss_before) / size)
+        result["edges"] = window.model.edge_count()
+        window.show()
+        app.processEvents()
+
+        result["save_s"] = round(timed(window.save_skill_tree, save_file, True), 4)
+
+        node_ids = window.model.node_ids()
+        for node_id in rng.sample(node_ids, min(AUTOSAVE_EDITS, len(node_ids))):
+            record = window.model.record(node_id)
+            window.model.move_node(node_id, record.x + window.GRID_SIZE, record.y)
+        result["autosave_ms"] = round(timed(window.auto_save_skill_tree) * 1000, 3)
+
+        # Real mouse moves onto a node and off again, through the view and scene hover handling
+        # (big trees are virtualized, node_item materializes the node if needed)
+        hover_ids = rng.sample(node_ids, min(HOVER_SAMPLES, len(node_ids)))
+        viewport = window.view.viewport()
+        hover_seconds = 0.0
+        for node_id in hover_ids:
+            node = window.node_item(node_id)
+            window.view.centerOn(node)
+            node_pos = window.view.mapFromScene(node.pos())
+            node.invalidate_tooltip()  # worst case, nothing cached
+            hover_seconds += timed(QTest.mouseMove, viewport, node_pos)
+            QTest.mouseMove(viewport, node_pos + QPoint(0, 3 * NODE_RADIUS))
+        result["hover_ms"] = round(hover_seconds * 1000 / len(hover_ids), 4)
+
+        # Hubs (the first nodes) have the most connections, drag a mix of them and random nodes
+        drag_ids = node_ids[:10] + rng.sample(node_ids, min(DRAG_NODES - 10, len(node_ids)))
+        window.dragging_nodes = [window.node_item(node_id) for node_id in dict.fromkeys(drag_ids)]
+        window.view.last_mouse_pos = QPoint(100, 100)
+        frame_times = []
+        for frame in range(1, DRAG_FRAMES + 1):
+            frame_times.append(timed(window.on_left_click_drag, QPoint(100 + frame * 3, 100 + frame * 2)))
+        window.dragging_nodes = None
+        window.auto_save_skill_tree()
+        frame_times.sort()
+        result["drag_frame_ms"] = round(frame_times[len(frame_times) // 2] * 1000, 3)
+        result["drag_frame_max_ms"] = round(frame_times[-1] * 1000, 3)
+
+        window.scene.clearSelection()
+        for node_id in rng.sample(node_ids, max(1, int(len(node_ids) * BULK_DELETE_FRACTION))):
+            window.node_item(node_id).setSelected(True)
+        result["bulk_delete_nodes"] = len(window.scene.selectedItems())
+        result["bulk_delete_s"] = round(timed(window.delete_selected_nodes), 4)
+
+        window.saver.wait()
+        window.journal.wait()
+        result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # kB on linux
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_all(sizes, seed, trace_memory):
+    # Every size in its own process, results come back as the last line of its stdout
+    results = []
+    for size in sizes:
+        command = [sys.executable, os.path.join(REPO_DIR, "benchmark.py"), "--single-size", str(size), "--seed", str(seed)]
+        if trace_memory:
+            command.append("--tracemalloc")
+        print(f"Benchmarking {size} nodes...", flush=True)
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode:
+            print(process.stderr)
+            results.append({"nodes": size, "error": process.stderr.strip().splitlines()[-1:]})
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        print("  " + ", ".join(f"{key} {value}" for key, value in result.items() if key != "nodes"))
+        results.append(result)
+    return results
+
+
+def compare(old_path, new_path):
+    # Prints new / old for every metric of every size both files have
+    with open(old_path) as file:
+        old = {result["nodes"]: result for result in json.load(file)["results"]}
+    with open(new_path) as file:
+        new = {result["nodes"]: result for result in json.load(file)["results"]}
+    for size in sorted(old.keys() & new.keys()):
+        print(f"{size} nodes:")
+        for key, value in new[size].items():
+            before = old[size].get(key)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before and key != "nodes":
+                print(f"  {key:22} {before:>12} -> {value:>12}  x{value / before:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill tree editor benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace python allocations while loading (slower)")
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--single-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.single_size:
+        print(json.dumps(benchmark_size(args.single_size, args.seed, args.tracemalloc)))
+        return
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": run_all(args.sizes, args.seed, args.tracemalloc),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
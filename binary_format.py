@@ -0,0 +1,187 @@
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+# Compact binary save format (.stb), written next to / instead of skill_tree.json.
+# Everything is little-endian and every section starts 8-byte aligned, so the file can be
+# memory-mapped and the sections used as typed memoryviews without copying or parsing:
+#
+#   header        MAGIC, version, flags, node_count, edge_count, string_count, string_blob_size, snapshot_token
+#   string_ends   u64[string_count]  end offset of every string in the blob
+#   string_blob   utf-8 bytes of all unique strings (names, descriptions, upgrade types)
+#   node_ids      i64[node_count]
+#   positions     f64[node_count * 2]  x, y. i64 instead when FLAG_INTEGER_POSITIONS is set
+#   upgrades      u32[node_count * 3]  string index of name, description, upgrade_type, NO_STRING for None
+#   edge_ends     u32[node_count]  CSR end offset of every node's prerequisites in edge_sources
+#   edge_sources  u32[edge_count]  node index (not id) of each prerequisite
+#
+# Prerequisite order is kept as is. Postrequisites aren't stored, they are rebuilt from the
+# prerequisites in node order when loading.
+#
+# Positions are stored as integers when every coordinate of the tree is an int (hand-written and
+# generated trees), so converting json -> .stb -> json gives back the same file. Otherwise they are
+# all stored as floats.
+
+MAGIC = b"STRB"
+VERSION = 2  # 2 added the flags and NO_STRING
+BINARY_EXTENSION = ".stb"
+HEADER = struct.Struct("<4sHHIIIQ32s")  # magic, version, flags, nodes, edges, strings, blob size, token
+FLAG_INTEGER_POSITIONS = 1
+NO_STRING = 0xFFFFFFFF  # string index of a missing (None) string, e.g. the upgrade_type of hand-edited files
+
+
+def is_binary_file(filepath):
+    with open(filepath, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def padding(size):
+    return b"\0" * (-size % 8)
+
+
+def little_endian(values):
+    # array() is native endian, the file is always little-endian
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def write_binary(filepath, tree, snapshot_token=None):
+    # tree is a SkillTreeModel or TreeSnapshot. Written to a temp file and renamed over, like the json saves
+    strings = {}  # string -> index, shared between all nodes
+
+    def intern(text):
+        if text is None:
+            return NO_STRING
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    node_index = {node_id: index for index, node_id in enumerate(tree.nodes)}
+    node_ids = array("q", tree.nodes)
+    integer_positions = all(type(record.x) is int and type(record.y) is int for record in tree.nodes.values())
+    positions = array("q" if integer_positions else "d")
+    upgrades = array("I")
+    edge_ends = array("I")
+    edge_sources = array("I")
+    for node_id, record in tree.nodes.items():
+        positions.append(record.x)
+        positions.append(record.y)
+        upgrades.append(intern(record.upgrade.name))
+        upgrades.append(intern(record.upgrade.description))
+        upgrades.append(intern(record.upgrade.upgrade_type))
+        edge_sources.extend(node_index[src_id] for src_id in tree.prerequisites[node_id])
+        edge_ends.append(len(edge_sources))
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_ends = array("Q")
+    blob_size = 0
+    for data in encoded:
+        blob_size += len(data)
+        string_ends.append(blob_size)
+
+    token = (snapshot_token or "").encode("ascii")
+    temp_path = filepath + ".tmp"
+    with open(temp_path, "wb") as file:
+        flags = FLAG_INTEGER_POSITIONS if integer_positions else 0
+        file.write(HEADER.pack(MAGIC, VERSION, flags, len(node_ids), len(edge_sources), len(encoded), blob_size, token))
+        file.write(padding(HEADER.size))
+        file.write(little_endian(string_ends).tobytes())
+        file.write(b"".join(encoded))
+        file.write(padding(blob_size))
+        for section in (node_ids, positions, upgrades, edge_ends, edge_sources):
+            data = little_endian(section).tobytes()
+            file.write(data)
+            file.write(padding(len(data)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, filepath)
+
+
+class BinaryTree:
+    # Read-only view of a .stb file. Sections are memoryviews straight into the mapped file, so opening
+    # is O(1) and only the parts that get touched are read from disk.
+    #   with BinaryTree(path) as tree:
+    #       tree.node_ids[i], tree.positions[2 * i], tree.string(tree.upgrades[3 * i]), tree.prerequisite_indices(i)
+    # positions are ints or floats depending on the file (see FLAG_INTEGER_POSITIONS), missing strings are None
+    def __init__(self, filepath):
+        self.file = open(filepath, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic, version, flags, self.node_count, self.edge_count, self.string_count, blob_size, token = \
+            HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filepath} is not a binary skill tree file")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"{filepath} uses binary format version {version}, newest supported is {VERSION}")
+        self.snapshot_token = token.rstrip(b"\0").decode("ascii") or None
+
+        self.offset = HEADER.size + len(padding(HEADER.size))
+        self.views = []
+        self.string_ends = self.section(view, "Q", self.string_count)
+        self.string_blob = view[self.offset:self.offset + blob_size]
+        self.offset += blob_size + len(padding(blob_size))
+        self.node_ids = self.section(view, "q", self.node_count)
+        self.positions = self.section(view, "q" if flags & FLAG_INTEGER_POSITIONS else "d", self.node_count * 2)
+        self.upgrades = self.section(view, "I", self.node_count * 3)
+        self.edge_ends = self.section(view, "I", self.node_count)
+        self.edge_sources = self.section(view, "I", self.edge_count)
+        self.views += [self.string_blob, view]
+        self.strings = [None] * self.string_count  # decoded lazily
+
+    def section(self, view, typecode, count):
+        size = struct.calcsize(typecode) * count
+        values = view[self.offset:self.offset + size].cast(typecode)
+        self.offset += size + len(padding(size))
+        if sys.byteorder == "big":
+            values = little_endian(array(typecode, values))  # swap once into a native copy
+        else:
+            self.views.append(values)
+        return values
+
+    def string(self, index):
+        if index == NO_STRING:
+            return None
+        text = self.strings[index]
+        if text is None:
+            start = self.string_ends[index - 1] if index else 0
+            text = self.strings[index] = str(self.string_blob[start:self.string_ends[index]], "utf-8")
+        return text
+
+    def prerequisite_indices(self, index):
+        start = self.edge_ends[index - 1] if index else 0
+        return self.edge_sources[start:self.edge_ends[index]]
+
+    def close(self):
+        # All memoryviews into the map have to be released before it can be closed
+        for view in getattr(self, "views", []):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def convert(src_path, dst_path):
+    # Lossless conversion between skill_tree.json and .stb, direction picked from the file contents
+    from skill_tree_model import SkillTreeModel
+    model = SkillTreeModel()
+    model.load(src_path)
+    model.save(dst_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python binary_format.py <source .json|.stb> <destination .json|.stb>")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
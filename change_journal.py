@@ -0,0 +1,319 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from skill_tree_model import ModelEvent, CycleError, tree_to_dict, write_json_atomic, read_snapshot_token
+from upgrade import Upgrade
+
+RECORD_ENCODER = json.JSONEncoder(separators=(",", ":"))  # json.dumps would build a new encoder per record
+
+
+class ChangeJournal:
+    # Append-only log of edits made to a SkillTreeModel. Autosaving only appends the records of the
+    # edits since the last autosave instead of rewriting the whole tree. Every compact_every records
+    # the journal gets folded into a full snapshot on a background thread. The GUI thread never waits
+    # for that thread: a compaction asked for while one is still writing is queued behind it.
+    #
+    # Files (all next to each other):
+    #  - journal_path: the live journal, one JSON record per line
+    #  - journal_path + ".compacting": the previous journal while its snapshot is being written
+    #  - journal_path + ".saving": records set aside while a full save to skill_tree.json is running
+    #  - snapshot_path: last compacted full tree, same layout as skill_tree.json
+    # Every journal segment starts with a "base" header naming the snapshot_token of the saved tree it
+    # was recorded on top of. On startup the base whose token shows up last in the journal chain is
+    # loaded and everything from that header on is replayed, so a crash at any point during a
+    # compaction or a full save never replays records twice or drops them.
+    def __init__(self, model, journal_path, snapshot_path, compact_every=2000):
+        self.model = model
+        self.journal_path = journal_path
+        self.compacting_path = journal_path + ".compacting"
+        self.saving_path = journal_path + ".saving"
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+
+        self.pending = []  # records that still have to be appended
+        self.pending_moves = {}  # node_id -> index in pending, so a drag only leaves its last position
+        self.records_since_compaction = 0
+        self.records_written = 0  # total records appended (or recovered) this session
+        self.records_saved = 0  # records_written at the start of the last successful full save
+        self.full_saves = {}  # snapshot_token -> records_written, for full saves still running
+        self.compaction_thread = None
+        self.queued_compaction = None  # (snapshot, token, generation) to write when the running one is done
+        self.set_aside_count = 0  # generation of the set aside files, bumped by every set_aside
+        self.snapshot_obsolete = False  # the running compaction's snapshot is older than a full save (or discarded)
+        self.lock = threading.Lock()  # set aside files are shared with the compaction thread
+        self.recording = True  # off while replaying
+        self.base_token = None  # snapshot_token of the saved tree new records apply to
+
+        self.model.add_listener(self.on_model_event)
+
+    def on_model_event(self, event, *args):
+        if not self.recording:
+            return
+        if event == ModelEvent.NODE_ADDED:
+            record = self.model.record(args[0])
+            self.append({"op": "add_node", "id": args[0], "x": record.x, "y": record.y,
+                         "upgrade": upgrade_to_dict(record.upgrade)})
+        elif event == ModelEvent.NODE_REMOVED:
+            self.append({"op": "delete_node", "id": args[0]})
+        elif event == ModelEvent.NODE_MOVED:
+            self.append_move(args[0])
+        elif event == ModelEvent.NODES_MOVED:
+            for node_id in args[0]:
+                self.append_move(node_id)
+        elif event == ModelEvent.UPGRADE_CHANGED:
+            self.append({"op": "upgrade", "id": args[0], "upgrade": upgrade_to_dict(self.model.record(args[0]).upgrade)})
+        elif event == ModelEvent.EDGE_ADDED:
+            self.append({"op": "add_edge", "src": args[0], "dst": args[1]})
+        elif event == ModelEvent.EDGE_REMOVED:
+            self.append({"op": "remove_edge", "src": args[0], "dst": args[1]})
+        elif event == ModelEvent.RESET:
+            # The whole tree was replaced, start over from a full snapshot
+            self.pending.clear()
+            self.pending_moves.clear()
+            self.records_written += 1
+            self.compact()
+
+    def append(self, record):
+        # Anything after a move may depend on it (e.g. delete), so moves can't be merged past it
+        self.pending_moves.clear()
+        self.pending.append(record)
+
+    def append_move(self, node_id):
+        record = self.model.record(node_id)
+        move = {"op": "move", "id": node_id, "x": record.x, "y": record.y}
+        index = self.pending_moves.get(node_id)
+        if index is not None:
+            self.pending[index] = move  # only the last position matters
+        else:
+            self.pending_moves[node_id] = len(self.pending)
+            self.pending.append(move)
+
+    def flush(self):
+        # Appends the pending records to the journal. Cost is proportional to the edits, not the tree
+        written = self.write_pending()
+        if self.records_since_compaction >= self.compact_every and not self.full_saves:
+            self.compact()
+        return written
+
+    def write_pending(self):
+        if not self.pending:
+            return 0
+        encode = RECORD_ENCODER.encode
+        lines = "".join(encode(record) + "\n" for record in self.pending)
+        if not os.path.exists(self.journal_path):
+            lines = json.dumps({"op": "base", "token": self.base_token}) + "\n" + lines
+        with open(self.journal_path, "a") as file:
+            file.write(lines)
+        written = len(self.pending)
+        self.records_since_compaction += written
+        self.records_written += written
+        self.pending.clear()
+        self.pending_moves.clear()
+        return written
+
+    def set_aside(self, src_path, dst_path):
+        # Moves a journal file to dst_path, appending if dst_path already holds older segments
+        if not os.path.exists(src_path):
+            return
+        with self.lock:
+            if os.path.exists(dst_path):
+                with open(src_path, "r") as src, open(dst_path, "a") as dst:
+                    dst.write(src.read())
+                os.remove(src_path)
+            else:
+                os.replace(src_path, dst_path)
+            self.set_aside_count += 1
+
+    def compact(self):
+        # Takes a snapshot of the model here and serializes + writes it on a background thread
+        self.write_pending()
+        self.set_aside(self.journal_path, self.compacting_path)
+        self.base_token = uuid.uuid4().hex
+        self.records_since_compaction = 0
+        compaction = (self.model.snapshot(), self.base_token, self.set_aside_count)
+        with self.lock:
+            self.snapshot_obsolete = False  # the queued snapshot replaces it anyway
+            if self.compaction_thread:
+                # Only one compaction at a time. The newest snapshot covers an older queued one
+                self.queued_compaction = compaction
+                return
+            # Not a daemon, so a compaction still running when the app closes gets to finish
+            thread = self.compaction_thread = threading.Thread(target=self.write_snapshots, args=compaction)
+        thread.start()
+
+    def write_snapshots(self, snapshot, token, generation):
+        # Compaction thread. Writes the snapshot, then the queued ones until there are none left
+        while True:
+            try:
+                write_json_atomic(self.snapshot_path, tree_to_dict(snapshot, token))
+                written = True
+            except OSError as e:
+                print(f"Journal compaction failed: {e}")  # the set aside journals still have everything
+                written = False
+            with self.lock:
+                if self.snapshot_obsolete:
+                    if os.path.exists(self.snapshot_path):
+                        os.remove(self.snapshot_path)
+                elif written and generation == self.set_aside_count:
+                    # Nothing was set aside since the snapshot was taken, so it contains all of it
+                    for path in (self.compacting_path, self.saving_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                if not self.queued_compaction:
+                    self.snapshot_obsolete = False
+                    self.compaction_thread = None
+                    return
+                snapshot, token, generation = self.queued_compaction
+                self.queued_compaction = None
+
+    def wait(self):
+        # Blocks until the running and queued compactions are done. Not needed by the editor itself
+        thread = self.compaction_thread
+        while thread:
+            thread.join()
+            thread = self.compaction_thread
+
+    # ---- Full saves ----
+    def begin_full_save(self):
+        # Called on the GUI thread right before a full save to skill_tree.json. Returns the snapshot to
+        # save and the token it has to be saved with. Records after this point go to a fresh journal on
+        # top of the new save, the older ones are kept in .saving until the save made it to disk
+        self.write_pending()
+        self.set_aside(self.journal_path, self.compacting_path)
+        self.set_aside(self.compacting_path, self.saving_path)
+        token = uuid.uuid4().hex
+        self.base_token = token
+        self.records_since_compaction = 0
+        self.full_saves[token] = self.records_written
+        return self.model.snapshot(), token
+
+    def finish_full_save(self, token, success):
+        # Called once the full save with this token is done (or failed)
+        records_written = self.full_saves.pop(token, None)
+        if records_written is None or token != self.base_token and not success:
+            return
+        if not success:
+            # Records after the save were made on top of a file that never got written
+            self.compact()
+            return
+        self.records_saved = max(self.records_saved, records_written)
+        if token == self.base_token:
+            # Newest save is on disk, everything set aside before it is obsolete. So is the snapshot of a
+            # compaction that is still running, it was taken before this save
+            with self.lock:
+                self.snapshot_obsolete = self.compaction_thread is not None
+                for path in (self.saving_path, self.snapshot_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def has_unsaved_changes(self):
+        return bool(self.pending) or self.records_written > self.records_saved
+
+    @contextmanager
+    def suspended(self):
+        # Model changes made inside this block are not journaled (loading, replaying, full saves)
+        recording = self.recording
+        self.recording = False
+        try:
+            yield
+        finally:
+            self.recording = recording
+
+    # ---- Recovery ----
+    def read_segments(self):
+        # Returns [(base_token, [records])] for every journal segment, oldest first
+        segments = []
+        for path in (self.saving_path, self.compacting_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from a crash mid-write
+                    if record["op"] == "base":
+                        segments.append((record["token"], []))
+                    elif segments:
+                        segments[-1][1].append(record)
+        return segments
+
+    def recover(self, save_file):
+        # Loads the newest base and replays the journal over it. Returns how many records were replayed
+        segments = self.read_segments()
+        bases = [path for path in (self.snapshot_path, save_file) if os.path.exists(path)]
+        tokens = {path: read_snapshot_token(path) for path in bases}
+        if not bases:
+            tokens[None] = None  # fresh tree, journal was recorded from nothing
+        base, start = (bases[0] if bases else None), len(segments)
+        for index, (token, _) in enumerate(segments):
+            for path, base_token in tokens.items():
+                if base_token == token:
+                    base, start = path, index  # the latest matching segment wins
+
+        applied = 0
+        with self.suspended():
+            if base:
+                self.model.load(base)
+            else:
+                self.model.clear()
+            for _, records in segments[start:]:
+                for record in records:
+                    self.apply(record)
+                    applied += 1
+
+        self.base_token = tokens[base]
+        self.records_written = self.records_saved = 0
+        if segments or base == self.snapshot_path:
+            self.records_written = 1  # recovered changes that aren't in skill_tree.json yet
+        if segments:
+            self.compact()  # fold them into a fresh snapshot so the chain starts clean
+        return applied
+
+    def apply(self, record):
+        # Records are absolute (positions, upgrade values, explicit ids), so they can be applied blindly
+        op = record["op"]
+        model = self.model
+        if op == "add_node":
+            if record["id"] not in model:
+                model.add_node(record["x"], record["y"], upgrade_from_dict(record["upgrade"]), node_id=record["id"])
+        elif op == "delete_node":
+            model.remove_node(record["id"])
+        elif op == "move":
+            if record["id"] in model:
+                model.move_node(record["id"], record["x"], record["y"])
+        elif op == "upgrade":
+            if record["id"] in model:
+                upgrade = record["upgrade"]
+                model.set_upgrade(record["id"], upgrade["name"], upgrade["description"], upgrade["upgrade_type"])
+        elif op == "add_edge":
+            try:
+                model.add_edge(record["src"], record["dst"])
+            except CycleError:
+                pass  # only possible on top of a cyclic file from before cycles were rejected
+        elif op == "remove_edge":
+            model.remove_edge(record["src"], record["dst"])
+
+    def discard(self):
+        # Forgets all unsaved changes (called when exiting without saving). A compaction that is still
+        # writing removes its snapshot itself once it's done
+        self.pending.clear()
+        self.pending_moves.clear()
+        self.records_since_compaction = 0
+        self.records_saved = self.records_written
+        with self.lock:
+            self.queued_compaction = None
+            self.snapshot_obsolete = self.compaction_thread is not None
+            for path in (self.journal_path, self.compacting_path, self.saving_path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def upgrade_to_dict(upgrade):
+    return {"name": upgrade.name, "description": upgrade.description, "upgrade_type": upgrade.upgrade_type}
+
+
+def upgrade_from_dict(data):
+    return Upgrade(data["name"], data["description"], data["upgrade_type"])
@@ -1,8 +1,16 @@
 from PyQt5.QtWidgets import QGraphicsLineItem, QGraphicsPolygonItem
 from PyQt5.QtGui import QPen, QPolygonF
 from PyQt5.QtCore import Qt, QLineF, QPointF
+from level_of_detail import LOD_POINTS, LOD_NO_ARROWS
 import math
 
+
+class ArrowHead(QGraphicsPolygonItem):
+    # Arrowhead of a ConnectionLine, not drawn when zoomed far out
+    def paint(self, painter, option, widget=None):
+        if option.levelOfDetailFromTransform(painter.worldTransform()) >= LOD_NO_ARROWS:
+            super().paint(painter, option, widget)
+
 class ConnectionLine(QGraphicsLineItem):
     def __init__(self, start_node, end_node=None):
         super().__init__()
@@ -10,12 +18,21 @@ class ConnectionLine(QGraphicsLineItem):
         self.end_node = end_node  # This is None while following mouse
 
         self.setPen(QPen(Qt.black, 2))
-        self.arrow_head = QGraphicsPolygonItem(self)
+        self.hairline_pen = QPen(Qt.black, 0)  # width 0 is always one pixel
+        self.arrow_head = ArrowHead(self)
         self.arrow_head.setPen(QPen(Qt.black))
         self.arrow_head.setBrush(Qt.black)
 
         self.update_position()
 
+    def paint(self, painter, option, widget=None):
+        # Zoomed far out a plain hairline is enough
+        if option.levelOfDetailFromTransform(painter.worldTransform()) < LOD_POINTS:
+            painter.setPen(self.hairline_pen)
+            painter.drawLine(self.line())
+        else:
+            super().paint(painter, option, widget)
+
     def update_position(self, mouse_pos=None):
         # Call while moving mouse or on dest. node
         start_center = self.start_node.sceneBoundingRect().center()
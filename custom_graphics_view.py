@@ -1,6 +1,15 @@
 from PyQt5.QtWidgets import QGraphicsView, QRubberBand
-from PyQt5.QtCore import Qt, QRect, QPoint, QSize
+from PyQt5.QtCore import Qt, QRect, QPoint, QSize, QLineF, QTimer
+from PyQt5.QtGui import QPen
 from mouse_state import MouseState
+import math
+
+MIN_GRID_PIXELS = 8  # grid lines closer than this on screen get thinned out
+RUBBER_BAND_MIN_PIXELS = 4  # smaller bands count as a plain click
+MIN_ZOOM = 0.02  # enough to see the whole 20000x20000 scene
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.15  # per wheel notch
+FRAME_INTERVAL_MS = 16  # drag / temp line updates are coalesced to one per frame (~60 fps)
 
 
 class CustomGraphicsView(QGraphicsView):
@@ -12,12 +21,52 @@ class CustomGraphicsView(QGraphicsView):
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)  # Keeps transformations (zooming, panning) centered around the cursor.
 
         # Init the rubber band selection box
-        # self.rubber_band = QRubberBand(QRubberBand.Rectangle, self)
-        # self.rubber_band_origin = QPoint()
+        self.rubber_band = QRubberBand(QRubberBand.Rectangle, self)
+        self.rubber_band_origin = QPoint()
 
         # Variables for panning
         self.last_mouse_pos = QPoint(0, 0)
 
+        # Mouse moves while dragging nodes or placing a connection only store the position, the
+        # frame timer applies the latest one at most once per frame
+        self.pending_move_pos = None
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(FRAME_INTERVAL_MS)
+        self.frame_timer.timeout.connect(self.apply_pending_move)
+
+        # Grid is painted straight into the background, so it costs no scene items
+        self.grid_pen = QPen(Qt.lightGray)
+        self.grid_pen.setCosmetic(True)  # 1 pixel wide at any zoom
+
+    def drawBackground(self, painter, rect):
+        # Draws grid lines for just the exposed part of the scene, aligned to GRID_SIZE
+        super().drawBackground(painter, rect)
+        if not self.main_window.grid_visible:
+            return
+        rect = rect.intersected(self.sceneRect())
+        if rect.isEmpty():
+            return
+        # When zoomed out only every 2nd, 4th, ... line is drawn so they stay MIN_GRID_PIXELS apart
+        step = self.main_window.GRID_SIZE
+        scale = self.transform().m11()
+        while step * scale < MIN_GRID_PIXELS:
+            step *= 2
+
+        left = math.ceil(rect.left() / step) * step
+        top = math.ceil(rect.top() / step) * step
+        lines = []
+        x = left
+        while x <= rect.right():
+            lines.append(QLineF(x, rect.top(), x, rect.bottom()))
+            x += step
+        y = top
+        while y <= rect.bottom():
+            lines.append(QLineF(rect.left(), y, rect.right(), y))
+            y += step
+        painter.setPen(self.grid_pen)
+        painter.drawLines(lines)
+
     def mousePressEvent(self, event):
         # Handles all mouse presses
         view_pos = event.pos()  # Coordinates relative to the QGraphicsView which is the viewport. Panning doesn't change these
@@ -31,12 +80,13 @@ class CustomGraphicsView(QGraphicsView):
             return
 
         elif event.button() == Qt.LeftButton:
-            # Begin rubber band selection as long as not in the middle of dragging
-            # self.rubber_band_origin = view_pos
-            # self.rubber_band.setGeometry(QRect(self.rubber_band_origin, QSize(0,0)))
-            # self.rubber_band.show()
             # Tell main window there was a left click press
-            self.main_window.on_left_click_press(view_pos)
+            started_drag = self.main_window.on_left_click_press(view_pos)
+            # Begin rubber band selection on blank canvas as long as not in the middle of something else
+            if not started_drag and self.main_window.mouse_state == MouseState.IDLE:
+                self.rubber_band_origin = view_pos
+                self.rubber_band.setGeometry(QRect(self.rubber_band_origin, QSize(0, 0)))
+                self.rubber_band.show()
             return
         elif event.button() == Qt.RightButton:
             # Tell main window there was a right click press
@@ -50,17 +100,28 @@ class CustomGraphicsView(QGraphicsView):
             self.last_mouse_pos = view_pos
             self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
             self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
-        # elif self.rubber_band.isVisible():
-        #    # If doing a rubber band select, update the size of the rectangle
-        #    self.rubber_band.setGeometry(QRect(self.rubber_band_origin, view_pos).normalized())
-        elif self.main_window.dragging_nodes:
-            self.main_window.on_left_click_drag(event)
-
-        elif (self.main_window.mouse_state == MouseState.SELECTING_PREREQ or
-              self.main_window.mouse_state == MouseState.SELECTING_POSTREQ) and self.main_window.temp_line:
+        elif self.rubber_band.isVisible():
+            # If doing a rubber band select, update the size of the rectangle
+            self.rubber_band.setGeometry(QRect(self.rubber_band_origin, view_pos).normalized())
+        elif self.main_window.dragging_nodes or ((
+                self.main_window.mouse_state == MouseState.SELECTING_PREREQ or
+                self.main_window.mouse_state == MouseState.SELECTING_POSTREQ) and self.main_window.temp_line):
+            self.pending_move_pos = view_pos
+            if not self.frame_timer.isActive():
+                self.frame_timer.start()
+        super().mouseMoveEvent(event)
+
+    def apply_pending_move(self):
+        # Drags the nodes / moves the temp line to the latest mouse position
+        view_pos = self.pending_move_pos
+        if view_pos is None:
+            return
+        self.pending_move_pos = None
+        if self.main_window.dragging_nodes:
+            self.main_window.on_left_click_drag(view_pos)
+        elif self.main_window.temp_line:
             scene_pos = self.mapToScene(view_pos)
             self.main_window.temp_line.update_position(mouse_pos=scene_pos)
-        super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
         view_pos = event.pos()
@@ -73,16 +134,70 @@ class CustomGraphicsView(QGraphicsView):
 
         elif event.button() == Qt.LeftButton:
             # Stop rubber band if release left click
-            self.main_window.on_left_click_release(view_pos)
-            # self.rubber_band.hide()
+            self.frame_timer.stop()
+            self.apply_pending_move()  # don't lose the last bit of the drag
+            band = self.rubber_band.geometry()
+            if self.rubber_band.isVisible() and (band.width() > RUBBER_BAND_MIN_PIXELS or band.height() > RUBBER_BAND_MIN_PIXELS):
+                self.rubber_band.hide()
+                self.main_window.on_rubber_band_release(self.mapToScene(band).boundingRect())
+            else:
+                self.rubber_band.hide()
+                self.main_window.on_left_click_release(view_pos)
 
         elif event.button() == Qt.RightButton:
             self.main_window.on_right_click_release(view_pos)
 
         super().mouseReleaseEvent(event)
 
+    def wheelEvent(self, event):
+        # Zooms around the point under the mouse (transformation anchor is AnchorUnderMouse)
+        notches = event.angleDelta().y() / 120
+        if not notches:
+            return
+        current = self.transform().m11()
+        target = min(MAX_ZOOM, max(MIN_ZOOM, current * ZOOM_STEP ** notches))
+        self.scale(target / current, target / current)
+        self.viewport().update()  # grid density depends on the zoom
+        self.main_window.schedule_viewport_sync()  # zooming doesn't always move the scroll bars
+
+    def paintEvent(self, event):
+        # Only overridden so the instrumentation can time whole frames
+        super().paintEvent(event)
+
     def keyPressEvent(self, event):
+        control = event.modifiers() & Qt.ControlModifier
+        shift = event.modifiers() & Qt.ShiftModifier
         if event.key() == Qt.Key_Delete:
             if self.main_window:
                 self.main_window.delete_selected_nodes()
+        elif event.key() == Qt.Key_F3:
+            if self.main_window:
+                self.main_window.toggle_hud()
+        elif event.key() == Qt.Key_F4:
+            if self.main_window:
+                self.main_window.toggle_profiling()
+        elif control and event.key() == Qt.Key_F:
+            if self.main_window:
+                self.main_window.focus_search()
+            return
+        elif control and event.key() == Qt.Key_C:
+            if self.main_window:
+                self.main_window.copy_selection()
+            return
+        elif control and event.key() == Qt.Key_X:
+            if self.main_window:
+                self.main_window.cut_selection()
+            return
+        elif control and event.key() == Qt.Key_V:
+            if self.main_window:
+                self.main_window.paste_clipboard()
+            return
+        elif control and event.key() == Qt.Key_Z and not shift:
+            if self.main_window:
+                self.main_window.undo()
+            return
+        elif control and (event.key() == Qt.Key_Y or event.key() == Qt.Key_Z and shift):
+            if self.main_window:
+                self.main_window.redo()
+            return
         super().keyPressEvent(event)
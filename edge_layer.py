@@ -0,0 +1,229 @@
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtGui import QPen, QPainterPath, QPolygonF
+from PyQt5.QtCore import Qt, QLineF, QPointF, QRectF
+from level_of_detail import LOD_POINTS, LOD_NO_ARROWS
+from low_detail_cache import LowDetailCache
+from array import array
+import math
+
+ARROW_SIZE = 10
+ARROW_COS = math.cos(math.pi / 6)
+ARROW_SIN = math.sin(math.pi / 6)
+EDGE_CELL_SIZE = 512  # size of the buckets used to find the edges inside the exposed rect
+MAX_EDGE_CELLS = 64  # edges covering more cells than this are kept in a separate "long" list
+FLOATS_PER_EDGE = 8  # x1, y1, x2, y2, arrow x1, arrow y1, arrow x2, arrow y2
+
+
+class LayerEdge:
+    # Handle for one connection drawn by an EdgeLayer. Has the same API SkillNode uses on
+    # ConnectionLine (start_node, end_node, update_position) so the two can be swapped.
+    # start_node and end_node are node ids instead of SkillNodes when the layer has a positions function
+    __slots__ = ("layer", "start_node", "end_node", "slot", "cells")
+
+    def __init__(self, layer, start_node, end_node, slot):
+        self.layer = layer
+        self.start_node = start_node
+        self.end_node = end_node
+        self.slot = slot
+        self.cells = ()
+
+    def update_position(self, mouse_pos=None):
+        self.layer.update_edge(self)
+
+
+class EdgeLayer(QGraphicsItem):
+    # Paints all connections and arrowheads as one scene item instead of a QGraphicsLineItem plus a
+    # QGraphicsPolygonItem per edge. Geometry lives in one flat float array and is only recomputed
+    # when an endpoint moves. Edges are bucketed by EDGE_CELL_SIZE cells so a repaint only
+    # touches the edges inside the exposed rect.
+    def __init__(self):
+        super().__init__()
+        self.coords = array("d")
+        self.edges = []  # slot -> LayerEdge (None for free slots)
+        self.free_slots = []
+        self.cells = {}  # (cell_x, cell_y) -> {LayerEdge: None}
+        self.long_edges = {}  # edges spanning too many cells to bucket
+        self.bounds = QRectF()
+        self.low_detail = LowDetailCache()
+        # positions(node_id) -> (x, y) when edges are placed from model coordinates (virtualized
+        # scenes, where most nodes have no SkillNode), None when they follow their SkillNodes
+        self.positions = None
+
+        self.pen = QPen(Qt.black, 2)
+        self.hairline_pen = QPen(Qt.black, 0)  # width 0 is always one pixel
+        self.arrow_pen = QPen(Qt.black)
+        self.setZValue(1)  # Over the nodes, like ConnectionLines added after them
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # gives paint() the exposed rect
+
+    def __len__(self):
+        return len(self.edges) - len(self.free_slots)
+
+    def add_edge(self, start_node, end_node):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.edges)
+            self.edges.append(None)
+            self.coords.extend((0.0,) * FLOATS_PER_EDGE)
+        edge = LayerEdge(self, start_node, end_node, slot)
+        self.edges[slot] = edge
+        self.update_edge(edge)
+        return edge
+
+    def remove_edge(self, edge):
+        if edge.slot is None:
+            return
+        self.low_detail.invalidate()
+        self.update(self.edge_rect(edge.slot))
+        self.unbucket(edge)
+        self.edges[edge.slot] = None
+        self.free_slots.append(edge.slot)
+        edge.slot = None
+
+    def clear(self):
+        self.prepareGeometryChange()
+        self.coords = array("d")
+        self.edges = []
+        self.free_slots = []
+        self.cells = {}
+        self.long_edges = {}
+        self.bounds = QRectF()
+        self.low_detail.invalidate()
+
+    def update_edge(self, edge):
+        # Recomputes the line and arrowhead of one edge from its nodes' positions
+        slot = edge.slot
+        if slot is None:
+            return
+        old_rect = self.edge_rect(slot) if edge.cells else None  # () until the edge is first placed
+        if self.positions:
+            (x1, y1), (x2, y2) = self.positions(edge.start_node), self.positions(edge.end_node)
+        else:
+            start = edge.start_node.pos()
+            end = edge.end_node.pos()
+            x1, y1, x2, y2 = start.x(), start.y(), end.x(), end.y()
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy) or 1.0
+        # Arrowhead sides are the line direction rotated by +-30 degrees, no trig per edge
+        ux, uy = dx / length * ARROW_SIZE, dy / length * ARROW_SIZE
+        i = slot * FLOATS_PER_EDGE
+        values = (x1, y1, x2, y2,
+                  x2 - (ux * ARROW_COS + uy * ARROW_SIN), y2 - (uy * ARROW_COS - ux * ARROW_SIN),
+                  x2 - (ux * ARROW_COS - uy * ARROW_SIN), y2 - (uy * ARROW_COS + ux * ARROW_SIN))
+        self.coords[i:i + FLOATS_PER_EDGE] = array("d", values)
+
+        new_rect = self.line_rect(x1, y1, x2, y2)
+        cells = self.cell_range(new_rect)
+        if cells != edge.cells:  # most moves stay within the same cells
+            self.unbucket(edge)
+            self.bucket(edge, cells)
+        if not self.bounds.contains(new_rect):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(new_rect)
+        self.low_detail.invalidate()
+        self.update(old_rect.united(new_rect) if old_rect else new_rect)
+
+    def edge_rect(self, slot):
+        i = slot * FLOATS_PER_EDGE
+        return self.line_rect(*self.coords[i:i + 4])
+
+    def line_rect(self, x1, y1, x2, y2):
+        # Bounding rect of an edge. The arrowhead is within ARROW_SIZE of the end point, so the line's
+        # box grown by that covers it without looking at the arrow coordinates
+        margin = ARROW_SIZE + 2  # arrow plus pen width
+        left, right = (x1, x2) if x1 < x2 else (x2, x1)
+        top, bottom = (y1, y2) if y1 < y2 else (y2, y1)
+        return QRectF(left - margin, top - margin, right - left + 2 * margin, bottom - top + 2 * margin)
+
+    def cell_range(self, rect):
+        return (int(rect.left() // EDGE_CELL_SIZE), int(rect.top() // EDGE_CELL_SIZE),
+                int(rect.right() // EDGE_CELL_SIZE), int(rect.bottom() // EDGE_CELL_SIZE))
+
+    def bucket(self, edge, cells):
+        # cells is the edge's cell_range, kept on the edge so unbucket knows where to find it
+        edge.cells = cells
+        left, top, right, bottom = cells
+        if (right - left + 1) * (bottom - top + 1) > MAX_EDGE_CELLS:
+            self.long_edges[edge] = None
+            return
+        buckets = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket is None:
+                    buckets[cx, cy] = {edge: None}
+                else:
+                    bucket[edge] = None
+
+    def unbucket(self, edge):
+        if not edge.cells:
+            return
+        left, top, right, bottom = edge.cells
+        edge.cells = ()
+        if (right - left + 1) * (bottom - top + 1) > MAX_EDGE_CELLS:
+            self.long_edges.pop(edge, None)
+            return
+        buckets = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket is not None:
+                    bucket.pop(edge, None)
+                    if not bucket:
+                        del buckets[cx, cy]
+
+    def edges_in(self, rect):
+        # Every edge whose bounding box may intersect rect
+        found = dict(self.long_edges)
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        if (right - left + 1) * (bottom - top + 1) > len(cells):
+            for (cx, cy), bucket in cells.items():  # zoomed far out, cheaper to walk the buckets
+                if left <= cx <= right and top <= cy <= bottom:
+                    found.update(bucket)
+        else:
+            for cx in range(left, right + 1):
+                for cy in range(top, bottom + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        found.update(bucket)
+        return found
+
+    def boundingRect(self):
+        return self.bounds
+
+    def shape(self):
+        return QPainterPath()  # never picked by scene.items(pos)
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < LOD_POINTS:
+            self.low_detail.paint(painter, option, lod, self.bounds, self.draw_edges)
+        else:
+            self.low_detail.invalidate()  # zoomed in, don't keep the picture around
+            self.draw_edges(painter, option.exposedRect, lod)
+
+    def draw_edges(self, painter, rect, lod):
+        # Zoomed out, arrowheads are skipped, edges turn into hairlines and edges shorter than a
+        # pixel on screen are dropped
+        draw_arrows = lod >= LOD_NO_ARROWS
+        min_length = 1.0 / lod if lod < LOD_POINTS else 0.0
+        coords = self.coords
+        lines = []
+        arrows = QPainterPath()
+        for edge in self.edges_in(rect):
+            i = edge.slot * FLOATS_PER_EDGE
+            x1, y1, x2, y2, ax1, ay1, ax2, ay2 = coords[i:i + FLOATS_PER_EDGE]
+            if min_length and abs(x2 - x1) + abs(y2 - y1) < min_length:
+                continue
+            lines.append(QLineF(x1, y1, x2, y2))
+            if draw_arrows:
+                arrows.addPolygon(QPolygonF([QPointF(x2, y2), QPointF(ax1, ay1), QPointF(ax2, ay2)]))
+        painter.setPen(self.pen if lod >= LOD_POINTS else self.hairline_pen)
+        painter.drawLines(lines)
+        if draw_arrows:
+            painter.setPen(self.arrow_pen)
+            painter.setBrush(Qt.black)
+            arrows.setFillRule(Qt.WindingFill)
+            painter.drawPath(arrows)
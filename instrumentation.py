@@ -0,0 +1,96 @@
+# Named timers around hot paths, a session profiler, and the numbers the HUD shows.
+# Hot paths are registered once with register(owner, "method", "timer name"). Only while timing is
+# enabled are they swapped for timed wrappers; disabled, the original functions are back in place,
+# so instrumentation costs nothing at all when the HUD is off.
+from collections import deque
+import cProfile
+import functools
+import time
+
+SAMPLES_PER_TIMER = 1000  # newest samples kept per timer for the percentiles
+
+enabled = False
+timers = {}  # name -> deque of durations in seconds
+registered = {}  # (owner, attribute) -> (timer name, original function)
+profiler = None  # cProfile.Profile while a profile is being captured
+
+
+def record(name, seconds):
+    samples = timers.get(name)
+    if samples is None:
+        samples = timers[name] = deque(maxlen=SAMPLES_PER_TIMER)
+    samples.append(seconds)
+
+
+def timed(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def register(owner, attribute, name):
+    # owner.attribute has to be defined on owner itself (not inherited), so the original can be restored
+    if (owner, attribute) in registered:
+        return
+    registered[owner, attribute] = (name, owner.__dict__[attribute])
+    if enabled:
+        setattr(owner, attribute, timed(owner.__dict__[attribute], name))
+
+
+def set_enabled(flag):
+    global enabled
+    if flag == enabled:
+        return
+    enabled = flag
+    for (owner, attribute), (name, function) in registered.items():
+        setattr(owner, attribute, timed(function, name) if flag else function)
+
+
+def reset():
+    timers.clear()
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def stats(*names):
+    # Summary in ms over the samples of all given timers, None if there are none
+    samples = sorted(sample for name in names for sample in timers.get(name, ()))
+    if not samples:
+        return None
+    return {
+        "count": len(samples),
+        "last": timers[names[-1]][-1] * 1000 if timers.get(names[-1]) else samples[-1] * 1000,
+        "mean": sum(samples) / len(samples) * 1000,
+        "p50": percentile(samples, 0.50) * 1000,
+        "p95": percentile(samples, 0.95) * 1000,
+        "p99": percentile(samples, 0.99) * 1000,
+    }
+
+
+def is_profiling():
+    return profiler is not None
+
+
+def start_profiling():
+    global profiler
+    if profiler is None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+def stop_profiling(filepath):
+    # Writes the captured profile (open with pstats or snakeviz) and returns filepath
+    global profiler
+    if profiler is None:
+        return None
+    profiler.disable()
+    profiler.dump_stats(filepath)
+    profiler = None
+    return filepath
@@ -0,0 +1,129 @@
+# Layered (Sugiyama style) auto layout of the prerequisite graph. Pure python, no Qt, so it can run
+# on a worker thread over a TreeSnapshot:
+#  1. layering: every node goes one layer below its deepest prerequisite (longest path)
+#  2. edges spanning several layers get a dummy vertex in every layer they cross
+#  3. crossing minimization: layers are reordered by the barycenter of their neighbors in the layer
+#     above, then below, for a few sweeps. Starting order is the current x, so the result stays close
+#     to what the designer had
+#  4. coordinates: layers are stacked top to bottom and centered, everything on GRID_SIZE multiples.
+#     Very wide layers wrap into several rows so they fit in the scene, and the result is shifted
+#     right / down where needed so no node ends up left of or above the scene origin
+# Incremental mode (root_ids) only lays out the given nodes and everything that requires them,
+# hanging below the root(s); the rest of the tree stays where it is.
+
+SPACING = 2  # grid cells between neighboring nodes and between layers
+MAX_ROW_NODES = 150  # nodes per row before a layer wraps
+
+
+def subtree_ids(snapshot, root_ids):
+    # root_ids plus every node that (indirectly) requires one of them
+    seen = dict.fromkeys(root_ids)
+    stack = list(seen)
+    while stack:
+        for next_id in snapshot.postrequisites[stack.pop()]:
+            if next_id not in seen:
+                seen[next_id] = None
+                stack.append(next_id)
+    return list(seen)
+
+
+def assign_layers(snapshot, node_ids):
+    # Longest path layering restricted to node_ids (Kahn's algorithm). Nodes of cycles in old files
+    # can't be ordered, they go below their already placed prerequisites
+    members = set(node_ids)
+    prerequisites, postrequisites = snapshot.prerequisites, snapshot.postrequisites
+    missing = {node_id: sum(1 for src_id in prerequisites[node_id] if src_id in members) for node_id in node_ids}
+    layer = dict.fromkeys(node_ids, 0)
+    ordered = [node_id for node_id in node_ids if not missing[node_id]]
+    for node_id in ordered:  # grows while iterating
+        next_layer = layer[node_id] + 1
+        for next_id in postrequisites[node_id]:
+            if next_id in members:
+                if layer[next_id] < next_layer:
+                    layer[next_id] = next_layer
+                missing[next_id] -= 1
+                if not missing[next_id]:
+                    ordered.append(next_id)
+    if len(ordered) < len(node_ids):
+        placed = set(ordered)
+        for node_id in node_ids:
+            if node_id not in placed:
+                layer[node_id] = max((layer[src_id] + 1 for src_id in prerequisites[node_id] if src_id in placed), default=0)
+                placed.add(node_id)
+    return layer
+
+
+def layered_layout(snapshot, grid_size, root_ids=None, sweeps=4):
+    # Returns {node_id: (x, y)} for every node that was laid out
+    nodes = snapshot.nodes
+    node_ids = subtree_ids(snapshot, [i for i in root_ids if i in nodes]) if root_ids else list(nodes)
+    if not node_ids:
+        return {}
+    layer = assign_layers(snapshot, node_ids)
+
+    # Vertices are indices: node_ids first, then dummies. x is only used for the starting order
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    vertex_layer = [layer[node_id] for node_id in node_ids]
+    vertex_x = [nodes[node_id].x for node_id in node_ids]
+    above = [[] for _ in node_ids]  # neighbors in the layer above
+    below = [[] for _ in node_ids]  # neighbors in the layer below
+    for dst_id in node_ids:
+        for src_id in snapshot.prerequisites[dst_id]:
+            if src_id not in index or layer[src_id] >= layer[dst_id]:
+                continue  # outside the laid out part, or inside an old cycle
+            previous = index[src_id]
+            for dummy_layer in range(layer[src_id] + 1, layer[dst_id]):
+                dummy = len(vertex_layer)
+                vertex_layer.append(dummy_layer)
+                vertex_x.append(vertex_x[previous])
+                above.append([previous])
+                below.append([])
+                below[previous].append(dummy)
+                previous = dummy
+            below[previous].append(index[dst_id])
+            above[index[dst_id]].append(previous)
+
+    layers = [[] for _ in range(max(vertex_layer) + 1)]
+    for vertex in sorted(range(len(vertex_layer)), key=vertex_x.__getitem__):
+        layers[vertex_layer[vertex]].append(vertex)
+    position = [0] * len(vertex_layer)
+    for vertices in layers:
+        for i, vertex in enumerate(vertices):
+            position[vertex] = i
+
+    # Barycenter sweeps, down then up. Vertices without neighbors on that side keep their position
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        order = layers[1:] if downward else layers[-2::-1]
+        neighbors = above if downward else below
+        for vertices in order:
+            def barycenter(vertex):
+                adjacent = neighbors[vertex]
+                if not adjacent:
+                    return position[vertex]
+                return sum(position[other] for other in adjacent) / len(adjacent)
+            vertices.sort(key=lambda vertex: (barycenter(vertex), position[vertex]))
+            for i, vertex in enumerate(vertices):
+                position[vertex] = i
+
+    # Grid coordinates, centered under the roots (or the current middle of the tree)
+    step = SPACING * grid_size
+    anchors = [nodes[node_id] for node_id in (root_ids or node_ids) if node_id in nodes]
+    origin_x = round(sum(record.x for record in anchors) / len(anchors) / grid_size) * grid_size
+    origin_y = round(min(record.y for record in anchors) / grid_size) * grid_size
+    positions = {}
+    row_y = origin_y
+    for vertices in layers:
+        real = [vertex for vertex in vertices if vertex < len(node_ids)]
+        for start in range(0, len(real), MAX_ROW_NODES):
+            row = real[start:start + MAX_ROW_NODES]
+            for column, vertex in enumerate(row):
+                positions[node_ids[vertex]] = (origin_x + (column - len(row) // 2) * step, row_y)
+            row_y += step
+
+    # origin and step are grid multiples, so the shift is too
+    shift_x = max(0, -min(x for x, _ in positions.values()))
+    shift_y = max(0, -min(y for _, y in positions.values()))
+    if shift_x or shift_y:
+        positions = {node_id: (x + shift_x, y + shift_y) for node_id, (x, y) in positions.items()}
+    return positions
@@ -0,0 +1,5 @@
+# Zoom levels (QStyleOptionGraphicsItem.levelOfDetailFromTransform, 1.0 = 100%) below which items
+# drop detail when painting. Shared by SkillNode, ConnectionLine and EdgeLayer.
+LOD_POINTS = 0.15  # nodes become flat colored squares, edges become hairlines
+LOD_NO_OUTLINES = 0.35  # nodes lose their outline / hover pen
+LOD_NO_ARROWS = 0.35  # arrowheads are skipped
@@ -0,0 +1,48 @@
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtCore import Qt, QRectF
+import math
+
+MAX_CACHE_PIXELS = 1 << 22  # per cached image (16 MB). Bigger layers are cached at a lower resolution
+ZOOM_TOLERANCE = 1.5  # the image is reused until the zoom changed by more than this factor
+
+
+class LowDetailCache:
+    # Zoomed out below LOD_POINTS, a layer of a big tree is thousands of tiny squares or hairlines and
+    # looks the same in every frame. Looping over them in python and rasterizing them again on every
+    # repaint makes scrolling crawl, so the whole layer is rendered into an image at about the current
+    # zoom once and repaints only blit the exposed part of it. The layer calls invalidate() whenever
+    # its contents change.
+    def __init__(self):
+        self.image = None
+        self.rect = QRectF()  # scene rect covered by the image
+        self.scale = 0.0  # image pixels per scene unit
+
+    def invalidate(self):
+        self.image = None
+
+    def paint(self, painter, option, lod, rect, draw):
+        # rect is the layer's bounding rect, draw(painter, rect, lod) paints its contents inside rect
+        if rect.isEmpty():
+            return
+        scale = min(lod, math.sqrt(MAX_CACHE_PIXELS / (rect.width() * rect.height())))
+        if self.image is None or self.rect != rect or not scale / ZOOM_TOLERANCE <= self.scale <= scale * ZOOM_TOLERANCE:
+            self.render(rect, scale, draw)
+        target = option.exposedRect.intersected(self.rect)
+        if target.isEmpty():
+            return
+        source = QRectF((target.left() - self.rect.left()) * self.scale, (target.top() - self.rect.top()) * self.scale,
+                        target.width() * self.scale, target.height() * self.scale)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.scale != lod)
+        painter.drawImage(target, self.image, source)
+
+    def render(self, rect, scale, draw):
+        self.rect = QRectF(rect)
+        self.scale = scale
+        self.image = QImage(max(1, math.ceil(rect.width() * scale)), max(1, math.ceil(rect.height() * scale)),
+                            QImage.Format_ARGB32_Premultiplied)
+        self.image.fill(Qt.transparent)
+        painter = QPainter(self.image)
+        painter.scale(scale, scale)
+        painter.translate(-rect.left(), -rect.top())
+        draw(painter, rect, scale)
+        painter.end()
@@ -1,20 +1,52 @@
 from PyQt5.QtWidgets import (
     QMainWindow, QGraphicsScene, QVBoxLayout, QMenu,
     QAction, QInputDialog, QLabel, QPushButton, QWidget,
-    QMessageBox
+    QMessageBox, QApplication, QFileDialog, QLineEdit, QComboBox
 )
-from PyQt5.QtGui import QPen, QFont, QBrush, QColor
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPen, QFont, QBrush, QColor, QPainterPath, QCursor
+from PyQt5.QtCore import QEventLoop, QThreadPool, QTimer, QPointF, QRectF, QMimeData
+from contextlib import contextmanager
 from datetime import datetime
-from skill_node import SkillNode
+from skill_node import SkillNode, NODE_RADIUS
+from upgrade import Upgrade
 from custom_graphics_view import CustomGraphicsView
 from tooltip import Tooltip
 from skill_panel import SkillPanel
 from mouse_state import MouseState
 from connection_line import ConnectionLine
+from edge_layer import EdgeLayer, LayerEdge
+from node_layer import NodeLayer
+from level_of_detail import LOD_POINTS
+from spatial_index import SpatialHashGrid
+from skill_tree_model import (
+    SkillTreeModel, ModelEvent, CycleError, export_renumbered, fragment, tree_to_dict, tables_from_node_data
+)
+from change_journal import ChangeJournal
+from background_save import BackgroundSaver
+from undo_stack import UndoStack
+from search_index import SearchIndex
+import instrumentation
+from background_job import BackgroundJob
+from layered_layout import layered_layout, subtree_ids
+from itertools import chain
 import json
 import os  # To check if the save file exists
-from upgrade import Upgrade
+import time
+
+SCENE_BATCH_SIZE = 5000  # items added to the scene between repaints when (re)building it
+DRAG_FRAME_TARGET_MS = 8  # budget for one drag update, leaves the rest of a 60 fps frame for painting
+EDGE_LAYER_THRESHOLD = 2000  # trees with at least this many edges draw them with one EdgeLayer
+VIRTUAL_SCENE_THRESHOLD = 20000  # trees with at least this many nodes only get SkillNodes near the viewport
+VIRTUAL_MARGIN = 0.5  # SkillNodes are kept this fraction of the viewport size past each of its edges
+MAX_MATERIALIZED_NODES = 5000  # more nodes than this around the viewport are left to the NodeLayer
+NODE_POOL_SIZE = 2000  # released SkillNodes kept for reuse
+VIEWPORT_SYNC_MS = 15  # scrolls and zooms are coalesced into one sync_viewport
+SIMULATED_PLAYERS = 100000  # players per progression simulation
+SEARCH_DELAY_MS = 150  # typing pause before the search runs
+MAX_SEARCH_HIGHLIGHTS = 5000  # matches outlined in the scene
+HUD_INTERVAL_MS = 500
+HUD_TIMER_LINES = 8  # slowest timers listed in the HUD
+FRAGMENT_MIME_TYPE = "application/x-skill-tree-fragment"  # copied nodes on the clipboard, skill_tree.json layout
 
 class MainWindow(QMainWindow):
     #  MainWindow is the entire application, which includes:
@@ -37,11 +69,39 @@ class MainWindow(QMainWindow):
         self.view.centerOn(0, 0)  # Center view in top left corner
         self.setCentralWidget(self.view)
         self.dragging_nodes = None  # define the nodes being dragged by mouse cursor
+        self.last_drag_frame_ms = 0.0
+        self.batch_depth = 0  # > 0 inside batch_edit()
+        self.batch_autosave = False  # an autosave was requested inside the running batch
+        self.paste_count = 0  # pastes of the current clipboard without a cursor position, each one goes further
+
+        # Connections of big trees are drawn by a single item instead of a ConnectionLine each
+        self.edge_layer = EdgeLayer()
+        self.scene.addItem(self.edge_layer)
+        self.use_edge_layer = False  # decided in rebuild_scene based on the tree size
+
+        # Big trees are virtualized (also decided in rebuild_scene): SkillNodes only exist for the nodes
+        # in and around the viewport, see sync_viewport. The NodeLayer paints all the others from the
+        # model, and edges go on the EdgeLayer from model coordinates
+        self.virtual = False
+        self.node_layer = NodeLayer(self)
+        self.node_layer.hide()
+        self.scene.addItem(self.node_layer)
+        self.node_pool = []  # released SkillNodes, see release_node_item
+        self.model_index = SpatialHashGrid(self.GRID_SIZE)  # node ids by model position, only kept while virtual
+        self.viewport_sync_timer = QTimer(self)
+        self.viewport_sync_timer.setSingleShot(True)
+        self.viewport_sync_timer.setInterval(VIEWPORT_SYNC_MS)
+        self.viewport_sync_timer.timeout.connect(self.sync_viewport)
+        self.view.horizontalScrollBar().valueChanged.connect(self.schedule_viewport_sync)
+        self.view.verticalScrollBar().valueChanged.connect(self.schedule_viewport_sync)
 
         # rest oif the shit
         self.tooltip = Tooltip(self.scene)
         self.init_ui()
+        self.init_hud()
         self.temp_line = None  # ConnectingLine class
+        self.cycle_highlight = None  # outline of the cycle a rejected connection would have created
+        self.cycle_pen = QPen(QColor(220, 0, 0), 4)
 
 
         # Mouse state tracking using state machine
@@ -49,64 +109,217 @@ class MainWindow(QMainWindow):
         self.selected_node = None
         self.update_mouse_state_label()
 
-        # Node stuff
-        self.current_node_id = 0  # id of the highest node. will be updated on loading skill ttree
+        # Node stuff. The model owns the tree, the scene only mirrors it through model events
+        self.model = SkillTreeModel()
+        self.model.add_listener(self.on_model_event)
+        self.node_items = {}  # node_id -> SkillNode in the scene
+        self.edge_lines = {}  # (prerequisite_id, postrequisite_id) -> ConnectionLine in the scene
+        self.node_index = SpatialHashGrid(self.GRID_SIZE)  # SkillNodes by position, kept up to date by SkillNode.setPos
+        # Autosave appends edits to a journal, compacted into _temp_skill_tree.json now and then
+        self.journal = ChangeJournal(self.model, "skill_tree/_temp_skill_tree.journal", "skill_tree/_temp_skill_tree.json")
+        # Full saves are serialized and written on a worker thread
+        self.saver = BackgroundSaver(self)
+        self.saver.saved.connect(self.on_save_finished)
+        # Undo/redo from small per-edit records, one command per autosave
+        self.undo_stack = UndoStack(self.model)
+        # Upgrade text and types for the search box
+        self.search_index = SearchIndex(self.model)
         self.load_skill_tree()
 
     def init_ui(self):
         # Set up the scene with initial UI widgets and menus
         self.ui_container = QWidget(self)
-        self.ui_container.setGeometry(10, 10, 220, 250)
+        self.ui_container.setGeometry(10, 10, 220, 520)
         layout = QVBoxLayout(self.ui_container)  # This stacks labels automatically
         # Labels
         self.debug_label = QLabel("Selected: None", self.ui_container)
         self.hover_label = QLabel("Hovering: None", self.ui_container)
         self.drag_label = QLabel("Dragging: None", self.ui_container)
         self.mouse_state_label = QLabel("Mouse State: IDLE", self.ui_container)
+        self.save_label = QLabel("Last save: None", self.ui_container)
         # Buttons
         self.grid_button = QPushButton("Toggle Grid", self.ui_container)
         self.grid_button.clicked.connect(self.toggle_grid)
         self.save_button = QPushButton("Save Skill Tree", self.ui_container)
         self.save_button.clicked.connect(self.on_save_button_clicked)
+        self.simulate_button = QPushButton("Simulate Players", self.ui_container)
+        self.simulate_button.clicked.connect(self.run_simulation)
+        self.heatmap_button = QPushButton("Toggle Heatmap", self.ui_container)
+        self.heatmap_button.clicked.connect(self.toggle_heatmap)
+        self.layout_button = QPushButton("Auto Layout", self.ui_container)
+        self.layout_button.clicked.connect(self.on_layout_button_clicked)
+        self.export_button = QPushButton("Export Renumbered", self.ui_container)
+        self.export_button.clicked.connect(self.on_export_button_clicked)
+        # Search (Ctrl+F). Enter jumps to the next match
+        self.search_input = QLineEdit(self.ui_container)
+        self.search_input.setPlaceholderText("Search upgrades (fire, bla*)")
+        self.search_input.textChanged.connect(self.schedule_search)
+        self.search_input.returnPressed.connect(self.next_search_hit)
+        self.search_type = QComboBox(self.ui_container)
+        self.search_type.addItems(["All types", Upgrade.Upgrade_Type.WEAPON_UNLOCK, Upgrade.Upgrade_Type.CLASS_UNLOCK,
+                                   Upgrade.Upgrade_Type.ACTIVE_ABILITY, Upgrade.Upgrade_Type.PASSIVE_ABILITY])
+        self.search_type.currentIndexChanged.connect(self.schedule_search)
+        self.search_label = QLabel("Search: None", self.ui_container)
         # harry Styles
-        for label in [self.debug_label, self.hover_label, self.drag_label, self.mouse_state_label]:
+        for label in [self.debug_label, self.hover_label, self.drag_label, self.mouse_state_label, self.save_label]:
             label.setStyleSheet("background-color: white; padding: 5px; border: 1px solid black;")
             layout.addWidget(label)
-        for button in [self.grid_button, self.save_button]:
+        for button in [self.grid_button, self.save_button, self.simulate_button, self.heatmap_button, self.layout_button, self.export_button]:
             layout.addWidget(button)
+        self.search_label.setStyleSheet("background-color: white; padding: 5px; border: 1px solid black;")
+        for widget in [self.search_input, self.search_type, self.search_label]:
+            layout.addWidget(widget)
         self.ui_container.setLayout(layout)
 
-        # Grid init
+        # Grid init. The view paints it in CustomGraphicsView.drawBackground
         self.grid_visible = True  # Track grid state
-        self.grid_lines = []
-        self.draw_grid()
+        # Reach heatmap from the last progression simulation. node_id -> (reach probability, median unlock point)
+        self.heatmap = {}
+        self.heatmap_visible = False
+        self.simulation_job = None
+        self.layout_job = None
+        self.export_job = None
+        # Search results (sorted node ids, None without a search), the one jumped to last, and their outlines
+        self.search_results = None
+        self.search_hit = -1
+        self.search_highlight = None
+        self.search_pen = QPen(QColor(255, 140, 0), 3)
+        self.search_pen.setCosmetic(True)  # stays visible zoomed out
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
 
         # Font
         self.default_font = QFont("Arial", 10, QFont.Bold)  # default font for skill labels
         # Skill Panel
         self.skill_panel = SkillPanel(self)  # Make it a child of MainWindow
-        self.skill_panel.move(10, 400)  # Position it on the left side
+        self.skill_panel.move(10, 540)  # Position it on the left side, below the ui container
         self.skill_panel.hide()
 
+    def init_hud(self):
+        # Performance overlay in the top right corner, toggled with F3. Hot paths are only timed while it's shown
+        self.hud_label = QLabel(self)
+        self.hud_label.setFont(QFont("Courier", 9))
+        self.hud_label.setStyleSheet("background-color: rgba(255, 255, 255, 220); padding: 5px; border: 1px solid black;")
+        self.hud_label.hide()
+        self.hud_timer = QTimer(self)
+        self.hud_timer.setInterval(HUD_INTERVAL_MS)
+        self.hud_timer.timeout.connect(self.update_hud)
+        for owner, attribute, name in [
+                (CustomGraphicsView, "paintEvent", "frame"),
+                (CustomGraphicsView, "mousePressEvent", "input.press"),
+                (CustomGraphicsView, "mouseMoveEvent", "input.move"),
+                (CustomGraphicsView, "mouseReleaseEvent", "input.release"),
+                (CustomGraphicsView, "wheelEvent", "input.wheel"),
+                (CustomGraphicsView, "keyPressEvent", "input.key"),
+                (MainWindow, "on_left_click_press", "click.press"),
+                (MainWindow, "on_left_click_release", "click.release"),
+                (MainWindow, "on_right_click_release", "click.right"),
+                (MainWindow, "on_left_click_drag", "drag"),
+                (MainWindow, "save_skill_tree", "save.snapshot"),
+                (MainWindow, "auto_save_skill_tree", "autosave"),
+                (MainWindow, "load_skill_tree", "load"),
+                (MainWindow, "rebuild_scene", "scene.rebuild"),
+                (SkillNode, "move_lines", "move_lines"),
+                (SkillNode, "paint", "paint.node"),
+                (EdgeLayer, "paint", "paint.edges")]:
+            instrumentation.register(owner, attribute, name)
+
+    def toggle_hud(self):
+        visible = not self.hud_label.isVisible()
+        instrumentation.set_enabled(visible)
+        if visible:
+            instrumentation.reset()
+            self.update_hud()
+            self.hud_label.show()
+            self.hud_timer.start()
+        else:
+            self.hud_timer.stop()
+            self.hud_label.hide()
+
+    def update_hud(self):
+        lines = []
+        frame = instrumentation.stats("frame")
+        if frame:
+            lines.append(f"Frame    {frame['last']:6.1f} ms  p95 {frame['p95']:6.1f} ms")
+        items = len(self.node_items) + (len(self.edge_layer) if self.use_edge_layer else len(self.edge_lines))
+        lines.append(f"Items    {items} ({len(self.node_items)} nodes)")
+        save = instrumentation.stats("save.write")
+        if save:
+            lines.append(f"Save     {save['last']:6.0f} ms")
+        latency = instrumentation.stats("input.press", "input.move", "input.release", "input.wheel", "input.key")
+        if latency:
+            lines.append(f"Input    p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f} ms")
+        slowest = sorted(((stats["p95"], name, stats) for name in list(instrumentation.timers)
+                          if (stats := instrumentation.stats(name))), reverse=True)
+        for _, name, stats in slowest[:HUD_TIMER_LINES]:
+            lines.append(f"{name:14} {stats['count']:5}x  p95 {stats['p95']:7.2f} ms")
+        if instrumentation.is_profiling():
+            lines.append("PROFILING (F4 to stop)")
+        self.hud_label.setText("\n".join(lines))
+        self.hud_label.adjustSize()
+        self.hud_label.move(self.width() - self.hud_label.width() - 25, 10)
+
+    def toggle_profiling(self):
+        # F4 starts / stops capturing a cProfile of the session into skill_tree/
+        if instrumentation.is_profiling():
+            filepath = instrumentation.stop_profiling(f"skill_tree/profile_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.prof")
+            print(f"Profile written to {filepath} (python -m pstats {filepath})")
+        else:
+            instrumentation.start_profiling()
+            print("Profiling started, F4 to stop")
+
+    def node_at(self, scene_pos):
+        # The SkillNode under scene_pos, found through the node index instead of scene.items()
+        if self.virtual:
+            node_id = self.model_index.nearest(scene_pos.x(), scene_pos.y(), NODE_RADIUS)
+            return None if node_id is None else self.node_item(node_id)
+        return self.node_index.nearest(scene_pos.x(), scene_pos.y(), NODE_RADIUS)
+
+    def node_item(self, node_id):
+        # The SkillNode of node_id. In a virtual scene it's materialized first if it has none
+        node = self.node_items.get(node_id)
+        if node is None and self.virtual and node_id in self.model:
+            node = self.create_node_item(node_id)
+        return node
+
+    def invalidate_neighbor_tooltips(self, node_id):
+        # Neighbors show node_id's name in their tooltips. Goes by the model, node_id may have no SkillNode
+        for neighbor_id in chain(self.model.prerequisites[node_id], self.model.postrequisites[node_id]):
+            node = self.node_items.get(neighbor_id)
+            if node:
+                node.invalidate_tooltip()
+
+    def nodes_in_rect(self, scene_rect):
+        # SkillNodes of every node whose center is inside scene_rect
+        left, top, right, bottom = scene_rect.left(), scene_rect.top(), scene_rect.right(), scene_rect.bottom()
+        if self.virtual:
+            return [self.node_item(node_id) for node_id in self.model_index.query_rect(left, top, right, bottom)]
+        return self.node_index.query_rect(left, top, right, bottom)
+
     def on_left_click_press(self, view_pos):
-        # Handles left-click press to start dragging if clicking on selected nodes
+        # Handles left-click press to start dragging if clicking on selected nodes.
+        # Returns True if a drag was started
         scene_pos = self.view.mapToScene(view_pos)
-        clicked_items = self.scene.items(scene_pos)
+        self.clear_cycle_highlight()
 
         # If left click press on node, select it and prepare to drag
         if self.mouse_state == MouseState.IDLE:
-            for item in clicked_items:
-                if isinstance(item, SkillNode):
+            item = self.node_at(scene_pos)
+            if item:
+                if not item.isSelected():  # Pressing on a selected node drags the whole selection
                     self.scene.clearSelection()
                     item.setSelected(True)
-                    self.dragging_nodes = [node for node in self.scene.selectedItems()]  # Add all nodes clicked as selected (only 1 for now)
-                    self.mouse_state = MouseState.DRAGGING
-                    self.update_mouse_state_label()
-                    self.view.last_mouse_pos = view_pos  # Store the start position of drag
-                    self.update_drag_label()
-                    self.debug_update_selection_label()
-                    self.open_skill_panel(item)  # Opens the panel to show selected node's information
-                    break
+                self.dragging_nodes = [node for node in self.scene.selectedItems() if isinstance(node, SkillNode)]
+                self.mouse_state = MouseState.DRAGGING
+                self.update_mouse_state_label()
+                self.view.last_mouse_pos = view_pos  # Store the start position of drag
+                self.update_drag_label()
+                self.debug_update_selection_label()
+                self.open_skill_panel(item)  # Opens the panel to show selected node's information
+                return True
+        return False
 
     def on_right_click_press(self, view_pos):
         # Process right click from graphics view
@@ -116,20 +329,25 @@ class MainWindow(QMainWindow):
         scene_pos = self.view.mapToScene(view_pos)
         # If was dragging a node, keep it selected
         # Check if over a node. If so, select it. If not, clear selection
-        clicked_items = self.scene.items(scene_pos)
-        if len(clicked_items) > 0:
-            for item in clicked_items:
-                if isinstance(item, SkillNode):
-                    # Check for selecting a prereq
-                    if self.mouse_state == MouseState.SELECTING_PREREQ or self.mouse_state == MouseState.SELECTING_POSTREQ or self.mouse_state == MouseState.DELETING_CONNECTIONS:
-                        if item == self.selected_node:
-                            return
-                        self.complete_node_selection(item)
-                    else:  # just clicking on a node
-                        self.scene.clearSelection()
-                        item.setSelected(True)
-                        item.snap_to_grid()
-                    break  # Stop after selecting the first node
+        item = self.node_at(scene_pos)
+        if item:
+            # Check for selecting a prereq
+            if self.mouse_state == MouseState.SELECTING_PREREQ or self.mouse_state == MouseState.SELECTING_POSTREQ or self.mouse_state == MouseState.DELETING_CONNECTIONS:
+                if item == self.selected_node:
+                    return
+                self.complete_node_selection(item)
+            elif self.dragging_nodes and len(self.dragging_nodes) > 1:  # dragged a multi-selection, keep it
+                # Snapped with one move_nodes: a single NODES_MOVED and one undo step for the whole selection
+                snapped = {node.node_id: (self.snap_offset(node.pos().x()), self.snap_offset(node.pos().y()))
+                           for node in self.dragging_nodes}
+                with self.batch_edit(len(snapped)):
+                    self.model.move_nodes(snapped)  # on_model_event moves the SkillNodes and their lines
+                    self.auto_save_skill_tree()  # journal the moves
+            else:  # just clicking on a node
+                self.scene.clearSelection()
+                item.setSelected(True)
+                item.snap_to_grid()
+                self.auto_save_skill_tree()  # journal the move
         else:
             self.scene.clearSelection()
             self.skill_panel.hide_panel()
@@ -141,39 +359,56 @@ class MainWindow(QMainWindow):
         self.update_drag_label()
         self.debug_update_selection_label()  # Ensure label updates when clicking empty space
 
-    def on_left_click_drag(self, event):
+    def on_left_click_drag(self, view_pos):
         # Handles dragging of multiple selected nodes.
-        # Called by mouse move event when beginning a drag action
+        # Called by the view at most once per frame with the latest mouse position while dragging
         if not self.dragging_nodes:
             return
         if not self.view.last_mouse_pos:
             return
-        scene_pos = self.view.mapToScene(event.pos())
+        start = time.perf_counter()
+        scene_pos = self.view.mapToScene(view_pos)
         last_scene_pos = self.view.mapToScene(self.view.last_mouse_pos)
         delta = scene_pos - last_scene_pos  # Compute movement delta
 
+        # Move all items first, then the model records in one move_nodes (a single NODES_MOVED), then
+        # the lines, so a line between two dragged nodes is only recomputed once per frame
+        positions = {}
         for node in self.dragging_nodes:
             new_pos = node.pos() + delta
-            node.setPos(new_pos.x(), new_pos.y())
-        self.view.last_mouse_pos = event.pos()  # Update drag position
+            node.move_item(new_pos.x(), new_pos.y())
+            positions[node.node_id] = (new_pos.x(), new_pos.y())
+        self.model.move_nodes(positions)  # virtual scenes update their edges in move_node_items
+        if not self.virtual:
+            dirty_lines = {}
+            for node in self.dragging_nodes:
+                dirty_lines.update(node.incoming_lines)
+                dirty_lines.update(node.outgoing_lines)
+            for line in dirty_lines:
+                line.update_position()
+        self.view.last_mouse_pos = view_pos  # Update drag position
+        self.last_drag_frame_ms = (time.perf_counter() - start) * 1000
+        self.update_drag_label()
 
     def on_right_click_release(self, view_pos):
         if self.mouse_state != MouseState.IDLE:
             return
         scene_pos = self.view.mapToScene(view_pos)
-        clicked_items = self.scene.items(scene_pos)
-        if clicked_items:
+        item = self.node_at(scene_pos)
+        if item:
             # Right-clicking a skill node opens the upgrade menu.
-            scene_pos = self.view.mapToScene(view_pos)
-            clicked_items = self.scene.items(scene_pos)
-
-            for item in clicked_items:
-                if isinstance(item, SkillNode):
-                    self.show_rclick_menu_node(view_pos, item)
-                    return
+            self.show_rclick_menu_node(view_pos, item)
         else:
             self.show_rclick_menu_blank(view_pos)  # show right click menu for blank canvas
 
+    def on_rubber_band_release(self, scene_rect):
+        # Selects every node whose center is inside the rubber band
+        self.scene.clearSelection()
+        for node in self.nodes_in_rect(scene_rect):
+            node.setSelected(True)
+        self.skill_panel.hide_panel()
+        self.debug_update_selection_label()
+
     def show_rclick_menu_blank(self, view_pos):
         # Context menu for right-clicking on the blank canvas.
         scene_pos = self.view.mapToScene(view_pos)
@@ -181,12 +416,38 @@ class MainWindow(QMainWindow):
         menu = QMenu(self)
 
         add_skill_action = QAction("Add New Skill", self)
+        paste_action = QAction("Paste (Ctrl+V)", self)
+        clipboard_data = QApplication.clipboard().mimeData()
+        paste_action.setEnabled(bool(clipboard_data and clipboard_data.hasFormat(FRAGMENT_MIME_TYPE)))
+        undo_action = QAction("Undo (Ctrl+Z)", self)
+        undo_action.setEnabled(self.undo_stack.can_undo())
+        redo_action = QAction("Redo (Ctrl+Y)", self)
+        redo_action.setEnabled(self.undo_stack.can_redo())
+        hud_action = QAction("Hide performance HUD (F3)" if self.hud_label.isVisible() else "Show performance HUD (F3)", self)
+        profile_action = QAction("Stop profiling (F4)" if instrumentation.is_profiling() else "Start profiling (F4)", self)
         menu.addAction(add_skill_action)
+        menu.addAction(paste_action)
+        menu.addSeparator()
+        menu.addAction(undo_action)
+        menu.addAction(redo_action)
+        menu.addSeparator()
+        menu.addAction(hud_action)
+        menu.addAction(profile_action)
 
         action = menu.exec_(screen_pos)  # creates the menu using screen position
 
         if action == add_skill_action:
             self.add_skill(scene_pos)
+        elif action == paste_action:
+            self.paste_clipboard(scene_pos)
+        elif action == undo_action:
+            self.undo()
+        elif action == redo_action:
+            self.redo()
+        elif action == hud_action:
+            self.toggle_hud()
+        elif action == profile_action:
+            self.toggle_profiling()
 
     def show_rclick_menu_node(self, view_pos, node):
         # Context menu for right-clicking on a node
@@ -194,43 +455,193 @@ class MainWindow(QMainWindow):
         screen_pos = self.view.mapToGlobal(view_pos)
         menu = QMenu(self)
 
-        delete_node_action = QAction("Delete node", self)
+        # Delete and type change apply to the whole selection when right-clicking a selected node
+        group = self.selection_group(node)
+        delete_node_action = QAction("Delete node" if len(group) == 1 else f"Delete {len(group)} selected nodes", self)
         set_prereq_action = QAction("Set node as prerequisite", self)
         set_postreq_action = QAction("Set node as postrequisite", self)
         delete_connections_action = QAction("Delete node as pre- or postrequisite", self)
+        layout_subtree_action = QAction("Auto layout subtree", self)
+        copy_action = QAction("Copy (Ctrl+C)" if len(group) == 1 else f"Copy {len(group)} selected nodes (Ctrl+C)", self)
+        duplicate_subtree_action = QAction("Duplicate subtree", self)
+        type_menu = QMenu("Set type" if len(group) == 1 else f"Set type of {len(group)} selected nodes", menu)
+        type_actions = {}
+        for upgrade_type in (Upgrade.Upgrade_Type.WEAPON_UNLOCK, Upgrade.Upgrade_Type.CLASS_UNLOCK,
+                             Upgrade.Upgrade_Type.ACTIVE_ABILITY, Upgrade.Upgrade_Type.PASSIVE_ABILITY):
+            type_actions[type_menu.addAction(upgrade_type)] = upgrade_type
         menu.addAction(delete_node_action)
         menu.addAction(set_prereq_action)
         menu.addAction(set_postreq_action)
         menu.addAction(delete_connections_action)
+        menu.addMenu(type_menu)
+        menu.addAction(layout_subtree_action)
+        menu.addSeparator()
+        menu.addAction(copy_action)
+        menu.addAction(duplicate_subtree_action)
 
         action = menu.exec_(screen_pos)  # create the menu using screen position
 
         if action == delete_node_action:
-            self.delete_node(node)
+            self.delete_nodes(group)
+        elif action in type_actions:
+            self.set_upgrade_types([item.node_id for item in group], type_actions[action])
         elif action == set_prereq_action:
             self.begin_set_prereq(node)
         elif action == set_postreq_action:
             self.begin_set_postreq(node)
         elif action == delete_connections_action:
             self.begin_delete_connections(node)
+        elif action == layout_subtree_action:
+            self.auto_layout([node.node_id])
+        elif action == copy_action:
+            if not node.isSelected():
+                self.scene.clearSelection()
+                node.setSelected(True)
+            self.copy_selection()
+        elif action == duplicate_subtree_action:
+            self.duplicate_subtree(node)
 
     def add_skill(self, scene_pos):
         # Adds a blank skill node to the canvas using scene coordinates.
 
-        skill = SkillNode(self, scene_pos.x(), scene_pos.y())
-        self.scene.addItem(skill)
+        self.model.add_node(scene_pos.x(), scene_pos.y())  # on_model_event creates the SkillNode
         self.scene.update()  # Force a UI refresh to avoid rendering issues
         self.auto_save_skill_tree()  # Save when adding a skill
 
     def delete_node(self, node):
-        if node in self.scene.items():
-            node.prep_for_deletion()
-            self.scene.removeItem(node)
-            del node  # delete from memory. Is this even needed?
+        self.delete_nodes([node])
+
+    @contextmanager
+    def batch_edit(self, size=0):
+        # Groups a bulk edit into one user action. Autosaves requested inside the block are held back
+        # and done once at the end (so it's also one undo command), and the labels are updated once.
+        # Batches of SCENE_BATCH_SIZE or more edits switch the scene index off until the end, like
+        # rebuild_scene. Batches nest, only the outermost one commits
+        outermost = self.batch_depth == 0
+        unindexed = size >= SCENE_BATCH_SIZE and self.scene.itemIndexMethod() == QGraphicsScene.BspTreeIndex
+        if unindexed:
+            self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if unindexed:
+                self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            if outermost:
+                if self.batch_autosave:
+                    self.batch_autosave = False
+                    self.auto_save_skill_tree()
+                self.debug_update_selection_label()
+                self.update_drag_label()
+                self.scene.update()
+
+    def selection_group(self, node):
+        # The selected nodes if node is one of them, otherwise just node
+        if node.isSelected():
+            return [item for item in self.scene.selectedItems() if isinstance(item, SkillNode)]
+        return [node]
+
+    def delete_nodes(self, nodes):
+        # Bulk delete, one autosave and one undo command for all of them
+        with self.batch_edit(len(nodes)):
+            for node in nodes:
+                if self.node_items.get(node.node_id) is node:
+                    self.model.remove_node(node.node_id)  # on_model_event removes it from the scene
+            self.auto_save_skill_tree()
+        if self.skill_panel.current_node in nodes:
+            self.skill_panel.hide_panel()
+        print(f"{len(nodes)} node(s) deleted!")
+
+    def connect_nodes(self, edges):
+        # Bulk connect of [(prerequisite_id, postrequisite_id)]. Edges that would close a cycle are
+        # skipped, the first such cycle gets highlighted. Returns how many edges were added
+        added = 0
+        first_cycle = None
+        with self.batch_edit(len(edges)):
+            for src_id, dst_id in edges:
+                try:
+                    added += self.model.add_edge(src_id, dst_id)
+                except CycleError as error:
+                    print(error)
+                    first_cycle = first_cycle or error.path
+            self.auto_save_skill_tree()
+        if first_cycle:
+            self.show_cycle(first_cycle)
+        return added
+
+    def set_upgrade_types(self, node_ids, upgrade_type):
+        # Bulk type change, names and descriptions are kept
+        with self.batch_edit(len(node_ids)):
+            for node_id in node_ids:
+                upgrade = self.model.record(node_id).upgrade
+                if upgrade.upgrade_type != upgrade_type:
+                    self.model.set_upgrade(node_id, upgrade.name, upgrade.description, upgrade_type)
             self.auto_save_skill_tree()
-            print("Node deleted!")
+
+    def copy_selection(self):
+        # Puts the selected nodes and the connections between them on the clipboard. Called by Ctrl+C
+        selected_nodes = [item for item in self.scene.selectedItems() if isinstance(item, SkillNode)]
+        if not selected_nodes:
+            return []
+        copied = fragment(self.model, [node.node_id for node in selected_nodes])
+        mime_data = QMimeData()
+        mime_data.setData(FRAGMENT_MIME_TYPE, json.dumps(tree_to_dict(copied), separators=(",", ":")).encode("utf-8"))
+        QApplication.clipboard().setMimeData(mime_data)
+        self.paste_count = 0
+        print(f"{len(selected_nodes)} node(s) copied!")
+        return selected_nodes
+
+    def cut_selection(self):
+        # Called by Ctrl+X
+        selected_nodes = self.copy_selection()
+        if selected_nodes:
+            self.delete_nodes(selected_nodes)
+
+    def paste_clipboard(self, scene_pos=None):
+        # Pastes copied nodes with the top left of their bounds at scene_pos (the mouse cursor by default). Off the
+        # canvas, every paste lands one more grid step down and right of the copied nodes
+        mime_data = QApplication.clipboard().mimeData()
+        if not mime_data or not mime_data.hasFormat(FRAGMENT_MIME_TYPE):
+            return {}
+        data = json.loads(bytes(mime_data.data(FRAGMENT_MIME_TYPE)).decode("utf-8"))
+        copied = tables_from_node_data(data["nodes"])
+        if not copied.nodes:
+            return {}
+        if scene_pos is None:
+            view_pos = self.view.viewport().mapFromGlobal(QCursor.pos())
+            if self.view.viewport().rect().contains(view_pos):
+                scene_pos = self.view.mapToScene(view_pos)
+        if scene_pos is not None:
+            dx = scene_pos.x() - min(record.x for record in copied.nodes.values())
+            dy = scene_pos.y() - min(record.y for record in copied.nodes.values())
         else:
-            print("Node not found in scene!")
+            self.paste_count += 1
+            dx = dy = self.paste_count * self.GRID_SIZE
+        return self.paste_fragment(copied, self.snap_offset(dx), self.snap_offset(dy))
+
+    def duplicate_subtree(self, node):
+        # Copies node and everything that (indirectly) requires it, placed right next to the original
+        node_ids = subtree_ids(self.model, [node.node_id])
+        xs = [self.model.record(node_id).x for node_id in node_ids]
+        return self.paste_fragment(fragment(self.model, node_ids), self.snap_offset(max(xs) - min(xs)) + self.GRID_SIZE, 0)
+
+    def snap_offset(self, distance):
+        # Rounds to whole grid cells. Pasted nodes are moved by whole cells, so nodes on the grid stay on it
+        return round(distance / self.GRID_SIZE) * self.GRID_SIZE
+
+    def paste_fragment(self, copied, dx, dy):
+        # Adds a copy of a fragment (see skill_tree_model.fragment) moved by (dx, dy) as one batch: one
+        # autosave, one undo command. The copies end up selected. Returns {copied_id: new_id}
+        with self.batch_edit(len(copied.nodes)):
+            remap = self.model.paste(copied, dx, dy)
+            self.auto_save_skill_tree()
+            self.scene.clearSelection()
+            for node_id in remap.values():
+                self.node_item(node_id).setSelected(True)
+        self.skill_panel.hide_panel()
+        print(f"{len(remap)} node(s) pasted!")
+        return remap
 
     def debug_update_selection_label(self):
         # Updates the debug label to show the current selectied nodes
@@ -250,7 +661,9 @@ class MainWindow(QMainWindow):
     def update_drag_label(self):
         # Updates the label to show the currently dragged node(s).
         if self.dragging_nodes:
-            self.drag_label.setText(f"Dragging: {len(self.dragging_nodes)} nodes")
+            # Frame time of the last drag update, should stay under DRAG_FRAME_TARGET_MS
+            over = " SLOW" if self.last_drag_frame_ms > DRAG_FRAME_TARGET_MS else ""
+            self.drag_label.setText(f"Dragging: {len(self.dragging_nodes)} nodes ({self.last_drag_frame_ms:.1f} ms{over})")
         else:
             self.drag_label.setText("Dragging: None")
 
@@ -258,145 +671,491 @@ class MainWindow(QMainWindow):
         # Deletes all selected skill nodes. Called by delete key
         selected_nodes = [item for item in self.scene.selectedItems() if isinstance(item, SkillNode)]
         if selected_nodes:
-            for node in selected_nodes:
-                self.delete_node(node)
-            self.debug_update_selection_label()
-            self.update_drag_label()
+            self.delete_nodes(selected_nodes)
+
+    def schedule_search(self, *args):
+        # New query or type filter, Enter starts over at the first match
+        self.search_hit = -1
+        self.search_timer.start()
+
+    def run_search(self, *args):
+        # Searches the upgrades for the text in the search box and outlines the matches
+        self.search_timer.stop()
+        query = self.search_input.text()
+        upgrade_type = self.search_type.currentText() if self.search_type.currentIndex() > 0 else None
+        if not query.strip() and not upgrade_type:
+            self.search_results = None
+            self.search_label.setText("Search: None")
+        else:
+            start = time.perf_counter()
+            self.search_results = self.search_index.search(query, upgrade_type, prefix_last=True)
+            self.search_hit = min(self.search_hit, len(self.search_results) - 1)
+            self.search_label.setText(f"Search: {len(self.search_results)} matches "
+                                      f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+        self.show_search_highlight()
+
+    def show_search_highlight(self):
+        # One path item with a ring around every match (up to MAX_SEARCH_HIGHLIGHTS), like the cycle outline
+        if self.search_highlight:
+            self.scene.removeItem(self.search_highlight)
+            self.search_highlight = None
+        if not self.search_results:
+            return
+        outline = QPainterPath()
+        for node_id in self.search_results[:MAX_SEARCH_HIGHLIGHTS]:
+            record = self.model.record(node_id)
+            outline.addEllipse(QPointF(record.x, record.y), NODE_RADIUS + 6, NODE_RADIUS + 6)
+        self.search_highlight = self.scene.addPath(outline, self.search_pen)
+        self.search_highlight.setZValue(2)  # over the connections
 
-    def draw_grid(self):
-        if not self.grid_visible:
+    def next_search_hit(self):
+        # Enter in the search box: centers the view on the next match and selects it
+        if self.search_timer.isActive() or self.search_results is None:
+            self.run_search()
+        if not self.search_results:
             return
-        scene_width = 2000  # TODO: define constants at top of file
-        scene_height = 2000
-        self.grid_lines = []  # Store grid lines so can remove them later
-        # Vertical lines
-        for x in range(0, scene_width, self.GRID_SIZE):
-            line = self.scene.addLine(x, 0, x, scene_height, pen=QPen(Qt.lightGray))
-            self.grid_lines.append(line)
-        # Horizontal lines
-        for y in range(0, scene_height, self.GRID_SIZE):
-            line = self.scene.addLine(0, y, scene_width, y, pen=QPen(Qt.lightGray))
-            self.grid_lines.append(line)
+        self.search_hit = (self.search_hit + 1) % len(self.search_results)
+        node = self.node_item(self.search_results[self.search_hit])
+        self.view.centerOn(node)
+        self.scene.clearSelection()
+        node.setSelected(True)
+        self.open_skill_panel(node)
+        self.debug_update_selection_label()
+        self.search_label.setText(f"Search: {self.search_hit + 1} / {len(self.search_results)} matches")
+
+    def focus_search(self):
+        self.search_input.setFocus()
+        self.search_input.selectAll()
 
     def toggle_grid(self):
         self.grid_visible = not self.grid_visible
-        # Remove existing grid lines
-        for line in self.grid_lines:
-            self.scene.removeItem(line)
-        # Redraw if enabled
-        if self.grid_visible:
-            self.draw_grid()
+        self.view.viewport().update()  # Repaint the background with or without the grid
+
+    def run_simulation(self):
+        # Simulates players spending skill points on the tree and colors every node by the fraction
+        # of players that reach it. Runs on the thread pool, numpy is only needed from here on
+        if self.simulation_job:
+            return  # one at a time
+        try:
+            import progression_simulator
+        except ImportError:
+            QMessageBox.warning(self, "Simulate Players", "The progression simulator needs numpy (pip install numpy)")
+            return
+        points, ok = QInputDialog.getInt(self, "Simulate Players", "Skill points per player:", 20, 1, 1000000)
+        if not ok:
+            return
+        policy, ok = QInputDialog.getItem(self, "Simulate Players", "Players pick:", list(progression_simulator.POLICIES), 0, False)
+        if not ok:
+            return
+        tree = progression_simulator.compile_tree(self.model, policy, points)
+        self.simulation_job = BackgroundJob(progression_simulator.simulate, tree, points, SIMULATED_PLAYERS,
+                                            workers=min(os.cpu_count() or 1, progression_simulator.MAX_WORKERS))
+        self.simulation_job.signals.finished.connect(self.on_simulation_finished)
+        QThreadPool.globalInstance().start(self.simulation_job)
+        self.simulate_button.setText("Simulating...")
+
+    def on_simulation_finished(self, result, seconds, error):
+        self.simulation_job = None
+        self.simulate_button.setText("Simulate Players")
+        if error:
+            print(f"Simulation failed: {error}")
+            return
+        # Nodes that were too deep to simulate can't be reached at all
+        self.heatmap = {node_id: (0.0, float("nan")) for node_id in self.model.node_ids()}
+        for node_id, probability, median in zip(result.node_ids.tolist(), result.reach_probability.tolist(),
+                                                result.median_step.tolist()):
+            if node_id in self.heatmap:  # not deleted while simulating
+                self.heatmap[node_id] = (probability, median)
+        print(f"Simulated {result.players} players with {result.points} skill points in {seconds:.2f} s")
+        self.heatmap_visible = True
+        self.refresh_node_colors()
+
+    def toggle_heatmap(self):
+        self.heatmap_visible = not self.heatmap_visible and bool(self.heatmap)
+        self.refresh_node_colors()
+
+    def refresh_node_colors(self):
+        for node in self.node_items.values():
+            node.update_color()
+        self.node_layer.invalidate()
+
+    def on_layout_button_clicked(self):
+        # Lays out the subtrees of the selected nodes, or the whole tree if nothing is selected
+        selected_ids = [item.node_id for item in self.scene.selectedItems() if isinstance(item, SkillNode)]
+        self.auto_layout(selected_ids or None)
+
+    def auto_layout(self, root_ids=None):
+        # Computes a layered layout of a snapshot on the thread pool, applied in on_layout_finished
+        if self.layout_job:
+            return  # one at a time
+        self.layout_job = BackgroundJob(layered_layout, self.model.snapshot(), self.GRID_SIZE, root_ids)
+        self.layout_job.signals.finished.connect(self.on_layout_finished)
+        QThreadPool.globalInstance().start(self.layout_job)
+        self.layout_button.setText("Laying out...")
+
+    def on_layout_finished(self, positions, seconds, error):
+        self.layout_job = None
+        self.layout_button.setText("Auto Layout")
+        if error:
+            print(f"Auto layout failed: {error}")
+            return
+        self.fit_scene_rect(positions.values())
+        moved = self.model.move_nodes(positions)  # one NODES_MOVED, see move_node_items
+        self.auto_save_skill_tree()
+        print(f"Auto layout of {len(positions)} nodes in {seconds:.2f} s, {len(moved)} moved")
+
+    def fit_scene_rect(self, positions):
+        # Grows the scene rect so nodes at these (x, y) can be scrolled to and rubber band selected
+        # (layouts of big trees run far past the initial 20000 x 20000)
+        if not positions:
+            return
+        right = max(x for x, _ in positions) + 2 * NODE_RADIUS
+        bottom = max(y for _, y in positions) + 2 * NODE_RADIUS
+        scene_rect = self.scene.sceneRect()
+        if right > scene_rect.right() or bottom > scene_rect.bottom():
+            self.scene.setSceneRect(scene_rect.united(QRectF(0, 0, right, bottom)))
 
     def open_skill_panel(self, node):
         # Open a panel on the left side of the screen which shows the currently selected node and the name/description of its Upgrade
         self.skill_panel.load_node(node)
 
-    def save_skill_tree(self, filepath):
+    def save_skill_tree(self, filepath, blocking=False):
         # Saves all skill nodes and their upgrade info to a JSON file.
-        self.update_node_ids()
-        skill_nodes = [item for item in self.scene.items() if isinstance(item, SkillNode)]
-        save_data = {"nodes": []}
-        for node in skill_nodes:
-            node_data = {
-                "node_id": node.node_id,
-                "x": node.pos().x(),
-                "y": node.pos().y(),
-                "upgrade": {
-                    "name": node.upgrade.name,
-                    "description": node.upgrade.description,
-                    "upgrade_type": node.upgrade.upgrade_type
-                },
-                "prerequisites": [prereq.node_id for prereq in node.prerequisites],
-                "postrequisites": [postreq.node_id for postreq in node.postrequisites]
-            }
-            save_data["nodes"].append(node_data)
-        with open(filepath, "w") as file:
-            json.dump(save_data, file, indent=4)
-
-        print(f"Skill tree saved to {filepath}!")
-
-    def update_node_ids(self):
-        # update the id of all nodes based on their x,y coordinates
-        skill_nodes = sorted(
-            [item for item in self.scene.items() if isinstance(item, SkillNode)],
-            key=lambda node: (node.pos().y(), node.pos().x())  # Sort by Y first, then X
-        )
-        # Assign new sequential IDs
-        for new_id, node in enumerate(skill_nodes):
-            node.change_id(new_id)
-        # Update the current_node_id to reflect the highest ID + 1
-        self.current_node_id = len(skill_nodes)
-        print("Node IDs updated")
+        # Only a cheap snapshot is taken here, serializing and writing happens on a worker thread.
+        # Node ids are saved as they are, see on_export_button_clicked for a renumbered copy
+        snapshot, token = self.journal.begin_full_save()
+        if blocking:
+            seconds, error = self.saver.save_now(filepath, snapshot, token)
+            self.on_save_finished(filepath, token, seconds, error)
+        else:
+            self.saver.save(filepath, snapshot, token)
+            self.save_label.setText("Last save: saving...")
+
+    def on_save_finished(self, filepath, token, seconds, error):
+        # Called on the GUI thread when a background save is done
+        self.journal.finish_full_save(token, not error)
+        if instrumentation.enabled and not error:
+            instrumentation.record("save.write", seconds)
+        if error == "superseded":
+            return  # a newer snapshot of the same file is on its way
+        if error:
+            self.save_label.setText("Last save: FAILED")
+            print(f"Error saving skill tree to {filepath}: {error}")
+        else:
+            self.save_label.setText(f"Last save: {seconds * 1000:.0f} ms")
+            print(f"Skill tree saved to {filepath}!")
 
     def auto_save_skill_tree(self):
-        temp_file = "skill_tree/_temp_skill_tree.json"
-        self.save_skill_tree(temp_file)  # Pass temp file path
+        # Appends the edits since the last autosave to the journal. Also where one user action ends for undo.
+        # Inside batch_edit() it only happens once, when the batch is done
+        if self.batch_depth:
+            self.batch_autosave = True
+            return
+        self.undo_stack.end_command()
+        self.journal.flush()
+
+    def undo(self):
+        # Ctrl+Z. The model events of the undo update the scene and journal like any other edit
+        if self.undo_stack.undo():
+            self.after_undo_redo()
+
+    def redo(self):
+        # Ctrl+Y / Ctrl+Shift+Z
+        if self.undo_stack.redo():
+            self.after_undo_redo()
+
+    def after_undo_redo(self):
+        self.skill_panel.hide_panel()  # may show a node that's gone or changed
+        self.clear_cycle_highlight()
+        self.debug_update_selection_label()
+        self.auto_save_skill_tree()
 
     def on_save_button_clicked(self):
         save_file = "skill_tree/skill_tree.json"
-        temp_file = "skill_tree/_temp_skill_tree.json"
-        self.save_skill_tree(save_file)  # Save to permanent file
+        self.save_skill_tree(save_file)  # Save to permanent file. Journal and temp file go once it's on disk
+
 
-        if os.path.exists(temp_file):
-            os.remove(temp_file)  # get rid of temp file
+    def on_export_button_clicked(self):
+        # Writes a copy of the tree with ids renumbered by position (top to bottom, left to right).
+        # Ids in the editor, the save file and the journal stay stable
+        if self.export_job:
+            return
+        filepath, _ = QFileDialog.getSaveFileName(self, "Export Renumbered", "skill_tree/skill_tree_export.json",
+                                                  "Skill trees (*.json *.stb)")
+        if not filepath:
+            return
+        self.export_job = BackgroundJob(export_renumbered, filepath, self.model.snapshot())
+        self.export_job.signals.finished.connect(self.on_export_finished)
+        QThreadPool.globalInstance().start(self.export_job)
+        self.export_button.setText("Exporting...")
 
+    def on_export_finished(self, result, seconds, error):
+        self.export_job = None
+        self.export_button.setText("Export Renumbered")
+        if error:
+            print(f"Error exporting skill tree: {error}")
+        else:
+            print(f"Renumbered skill tree exported in {seconds:.2f} s")
 
     def load_skill_tree(self):
         # Loads skill nodes from a JSON file (if it exists) and adds them to the scene.
         # Called on startup
         save_file = "skill_tree/skill_tree.json"
-        if not os.path.exists(save_file):
-            return  # No save file, do nothing
+        if os.path.exists(save_file):
+            # Generate a backup file with timestamp
+            #timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            backup_file = f"skill_tree/skill_tree_BACKUP.json"
+            try:
+                with open(save_file, "r") as original, open(backup_file, "w") as backup:
+                    data = original.read()
+                    backup.write(data)
+                print(f"Backup created: {backup_file}")
+            except Exception as e:
+                print(f"Error creating backup: {e}")
 
-        # Generate a backup file with timestamp
-        #timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-        backup_file = f"skill_tree/skill_tree_BACKUP.json"
-        try:
-            with open(save_file, "r") as original, open(backup_file, "w") as backup:
-                data = original.read()
-                backup.write(data)
-            print(f"Backup created: {backup_file}")
-        except Exception as e:
-            print(f"Error creating backup: {e}")
-
-        # Proceed with normal saving
-        with open("skill_tree/skill_tree.json", "r") as file:
-            save_data = json.load(file)
-        # Restore the last highest node_id to prevent ID duplication
-        self.current_node_id = max((node["node_id"] for node in save_data["nodes"]), default=-1) + 1
-        node_list = {}  # Map node_id to node objects
-        # Load Nodes
-        for node_data in save_data["nodes"]:
-            node_id = node_data["node_id"]
-            x, y = node_data["x"], node_data["y"]
-            upgrade_name = node_data["upgrade"]["name"]
-            upgrade_desc = node_data["upgrade"]["description"]
-            upgrade_type = node_data["upgrade"].get("upgrade_type", Upgrade.Upgrade_Type.PASSIVE_ABILITY)  # Default if missing. needed for first load after changes
-            # Create new skill node with its saved ID
-            node = SkillNode(self, x, y, node_id=node_id)
-            node.upgrade.name = upgrade_name
-            node.upgrade.description = upgrade_desc
-            node.change_upgrade_type(upgrade_type)
-            self.scene.addItem(node)
-            node_list[node_id] = node  # Store for linking later
-
-        # Reconnect Relationships
-        for node_data in save_data["nodes"]:
-            node = node_list[node_data["node_id"]]
-            for prereq_id in node_data["prerequisites"]:
-                if prereq_id in node_list:
-                    node.add_prerequisite(node_list[prereq_id])
-            for postreq_id in node_data["postrequisites"]:
-                if postreq_id in node_list:
-                    node.add_postrequisite(node_list[postreq_id])
-        print("Skill tree loaded!")
+        # Proceed with normal loading. Loads the last save (or compacted temp file) and replays the
+        # journal of unsaved edits over it. The model sends a RESET which rebuilds the scene
+        start = time.perf_counter()
+        self.last_scene_build_seconds = 0.0
+        replayed = self.journal.recover(save_file)
+        self.undo_stack.clear()  # recovered edits are part of the loaded tree, not undoable
+        if replayed:
+            print(f"Recovered {replayed} unsaved changes")
+        cycle_node_ids = self.model.cycle_node_ids()
+        if cycle_node_ids:
+            print(f"Warning: {len(cycle_node_ids)} nodes are in or behind prerequisite cycles: {sorted(cycle_node_ids)[:20]}")
+        total_seconds = time.perf_counter() - start
+        print(f"Skill tree loaded! {len(self.model)} nodes, {self.model.edge_count()} edges in {total_seconds:.2f} s "
+              f"(parse {total_seconds - self.last_scene_build_seconds:.2f} s, scene {self.last_scene_build_seconds:.2f} s)")
+
+    def on_model_event(self, event, *args):
+        # Keeps the scene in sync with the model
+        if self.search_results is not None:
+            self.search_timer.start()  # matches and their outlines may have changed
+        if self.virtual and event != ModelEvent.RESET:
+            self.on_virtual_model_event(event, *args)
+        elif event == ModelEvent.NODE_ADDED:
+            self.create_node_item(args[0])
+        elif event == ModelEvent.NODE_REMOVED:
+            node = self.node_items.pop(args[0], None)
+            if node:
+                node.prep_for_deletion()
+                self.node_index.remove(node)
+                self.scene.removeItem(node)
+        elif event == ModelEvent.NODE_MOVED:
+            self.move_node_items([args[0]])
+        elif event == ModelEvent.NODES_MOVED:
+            self.move_node_items(args[0])
+        elif event == ModelEvent.UPGRADE_CHANGED:
+            node = self.node_items.get(args[0])
+            if node:
+                node.apply_upgrade(self.model.record(args[0]).upgrade)
+        elif event == ModelEvent.EDGE_ADDED:
+            src, dst = self.node_items.get(args[0]), self.node_items.get(args[1])
+            if src and dst:
+                dst.link_prerequisite(src)
+        elif event == ModelEvent.EDGE_REMOVED:
+            src, dst = self.node_items.get(args[0]), self.node_items.get(args[1])
+            if src and dst:
+                dst.unlink_prerequisite(src)
+        elif event == ModelEvent.RESET:
+            self.heatmap = {}  # belongs to the previous tree
+            self.heatmap_visible = False
+            self.rebuild_scene()
+
+    def on_virtual_model_event(self, event, *args):
+        # on_model_event of a virtual scene. The model index and the edge layer follow every node,
+        # SkillNodes only exist for the materialized ones. Changes to the others are repainted by the NodeLayer
+        if event == ModelEvent.NODE_ADDED:
+            record = self.model.record(args[0])
+            self.model_index.insert(args[0], record.x, record.y)
+            self.node_layer.include(record.x, record.y)
+            self.node_layer.invalidate()
+            self.schedule_viewport_sync()
+        elif event == ModelEvent.NODE_REMOVED:
+            self.model_index.remove(args[0])  # its edges are gone already, EDGE_REMOVED comes first
+            if args[0] in self.node_items:
+                self.release_node_item(args[0])
+                self.node_layer.low_detail.invalidate()  # the released item repainted its area
+            else:
+                self.node_layer.invalidate()
+        elif event == ModelEvent.NODE_MOVED:
+            self.move_node_items([args[0]])
+        elif event == ModelEvent.NODES_MOVED:
+            self.move_node_items(args[0])
+        elif event == ModelEvent.UPGRADE_CHANGED:
+            node = self.node_items.get(args[0])
+            if node:
+                node.apply_upgrade(self.model.record(args[0]).upgrade)
+                self.node_layer.low_detail.invalidate()
+            else:
+                self.invalidate_neighbor_tooltips(args[0])
+                self.node_layer.invalidate()
+        elif event in (ModelEvent.EDGE_ADDED, ModelEvent.EDGE_REMOVED):
+            if event == ModelEvent.EDGE_ADDED:
+                self.edge_lines[args[0], args[1]] = self.edge_layer.add_edge(args[0], args[1])
+            else:
+                self.edge_layer.remove_edge(self.edge_lines.pop((args[0], args[1])))
+            for node_id in args:
+                node = self.node_items.get(node_id)
+                if node:
+                    node.invalidate_tooltip()
+
+    def move_node_items(self, node_ids):
+        # Mirrors a batch of model moves. Every affected line is recomputed once, and big batches
+        # switch the scene index off like rebuild_scene does
+        big = len(node_ids) >= SCENE_BATCH_SIZE and self.scene.itemIndexMethod() == QGraphicsScene.BspTreeIndex
+        if big:
+            self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        dirty_lines = {}
+        layer_dirty = False
+        for node_id in node_ids:
+            node = self.node_items.get(node_id)
+            record = self.model.record(node_id)
+            if self.virtual:
+                # Edges of a virtual scene are placed from the model, whether the nodes have SkillNodes or not
+                self.model_index.move(node_id, record.x, record.y)
+                self.node_layer.include(record.x, record.y)
+                for src_id in self.model.prerequisites[node_id]:
+                    dirty_lines[self.edge_lines[src_id, node_id]] = None
+                for dst_id in self.model.postrequisites[node_id]:
+                    dirty_lines[self.edge_lines[node_id, dst_id]] = None
+                layer_dirty = layer_dirty or node is None
+            if node and (node.pos().x() != record.x or node.pos().y() != record.y):
+                node.move_without_lines(record.x, record.y)
+                dirty_lines.update(node.incoming_lines)
+                dirty_lines.update(node.outgoing_lines)
+        for line in dirty_lines:
+            line.update_position()
+        if big:
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        if self.virtual:
+            self.node_layer.low_detail.invalidate()  # moved SkillNodes repaint their areas themselves
+        if layer_dirty:
+            self.node_layer.invalidate()
+            self.schedule_viewport_sync()
+
+    def create_node_item(self, node_id):
+        record = self.model.record(node_id)
+        if self.node_pool:
+            node = self.node_pool.pop()
+            node.bind(node_id, record)
+        else:
+            node = SkillNode(self, record.x, record.y, node_id, record.upgrade)
+        self.scene.addItem(node)
+        self.node_items[node_id] = node
+        return node
+
+    def release_node_item(self, node_id):
+        # Takes the SkillNode of a virtual scene's node out of the scene. The NodeLayer draws the node
+        # from then on and the item is kept for reuse by create_node_item
+        node = self.node_items.pop(node_id)
+        if node.isUnderMouse():
+            self.tooltip.hide_tooltip()
+            self.update_hover_label(None)
+        node.setSelected(False)
+        self.node_index.remove(node)
+        self.scene.removeItem(node)
+        self.node_layer.update(node.sceneBoundingRect())
+        if len(self.node_pool) < NODE_POOL_SIZE:
+            self.node_pool.append(node)
+
+    def model_position(self, node_id):
+        record = self.model.record(node_id)
+        return record.x, record.y
+
+    def pinned_node_ids(self):
+        # Nodes the user is working on keep their SkillNode even when they're scrolled out of view
+        pinned = {node.node_id for node in self.scene.selectedItems() if isinstance(node, SkillNode)}
+        for node in (self.selected_node, self.skill_panel.current_node):
+            if node:
+                pinned.add(node.node_id)
+        for node in self.dragging_nodes or ():
+            pinned.add(node.node_id)
+        return pinned
+
+    def schedule_viewport_sync(self, *args):
+        if self.virtual and not self.viewport_sync_timer.isActive():
+            self.viewport_sync_timer.start()
+
+    def sync_viewport(self):
+        # Materializes SkillNodes for the nodes in and around the viewport and releases the others.
+        # Zoomed out below LOD_POINTS, or with more than MAX_MATERIALIZED_NODES around, nodes stay
+        # with the NodeLayer, they are just colored squares at that point anyway
+        if not self.virtual:
+            return
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        margin_x, margin_y = rect.width() * VIRTUAL_MARGIN, rect.height() * VIRTUAL_MARGIN
+        wanted = set()
+        if self.view.transform().m11() >= LOD_POINTS:
+            node_ids = self.model_index.query_rect(rect.left() - margin_x, rect.top() - margin_y,
+                                                   rect.right() + margin_x, rect.bottom() + margin_y)
+            if len(node_ids) <= MAX_MATERIALIZED_NODES:
+                wanted = set(node_ids)
+        pinned = self.pinned_node_ids()
+        for node_id in [node_id for node_id in self.node_items if node_id not in wanted and node_id not in pinned]:
+            self.release_node_item(node_id)
+        for node_id in wanted:
+            if node_id not in self.node_items:
+                self.create_node_item(node_id)
+
+    def rebuild_scene(self):
+        # Throws away every node item and recreates them from the model.
+        # The scene index is switched off while populating (each addItem would otherwise update the
+        # BSP tree) and rebuilt once at the end. Items go in batches so the window keeps repainting
+        start = time.perf_counter()
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        for node in self.node_items.values():
+            node.prep_for_deletion()
+            self.scene.removeItem(node)
+        self.node_items = {}
+        self.edge_lines = {}
+        self.node_index.clear()
+        self.edge_layer.clear()
+        self.clear_cycle_highlight()
+        self.node_pool = []
+        self.model_index.clear()
+        self.node_layer.clear()
+        self.virtual = len(self.model) >= VIRTUAL_SCENE_THRESHOLD
+        self.node_layer.setVisible(self.virtual)
+        self.use_edge_layer = self.virtual or self.model.edge_count() >= EDGE_LAYER_THRESHOLD
+        self.edge_layer.positions = self.model_position if self.virtual else None
+        if self.virtual:
+            # Only the model index and the edges, SkillNodes come from sync_viewport
+            for node_id, record in self.model.nodes.items():
+                self.model_index.insert(node_id, record.x, record.y)
+                self.node_layer.include(record.x, record.y)
+            for count, (src_id, dst_id) in enumerate(self.model.edges(), 1):
+                self.edge_lines[src_id, dst_id] = self.edge_layer.add_edge(src_id, dst_id)
+                if count % SCENE_BATCH_SIZE == 0:
+                    self.process_paint_events()
+            self.sync_viewport()
+        else:
+            for count, node_id in enumerate(self.model.node_ids(), 1):
+                self.create_node_item(node_id)
+                if count % SCENE_BATCH_SIZE == 0:
+                    self.process_paint_events()
+            for count, (src_id, dst_id) in enumerate(self.model.edges(), 1):  # every edge exactly once
+                self.node_items[dst_id].link_prerequisite(self.node_items[src_id])
+                if count % SCENE_BATCH_SIZE == 0:
+                    self.process_paint_events()
+        self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.last_scene_build_seconds = time.perf_counter() - start
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_viewport_sync()
+
+    def process_paint_events(self):
+        # Lets Qt repaint during long operations without handling clicks halfway through them
+        QApplication.processEvents(QEventLoop.ExcludeUserInputEvents)
 
     def closeEvent(self, event):
         # Checks if there are unsaved changes before exiting.
-        temp_file = "skill_tree/_temp_skill_tree.json"
         save_file = "skill_tree/skill_tree.json"
+        self.saver.wait()  # let a running save finish first
 
-        if os.path.exists(temp_file):  # ✅ Check if temp save exists
+        if self.journal.has_unsaved_changes():  # ✅ Check if journal / temp save exists
             reply = QMessageBox.question(
                 self, "Unsaved Changes",
                 "There are unsaved changes. Do you want to save before exiting?",
@@ -404,13 +1163,12 @@ class MainWindow(QMainWindow):
             )
 
             if reply == QMessageBox.Save:
-                self.save_skill_tree(save_file)  # ✅ Save the temp file permanently
-                os.remove(temp_file)  # ✅ Clean up temp file
+                self.save_skill_tree(save_file, blocking=True)  # ✅ Save the tree permanently, cleans up journal and temp file
                 print("Changes saved before exit.")
                 event.accept()  # ✅ Allow exit
 
             elif reply == QMessageBox.Discard:
-                os.remove(temp_file)  # ❌ Delete temp file (Exit without saving)
+                self.journal.discard()  # ❌ Delete journal and temp file (Exit without saving)
                 print("Exiting without saving changes.")
                 event.accept()  # ✅ Allow exit
 
@@ -418,7 +1176,7 @@ class MainWindow(QMainWindow):
                 print("Exit canceled.")
                 event.ignore()  # 🔄 Cancel exit
         else:
-            event.accept()  # ✅ Normal exit if no temp file exists
+            event.accept()  # ✅ Normal exit if no unsaved changes
 
     def begin_set_prereq(self, node):
         # Starts the process of setting a prerequisite to a node. Called by right click menu
@@ -446,18 +1204,44 @@ class MainWindow(QMainWindow):
 
     def complete_node_selection(self, node):
         # Complete setting pre/postreq and finalized the connection line
+        # Started from a node in a multi-selection, every selected node gets connected
         if node == self.selected_node:
             return
+        sources = [source for source in self.selection_group(self.selected_node) if source is not node]
         if self.mouse_state == MouseState.SELECTING_PREREQ:
-            self.selected_node.add_prerequisite(node)
+            self.connect_nodes([(node.node_id, source.node_id) for source in sources])
         elif self.mouse_state == MouseState.SELECTING_POSTREQ:
-            self.selected_node.add_postrequisite(node)
+            self.connect_nodes([(source.node_id, node.node_id) for source in sources])
         elif self.mouse_state == MouseState.DELETING_CONNECTIONS:
-            self.selected_node.delete_connections(node)
+            with self.batch_edit(len(sources)):
+                for source in sources:
+                    source.delete_connections(node)
+                self.auto_save_skill_tree()
 
         if self.temp_line:
             self.delete_temp_line()
 
+    def show_cycle(self, path):
+        # Selects and outlines the chain of existing connections that a rejected connection would
+        # have closed into a cycle. Cleared on the next left click
+        self.clear_cycle_highlight()
+        nodes = [node for node in map(self.node_item, path) if node]
+        if not nodes:
+            return
+        outline = QPainterPath(nodes[0].pos())
+        for node in nodes[1:] + nodes[:1]:
+            outline.lineTo(node.pos())
+        self.cycle_highlight = self.scene.addPath(outline, self.cycle_pen)
+        self.cycle_highlight.setZValue(2)  # over the connections
+        self.scene.clearSelection()
+        for node in nodes:
+            node.setSelected(True)
+
+    def clear_cycle_highlight(self):
+        if self.cycle_highlight:
+            self.scene.removeItem(self.cycle_highlight)
+            self.cycle_highlight = None
+
     def update_mouse_state_label(self):
         state_text = {
             MouseState.IDLE: "IDLE",
@@ -476,7 +1260,17 @@ class MainWindow(QMainWindow):
             del self.temp_line
             self.temp_line = None
 
+    def create_connecting_line(self, start_node, end_node):
+        # Returns a ConnectionLine, or a LayerEdge handle with the same API when the edge layer is on
+        if self.use_edge_layer:
+            return self.edge_layer.add_edge(start_node, end_node)
+        line = ConnectionLine(start_node, end_node)
+        self.scene.addItem(line)
+        return line
+
     def delete_connecting_line(self, line):
-        if line:
+        if isinstance(line, LayerEdge):
+            self.edge_layer.remove_edge(line)
+        elif line:
             self.scene.removeItem(line)
             del line
@@ -0,0 +1,82 @@
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtGui import QPainterPath
+from PyQt5.QtCore import Qt, QRectF
+from level_of_detail import LOD_POINTS, LOD_NO_OUTLINES
+from skill_node import NODE_RADIUS, DEFAULT_PEN, node_brush
+from low_detail_cache import LowDetailCache
+
+
+class NodeLayer(QGraphicsItem):
+    # Paints the nodes of a virtualized scene that have no SkillNode, straight from the model through
+    # MainWindow.model_index, looking like SkillNode.paint would at the current zoom. Materialized
+    # nodes are skipped, they paint themselves. Zoomed far out (or while sync_viewport hasn't caught
+    # up with a fast pan yet) this is what draws the tree. Below LOD_POINTS it paints from a
+    # LowDetailCache holding every node, materialized or not, so materializing doesn't invalidate it;
+    # MainWindow calls invalidate() when nodes are added, removed, moved or recolored.
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.bounds = QRectF()
+        self.low_detail = LowDetailCache()
+        self.setZValue(-1)  # Under the SkillNodes and the edges
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # gives paint() the exposed rect
+
+    def include(self, x, y):
+        # Grows the bounding rect to cover a node at (x, y)
+        rect = QRectF(x - NODE_RADIUS, y - NODE_RADIUS, 2 * NODE_RADIUS, 2 * NODE_RADIUS)
+        if not self.bounds.contains(rect):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(rect)
+
+    def clear(self):
+        self.prepareGeometryChange()
+        self.bounds = QRectF()
+        self.low_detail.invalidate()
+
+    def invalidate(self):
+        self.low_detail.invalidate()
+        self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def shape(self):
+        return QPainterPath()  # never picked by scene.items(pos)
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < LOD_POINTS:
+            self.low_detail.paint(painter, option, lod, self.bounds,
+                                  lambda image_painter, rect, scale: self.draw_nodes(image_painter, rect, scale, ()))
+        else:
+            self.low_detail.invalidate()  # zoomed in, don't keep the picture around
+            self.draw_nodes(painter, option.exposedRect, lod, self.main_window.node_items)
+
+    def draw_nodes(self, painter, rect, lod, materialized):
+        # Draws the nodes inside rect, except the ones in materialized
+        main_window = self.main_window
+        model = main_window.model
+        node_ids = main_window.model_index.query_rect(rect.left() - NODE_RADIUS, rect.top() - NODE_RADIUS,
+                                                      rect.right() + NODE_RADIUS, rect.bottom() + NODE_RADIUS)
+        # One brush change per node type (or heat step) instead of one per node. Brushes are shared
+        # objects (see skill_node.py), so they're grouped by identity
+        groups = {}
+        for node_id in node_ids:
+            if node_id in materialized:
+                continue
+            record = model.record(node_id)
+            brush = node_brush(main_window, node_id, record.upgrade)
+            group = groups.get(id(brush))
+            if group is None:
+                group = groups[id(brush)] = (brush, [])
+            group[1].append(QRectF(record.x - NODE_RADIUS, record.y - NODE_RADIUS, 2 * NODE_RADIUS, 2 * NODE_RADIUS))
+
+        painter.setPen(DEFAULT_PEN if lod >= LOD_NO_OUTLINES else Qt.NoPen)
+        for brush, rects in groups.values():
+            painter.setBrush(brush)
+            if lod < LOD_POINTS:
+                painter.drawRects(rects)
+            else:
+                for node_rect in rects:
+                    painter.drawEllipse(node_rect)
@@ -0,0 +1,163 @@
+# Monte Carlo player progression. Answers "after N skill points, what fraction of players has each
+# upgrade, and at which point did they usually get it?" for a SkillTreeModel.
+#
+# Every skill point a player unlocks one available node (all prerequisites unlocked), picked at
+# random with probability proportional to the node's policy weight. Instead of stepping each player
+# point by point, every node gets an exponential clock with its weight as rate that starts when it
+# becomes available. Clocks are memoryless, so the next one to ring is always a weighted random pick
+# among the available nodes, and the unlock time of a node is simply
+#     time[node] = max(time[prerequisite] for its prerequisites) + clock[node]
+# which is evaluated for a whole batch of players at once, one tier of the tree at a time. The order
+# of a player's unlock times is their order of picks.
+#
+# Needs numpy, which the editor itself doesn't; MainWindow only imports this module when a
+# simulation is started.
+#     python progression_simulator.py skill_tree/skill_tree.json 20 [players] [policy]
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import math
+import multiprocessing
+import sys
+import numpy as np
+from upgrade import Upgrade
+
+MAX_STEP_BINS = 256  # resolution of the unlock step histograms used for the medians
+MAX_WORKERS = 4  # every worker holds a chunk of about CHUNK_MEMORY, more rarely pays off on a laptop
+CHUNK_MEMORY = 64 << 20  # bytes per chunk of players, see chunk_players
+
+# Policy = weight per upgrade type (missing types weigh 1) and a per-tier factor:
+# weight = type_weight * tier_bias ** depth. tier_bias < 1 finishes the low tiers first, > 1 rushes deep
+Policy = namedtuple("Policy", ["type_weights", "tier_bias"])
+
+POLICIES = {
+    "uniform": Policy({}, 1.0),
+    "breadth_first": Policy({}, 0.2),
+    "rush": Policy({}, 5.0),
+    "abilities_first": Policy({Upgrade.Upgrade_Type.ACTIVE_ABILITY: 4.0, Upgrade.Upgrade_Type.PASSIVE_ABILITY: 2.0}, 1.0),
+    "unlocks_first": Policy({Upgrade.Upgrade_Type.WEAPON_UNLOCK: 4.0, Upgrade.Upgrade_Type.CLASS_UNLOCK: 4.0}, 1.0),
+}
+
+# node_ids: the simulated nodes. levels: [(node indices, prerequisite indices of those nodes
+# concatenated, start of each node's run in there)] for every tier above 0, in tier order.
+# rates: clock rate (policy weight) per node
+CompiledTree = namedtuple("CompiledTree", ["node_ids", "rates", "levels"])
+
+# reach_probability[i]: fraction of players who have node_ids[i] after `points` skill points.
+# median_step[i]: median skill point (1 based) it was unlocked with by those players, nan if nobody.
+# Nodes missing from node_ids are too deep to be reached with that many points
+SimulationResult = namedtuple("SimulationResult", ["node_ids", "reach_probability", "median_step", "players", "points"])
+
+
+def compile_tree(model, policy="uniform", points=None):
+    # Flattens the prerequisite graph into index arrays grouped by tier. Cheap, done on the GUI thread.
+    # A node of tier t needs at least t + 1 points, so with a points budget deeper nodes are left out
+    if isinstance(policy, str):
+        policy = POLICIES[policy]
+    node_ids = [node_id for node_id in model.ordered_ids() if points is None or model.depth(node_id) < points]
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    depth = [model.depth(node_id) for node_id in node_ids]
+    rates = np.array([policy.type_weights.get(model.record(node_id).upgrade.upgrade_type, 1.0)
+                      * policy.tier_bias ** depth[i] for i, node_id in enumerate(node_ids)])
+
+    tiers = {}
+    for i, node_id in enumerate(node_ids):
+        if depth[i]:
+            tiers.setdefault(depth[i], []).append(i)
+    levels = []
+    for tier in sorted(tiers):
+        nodes, sources, starts = tiers[tier], [], []
+        for i in nodes:
+            starts.append(len(sources))
+            # Prerequisites of a lower tier only (edges inside cycles of old files are ignored)
+            sources.extend(index[src_id] for src_id in model.prerequisites[node_ids[i]]
+                           if depth[index[src_id]] < tier)
+        levels.append((np.array(nodes, dtype=np.intp), np.array(sources, dtype=np.intp), np.array(starts, dtype=np.intp)))
+    return CompiledTree(np.array(node_ids), rates, levels)
+
+
+def step_bin_width(points):
+    return max(1, math.ceil(points / MAX_STEP_BINS))
+
+
+def simulate_chunk(tree, points, players, seed):
+    # Runs one batch of players. Returns the unlock step histogram, shape (nodes, bins)
+    rng = np.random.default_rng(seed)
+    node_count = len(tree.node_ids)
+    points = min(points, node_count)
+    bin_width = step_bin_width(points)
+    bins = math.ceil(points / bin_width) if points else 1
+    if not points:
+        return np.zeros((node_count, bins), dtype=np.int64)
+
+    # Node-major so every tier works on whole contiguous rows
+    times = rng.standard_exponential((node_count, players), dtype=np.float32)
+    times /= tree.rates[:, None].astype(np.float32)
+    for nodes, sources, starts in tree.levels:
+        times[nodes] += np.maximum.reduceat(times[sources], starts, axis=0)
+
+    # Player-major from here, partitioning along contiguous rows is several times faster than along the columns
+    times = np.ascontiguousarray(times.T)
+    # Time of every player's last point. Partitioning the values instead of argpartition needs no index
+    # array the size of times, only the (player, node) pairs of the unlocked nodes are kept
+    last = np.partition(times, points - 1, axis=1)[:, points - 1].copy() if points < node_count else times.max(axis=1)
+    player_index, unlocked = np.nonzero(times <= last[:, None])  # grouped by player
+    order = np.lexsort((times[player_index, unlocked], player_index))
+    player_index, unlocked = player_index[order], unlocked[order]
+    step = np.arange(len(order)) - np.searchsorted(player_index, player_index)  # 0 based pick of each pair
+    keep = step < points  # ties at the last time
+    flat = unlocked[keep] * bins + step[keep] // bin_width
+    return np.bincount(flat, minlength=node_count * bins).reshape(node_count, bins)
+
+
+def chunk_players(tree, points):
+    # Players per chunk that fit CHUNK_MEMORY. Per player a chunk holds a float32 time per node twice
+    # (while transposing and partitioning), the biggest tier's gathered prerequisite times, a bool mask
+    # and a few int64 / float arrays per unlocked node
+    node_count = len(tree.node_ids)
+    widest_tier = max((len(sources) for _, sources, _ in tree.levels), default=0)
+    per_player = 4 * (2 * node_count + widest_tier) + node_count + 64 * min(points, node_count)
+    return max(64, CHUNK_MEMORY // max(1, per_player))
+
+
+def simulate(tree, points, players=100000, seed=None, chunk_size=None, workers=1):
+    # tree comes from compile_tree. Players run in chunks of chunk_size (default: as many as fit
+    # CHUNK_MEMORY), spread over a process pool of up to MAX_WORKERS if workers > 1. Workers are
+    # spawned, not forked, since the editor runs this on a worker thread of a multithreaded Qt process
+    chunk_size = chunk_size or chunk_players(tree, points)
+    workers = min(workers, MAX_WORKERS)
+    chunk_count = max(1, math.ceil(players / chunk_size))
+    sizes = [players // chunk_count + (i < players % chunk_count) for i in range(chunk_count)]
+    seeds = np.random.SeedSequence(seed).spawn(chunk_count)
+    args = ([tree] * chunk_count, [points] * chunk_count, sizes, seeds)
+    if workers > 1 and chunk_count > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            histogram = sum(pool.map(simulate_chunk, *args))
+    else:
+        histogram = sum(map(simulate_chunk, *args))
+
+    reached = histogram.sum(axis=1)
+    median_bin = (histogram.cumsum(axis=1) >= (reached[:, None] + 1) // 2).argmax(axis=1)
+    bin_width = step_bin_width(min(points, len(tree.node_ids)))
+    median_step = np.where(reached > 0, median_bin * bin_width + (bin_width + 1) / 2, np.nan)
+    return SimulationResult(tree.node_ids, reached / players, median_step, players, points)
+
+
+def run(model, points, players=100000, policy="uniform", seed=None, workers=1):
+    return simulate(compile_tree(model, policy, points), points, players, seed, workers=workers)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(f"usage: python progression_simulator.py <tree .json|.stb> <skill points> [players] [{'|'.join(POLICIES)}]")
+        sys.exit(1)
+    import time
+    from skill_tree_model import SkillTreeModel
+    model = SkillTreeModel()
+    model.load(sys.argv[1])
+    start = time.perf_counter()
+    result = run(model, int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 100000,
+                 sys.argv[4] if len(sys.argv) > 4 else "uniform")
+    print(f"{result.players} players, {len(model)} nodes in {time.perf_counter() - start:.2f} s")
+    print("nodes not listed can't be reached")
+    for node_id, probability, median in zip(result.node_ids, result.reach_probability, result.median_step):
+        print(f"{node_id}\t{model.record(node_id).upgrade.name}\t{probability:.3f}\t{median:.1f}")
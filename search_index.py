@@ -0,0 +1,123 @@
+import re
+from bisect import bisect_left, insort
+from skill_tree_model import ModelEvent
+
+TOKEN_PATTERN = re.compile(r"\w+")
+TERM_PATTERN = re.compile(r"(\w+)(\*?)")  # query words, "*" marks a prefix
+PREFIX_SCAN_LIMIT = 5000  # prefix terms filter candidate sets smaller than this instead of merging postings
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    # Inverted index over the upgrades of a SkillTreeModel (name, description and type). Kept up to
+    # date from model events like the journal and the undo stack, so adding, deleting or editing a node
+    # (SkillPanel.save_changes goes through set_upgrade) only costs as much as that node's text.
+    # Built on the first search after a load, so big trees don't pay for it unless it gets used.
+    #
+    # A query is a list of words that all have to match (AND). A word matches whole tokens, or every
+    # token it starts if it ends in "*". prefix_last=True reads the last word as a prefix too (search as you type)
+    def __init__(self, model):
+        self.model = model
+        self.postings = {}  # token -> set of node ids
+        self.tokens = []  # every token, sorted for the prefix lookups
+        self.node_tokens = {}  # node_id -> tokens of its upgrade, to take it out again
+        self.types = {}  # upgrade_type -> set of node ids
+        self.stale = True  # rebuilt by the next search
+        model.add_listener(self.on_model_event)
+
+    def on_model_event(self, event, *args):
+        if event == ModelEvent.RESET:
+            self.stale = True
+        elif self.stale:
+            return
+        elif event == ModelEvent.NODE_ADDED:
+            self.add(args[0], self.model.record(args[0]).upgrade)
+        elif event == ModelEvent.NODE_REMOVED:
+            self.remove(args[0], args[1].upgrade)
+        elif event == ModelEvent.UPGRADE_CHANGED:
+            self.remove(args[0], args[1])
+            self.add(args[0], self.model.record(args[0]).upgrade)
+
+    def rebuild(self):
+        self.postings = {}
+        self.node_tokens = {}
+        self.types = {}
+        for node_id, record in self.model.nodes.items():
+            self.index(node_id, record.upgrade)
+        self.tokens = sorted(self.postings)  # one sort instead of an insort per token
+        self.stale = False
+
+    def index(self, node_id, upgrade):
+        # Adds the node to the postings, returns the tokens that weren't in the index before
+        tokens = set(tokenize(f"{upgrade.name} {upgrade.description}"))
+        self.node_tokens[node_id] = tuple(tokens)
+        new_tokens = []
+        for token in tokens:
+            node_ids = self.postings.get(token)
+            if node_ids is None:
+                node_ids = self.postings[token] = set()
+                new_tokens.append(token)
+            node_ids.add(node_id)
+        self.types.setdefault(upgrade.upgrade_type, set()).add(node_id)
+        return new_tokens
+
+    def add(self, node_id, upgrade):
+        for token in self.index(node_id, upgrade):
+            insort(self.tokens, token)
+
+    def remove(self, node_id, upgrade):
+        for token in self.node_tokens.pop(node_id, ()):
+            node_ids = self.postings[token]
+            node_ids.discard(node_id)
+            if not node_ids:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+        node_ids = self.types.get(upgrade.upgrade_type)
+        if node_ids:
+            node_ids.discard(node_id)
+
+    def prefix_ids(self, prefix):
+        # Every node with a token starting with prefix
+        node_ids = set()
+        tokens = self.tokens
+        for index in range(bisect_left(tokens, prefix), len(tokens)):
+            if not tokens[index].startswith(prefix):
+                break
+            node_ids.update(self.postings[tokens[index]])
+        return node_ids
+
+    def search(self, query, upgrade_type=None, prefix_last=False):
+        # Sorted ids of the nodes matching every word of query and upgrade_type (None for any type).
+        # An empty query with a type gives every node of that type
+        if self.stale:
+            self.rebuild()
+        terms = TERM_PATTERN.findall(query.lower())
+        exact = [self.postings.get(token, set()) for token, star in terms[:-1] if not star]
+        prefixes = [token for token, star in terms[:-1] if star]
+        if terms:
+            token, star = terms[-1]
+            if star or prefix_last:
+                prefixes.append(token)
+            else:
+                exact.append(self.postings.get(token, set()))
+        if upgrade_type:
+            exact.append(self.types.get(upgrade_type, set()))
+        if not exact and not prefixes:
+            return []
+
+        # Smallest sets first, so every step only shrinks the result
+        exact.sort(key=len)
+        result = set(exact[0]) if exact else None
+        for node_ids in exact[1:]:
+            result &= node_ids
+        for prefix in prefixes:
+            if result is not None and len(result) < PREFIX_SCAN_LIMIT:
+                result = {node_id for node_id in result
+                          if any(token.startswith(prefix) for token in self.node_tokens[node_id])}
+            else:
+                node_ids = self.prefix_ids(prefix)
+                result = node_ids if result is None else result & node_ids
+        return sorted(result)
@@ -2,17 +2,62 @@ from PyQt5.QtWidgets import QGraphicsEllipseItem
 from PyQt5.QtGui import QBrush, QPen, QColor
 from PyQt5.QtCore import Qt, QPointF
 from upgrade import Upgrade
-from connection_line import ConnectionLine
+from level_of_detail import LOD_POINTS, LOD_NO_OUTLINES
+from itertools import islice
+from types import MappingProxyType
+
+NODE_RADIUS = 20
+MAX_TOOLTIP_NAMES = 12  # neighbors listed by name in the tooltip, the rest is summarized as "N more…"
+
+# Styles shared by every node (Qt pens and brushes are implicitly shared, so items only hold a reference)
+DEFAULT_PEN = QPen(Qt.black, 2)  # Default black outline
+HOVER_PEN = QPen(QColor(255, 215, 0), 3)  # Gold outline when hovered
+TYPE_BRUSHES = {
+    Upgrade.Upgrade_Type.WEAPON_UNLOCK: QBrush(QColor(139, 69, 19)),   # Brown
+    Upgrade.Upgrade_Type.CLASS_UNLOCK: QBrush(QColor(30, 144, 255)),   # Blue
+    Upgrade.Upgrade_Type.ACTIVE_ABILITY: QBrush(QColor(220, 20, 60)),  # Red
+    Upgrade.Upgrade_Type.PASSIVE_ABILITY: QBrush(QColor(34, 139, 34))  # Green
+}
+UNKNOWN_TYPE_BRUSH = QBrush(QColor(100, 100, 100))  # Gray
+HEAT_STEPS = 100  # heatmap colors are rounded to whole percents
+# Stands in for the neighbor/line dicts of a node until it gets its first connection, most nodes of a
+# big tree are leaves on at least one side. Read-only, so a missed copy-on-write fails loudly
+NO_LINKS = MappingProxyType({})
+
+
+def format_neighbor_names(model, node_ids):
+    # Comma separated names of at most MAX_TOOLTIP_NAMES nodes, so text layout cost stays bounded.
+    # Names come from the model, neighbors don't need a SkillNode (see MainWindow.sync_viewport)
+    names = ", ".join(model.record(node_id).upgrade.name for node_id in islice(node_ids, MAX_TOOLTIP_NAMES))
+    if len(node_ids) > MAX_TOOLTIP_NAMES:
+        names += f" and {len(node_ids) - MAX_TOOLTIP_NAMES} more…"
+    return names or "None"
+
+
+def heat_color(probability):
+    # Red (no player reaches the node) -> yellow -> green (every player does)
+    red = 255 if probability < 0.5 else int(510 * (1 - probability))
+    green = int(510 * probability) if probability < 0.5 else 255
+    return QColor(red, green, 0)
+
+
+HEAT_BRUSHES = [QBrush(heat_color(step / HEAT_STEPS)) for step in range(HEAT_STEPS + 1)]
+
+
+def node_brush(main_window, node_id, upgrade):
+    # Fill of a node: its simulated reach while the heatmap is shown, its type otherwise
+    heat = main_window.heatmap.get(node_id) if main_window.heatmap_visible else None
+    if heat is not None:
+        return HEAT_BRUSHES[round(heat[0] * HEAT_STEPS)]
+    return TYPE_BRUSHES.get(upgrade.upgrade_type, UNKNOWN_TYPE_BRUSH)
 
 
 class SkillNode(QGraphicsEllipseItem):
-    def __init__(self, main_window, x, y, node_id=None):
-        super().__init__(-20, -20, 40, 40)  # Bounding box of ellipse is 40,40 and center is at 0,0 (-20, -20 top left)
+    def __init__(self, main_window, x, y, node_id, upgrade):
+        super().__init__(-NODE_RADIUS, -NODE_RADIUS, 2 * NODE_RADIUS, 2 * NODE_RADIUS)  # Bounding box of ellipse is 40,40 and center is at 0,0 (-20, -20 top left)
         self.main_window = main_window
 
-        self.default_pen = QPen(Qt.black, 2)  # Default black outline
-        self.hover_pen = QPen(QColor(255, 215, 0), 3)  # Gold outline when hovered
-        self.setPen(self.default_pen)
+        self.setPen(DEFAULT_PEN)
 
         self.setAcceptHoverEvents(True)
 
@@ -20,45 +65,63 @@ class SkillNode(QGraphicsEllipseItem):
             QGraphicsEllipseItem.ItemIsMovable |
             QGraphicsEllipseItem.ItemIsSelectable)
 
+        # Ids are handed out by the SkillTreeModel, the node is only the view of a model record
+        self.node_id = node_id
+        self.upgrade = upgrade  # Shared with the model record, never edited in place
 
-
-        # Initialize relationships
-        self.prerequisites = []  # List of prerequisite nodes
-        self.postrequisites = []  # List of postrequisite nodes
+        # Initialize relationships. These mirror the model's adjacency for the lines in the scene.
+        # Dicts are used as insertion ordered sets (item -> None) so adding/removing is O(1) and
+        # tooltips still list neighbors in the order they were connected. They start out as the
+        # shared NO_LINKS and are only allocated by link_prerequisite
+        self.prerequisites = NO_LINKS  # prerequisite nodes
+        self.postrequisites = NO_LINKS  # postrequisite nodes
 
         # Track lines going into and out of node
-        self.outgoing_lines = []
-        self.incoming_lines = []
+        self.outgoing_lines = NO_LINKS
+        self.incoming_lines = NO_LINKS
 
-        self.setPos(x, y)  # Move after initializing the lines arrays
+        self.tooltip_text = None  # cached hover text, rebuilt after invalidate_tooltip()
 
-        # internal stuff
-        if node_id is not None:
-            self.node_id = node_id  # retain existing id if loading from save
-        else:
-            self.node_id = self.main_window.current_node_id
-            self.main_window.current_node_id += 1
-
-        # Each node starts with an empty upgrade
-        self.upgrade = Upgrade(
-            name=f"Upgrade {self.node_id}",  # Default name based on node ID
-            description="Default Upgrade Description",
-            upgrade_type=Upgrade.Upgrade_Type.PASSIVE_ABILITY,
-        )
+        self.setPos(x, y)  # Move after initializing the lines arrays
         self.update_color()  # Set initial color based on upgrade type
 
     def update_color(self):
-        color_map = {
-            Upgrade.Upgrade_Type.WEAPON_UNLOCK: QColor(139, 69, 19),   # Brown
-            Upgrade.Upgrade_Type.CLASS_UNLOCK: QColor(30, 144, 255),   # Blue
-            Upgrade.Upgrade_Type.ACTIVE_ABILITY: QColor(220, 20, 60),  # Red
-            Upgrade.Upgrade_Type.PASSIVE_ABILITY: QColor(34, 139, 34)  # Green
-        }
-        self.setBrush(QBrush(color_map.get(self.upgrade.upgrade_type, QColor(100, 100, 100))))  # Default Gray if unknown
+        self.setBrush(node_brush(self.main_window, self.node_id, self.upgrade))
+
+    def bind(self, node_id, record):
+        # Points a recycled item at another model record (virtualized scenes reuse SkillNodes)
+        self.node_id = node_id
+        self.upgrade = record.upgrade
+        self.tooltip_text = None
+        self.setPen(DEFAULT_PEN)
+        self.move_without_lines(record.x, record.y)
+        self.update_color()
+
+    def set_upgrade(self, name, description, upgrade_type):
+        # Edits go through the model, which calls apply_upgrade back on this node
+        self.main_window.model.set_upgrade(self.node_id, name, description, upgrade_type)
+
+    def paint(self, painter, option, widget=None):
+        # Zoomed out, nodes skip their pen and then collapse into flat colored squares
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < LOD_POINTS:
+            painter.fillRect(self.rect(), self.brush().color())
+        elif lod < LOD_NO_OUTLINES:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self.brush())
+            painter.drawEllipse(self.rect())
+        else:
+            super().paint(painter, option, widget)
 
     def change_upgrade_type(self, new_type):
-        self.upgrade.upgrade_type = new_type
+        self.set_upgrade(self.upgrade.name, self.upgrade.description, new_type)
+
+    def apply_upgrade(self, upgrade):
+        # Called when the model record of this node got a new upgrade
+        self.upgrade = upgrade
         self.update_color()
+        self.invalidate_tooltip()
+        self.main_window.invalidate_neighbor_tooltips(self.node_id)
 
     def on_left_click_pressed(self):
         print(f"Clicked on {self.skill_type} skill node!")
@@ -73,23 +136,37 @@ class SkillNode(QGraphicsEllipseItem):
         print("release right click over skill node")
 
     def hoverEnterEvent(self, event):
-        self.setPen(self.hover_pen)  # Highlight node
-        self.main_window.update_hover_label("Node")
+        self.setPen(HOVER_PEN)  # Highlight node
+        hover_text = f"Node (tier {self.main_window.model.depth(self.node_id)})"
+        heat = self.main_window.heatmap.get(self.node_id) if self.main_window.heatmap_visible else None
+        if heat is not None:
+            hover_text += f", {heat[0]:.0%} reach it"
+            if heat[0]:
+                hover_text += f" by point {heat[1]:.0f}"
+        self.main_window.update_hover_label(hover_text)
+
+        self.main_window.tooltip.update_tooltip(self.get_tooltip_text(), event.scenePos())
+        super().hoverEnterEvent(event)
 
-        prereq_text = ", ".join(self.get_prerequisite_names()) or "None"
-        postreq_text = ", ".join(self.get_postrequisite_names()) or "None"
+    def get_tooltip_text(self):
+        # Built once and cached until the upgrade, id or connections of this node (or a neighbor's name) change
+        if self.tooltip_text is None:
+            model = self.main_window.model
+            prereq_text = format_neighbor_names(model, model.prerequisites[self.node_id])
+            postreq_text = format_neighbor_names(model, model.postrequisites[self.node_id])
 
-        description = f"Node ID: {self.node_id}\n"
-        description += f"{self.upgrade.upgrade_type}: {self.upgrade.name}\n"
-        description += f"{self.upgrade.description}\n"
-        description += f"Prerequisites: {prereq_text}\nPostrequisites: {postreq_text}"
+            description = f"Node ID: {self.node_id}\n"
+            description += f"{self.upgrade.upgrade_type}: {self.upgrade.name}\n"
+            description += f"{self.upgrade.description}\n"
+            description += f"Prerequisites: {prereq_text}\nPostrequisites: {postreq_text}"
+            self.tooltip_text = description
+        return self.tooltip_text
 
-
-        self.main_window.tooltip.update_tooltip(description, event.scenePos())
-        super().hoverEnterEvent(event)
+    def invalidate_tooltip(self):
+        self.tooltip_text = None
 
     def hoverLeaveEvent(self, event):
-        self.setPen(self.default_pen)
+        self.setPen(DEFAULT_PEN)
         self.main_window.update_hover_label(None)
         self.main_window.tooltip.hide_tooltip()
         super().hoverLeaveEvent(event)
@@ -100,50 +177,52 @@ class SkillNode(QGraphicsEllipseItem):
         self.setPos(snapped_x, snapped_y)
 
     def add_prerequisite(self, node):
-        if node not in self.prerequisites:
-            self.prerequisites.append(node)
-            node.postrequisites.append(self)  # Add this node as a postrequisite
-
-            line = ConnectionLine(node, self)  # direction always node (prereq) → self (postreq)
-            self.main_window.scene.addItem(line)
-            self.incoming_lines.append(line)
-            node.outgoing_lines.append(line)
+        # direction always node (prereq) → self (postreq). The lines get created by link_prerequisite
+        self.main_window.model.add_edge(node.node_id, self.node_id)
 
     def add_postrequisite(self, node):
-        #if node not in self.postrequisites:
-        #    self.postrequisites.append(node)
-        #    node.prerequisites.append(self)  # Add this node as a prerequisite
         node.add_prerequisite(self)
 
     def delete_prerequisite(self, node):
-        if node in self.prerequisites:
-            self.prerequisites.remove(node)
-            if self in node.postrequisites:
-                node.postrequisites.remove(self)
-
-            for line in self.incoming_lines[:]:  # copy list to avoid modiication issues
-                if line.start_node == node and line.end_node == self:
-                    self.incoming_lines.remove(line)
-                    if line in node.outgoing_lines:
-                        node.outgoing_lines.remove(line)
-                    self.main_window.scene.removeItem(line)
-                    del line
-                    break
+        self.main_window.model.remove_edge(node.node_id, self.node_id)
 
     def delete_postrequisite(self, node):
-        if node in self.postrequisites:
-            self.postrequisites.remove(node)
-            if self in node.prerequisites:
-                node.prerequisites.remove(self)
-
-            for line in self.outgoing_lines[:]:
-                if line.start_node == self and line.end_node == node:
-                    self.outgoing_lines.remove(line)
-                    if line in node.incoming_lines:
-                        node.incoming_lines.remove(line)
-                    self.main_window.scene.removeItem(line)
-                    del line
-                    break
+        self.main_window.model.remove_edge(self.node_id, node.node_id)
+
+    def link_prerequisite(self, node):
+        # Scene side of add_prerequisite, called once the model has the edge
+        if node in self.prerequisites:
+            return
+        if self.prerequisites is NO_LINKS:
+            self.prerequisites = {}
+            self.incoming_lines = {}
+        if node.postrequisites is NO_LINKS:
+            node.postrequisites = {}
+            node.outgoing_lines = {}
+        self.prerequisites[node] = None
+        node.postrequisites[self] = None  # Add this node as a postrequisite
+        self.invalidate_tooltip()
+        node.invalidate_tooltip()
+
+        line = self.main_window.create_connecting_line(node, self)  # direction always node (prereq) → self (postreq)
+        self.incoming_lines[line] = None
+        node.outgoing_lines[line] = None
+        self.main_window.edge_lines[node.node_id, self.node_id] = line
+
+    def unlink_prerequisite(self, node):
+        # Scene side of delete_prerequisite, called once the model dropped the edge
+        if node not in self.prerequisites:
+            return
+        del self.prerequisites[node]
+        node.postrequisites.pop(self, None)
+        self.invalidate_tooltip()
+        node.invalidate_tooltip()
+
+        line = self.main_window.edge_lines.pop((node.node_id, self.node_id), None)
+        if line:
+            self.incoming_lines.pop(line, None)
+            node.outgoing_lines.pop(line, None)
+            self.main_window.delete_connecting_line(line)
 
     def delete_connections(self, node):
         # Delete node as prereq and as postreq
@@ -151,13 +230,6 @@ class SkillNode(QGraphicsEllipseItem):
         self.delete_prerequisite(node)
         self.delete_postrequisite(node)
 
-
-    def get_prerequisite_names(self):
-        return [n.upgrade.name for n in self.prerequisites]
-
-    def get_postrequisite_names(self):
-        return [n.upgrade.name for n in self.postrequisites]
-
     def move_lines(self):
         # Call this when moving nodes tou update their position
         for line in self.outgoing_lines:
@@ -166,43 +238,44 @@ class SkillNode(QGraphicsEllipseItem):
             line.update_position()
 
     def setPos(self, x, y):
-        # Overrides setPos to also move attached lines
-        super().setPos(x, y)
+        # Overrides setPos to also move attached lines and keep the model record in sync
+        self.move_without_lines(x, y)
         self.move_lines()
 
+    def move_without_lines(self, x, y):
+        # For moving many nodes at once; the caller updates the attached lines afterwards
+        self.move_item(x, y)
+        if self.node_id in self.main_window.model:
+            self.main_window.model.move_node(self.node_id, x, y)
+
+    def move_item(self, x, y):
+        # Only moves the scene item. For callers that move the model records themselves in one
+        # model.move_nodes (dragging), and then the lines
+        super().setPos(x, y)
+        self.main_window.node_index.move(self, x, y)
+
     def prep_for_deletion(self):
         # Called by main window when this is to be deleted.
-        # Will resolve right before being deleted
+        # Will resolve right before being deleted. O(degree), every step is a dict lookup
         for prereq in self.prerequisites:
-            if self in prereq.postrequisites:
-                prereq.postrequisites.remove(self)
+            prereq.postrequisites.pop(self, None)
+            prereq.invalidate_tooltip()
         for postreq in self.postrequisites:
-            if self in postreq.prerequisites:
-                postreq.prerequisites.remove(self)
+            postreq.prerequisites.pop(self, None)
+            postreq.invalidate_tooltip()
 
+        edge_lines = self.main_window.edge_lines
         for line in self.incoming_lines:
+            line.start_node.outgoing_lines.pop(line, None)
+            edge_lines.pop((line.start_node.node_id, self.node_id), None)
             self.main_window.delete_connecting_line(line)
 
         for line in self.outgoing_lines:
+            line.end_node.incoming_lines.pop(line, None)
+            edge_lines.pop((self.node_id, line.end_node.node_id), None)
             self.main_window.delete_connecting_line(line)
 
-        self.incoming_lines.clear()
-        self.outgoing_lines.clear()
-        self.prerequisites.clear()
-        self.postrequisites.clear()
-
-        self.main_window.current_node_id -= 1
-
-    def change_id(self, new_id):
-        # changes the id of the current node to new_id and updates the reference of all pre and post-requisites to use the new id
-        old_id = self.node_id
-        self.node_id = new_id
-        for prereq in self.prerequisites:
-            for i, postreq in enumerate(prereq.postrequisites):
-                if postreq.node_id == old_id:
-                    prereq.postrequisites[i] = self
-        for postreq in self.postrequisites:
-            for i, prereq in enumerate(postreq.prerequisites):
-                if prereq.node_id == old_id:
-                    postreq.prerequisites[i] = self
-        print(f"Node ID changed from {old_id} to {new_id}")
\ No newline at end of file
+        self.incoming_lines = NO_LINKS
+        self.outgoing_lines = NO_LINKS
+        self.prerequisites = NO_LINKS
+        self.postrequisites = NO_LINKS
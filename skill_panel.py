@@ -62,10 +62,9 @@ class SkillPanel(QWidget):
 
     def save_changes(self):
         if self.current_node:
-            self.current_node.upgrade.name = self.name_input.text()
-            self.current_node.upgrade.description = self.desc_input.toPlainText()
             new_type = self.type_dropdown.currentText()
-            self.current_node.change_upgrade_type(new_type)
+            self.current_node.set_upgrade(self.name_input.text(), self.desc_input.toPlainText(), new_type)
+            self.current_node.main_window.auto_save_skill_tree()
             print(f"Saved Upgrade: {self.current_node.upgrade.name}, {self.current_node.upgrade.description}")
 
         self.hide_panel()
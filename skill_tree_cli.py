@@ -0,0 +1,229 @@
+# Headless batch tool for skill tree files. Uses the same loading and saving code as the editor
+# (SkillTreeModel.load / save_tree), but never imports PyQt5.
+#
+#   python skill_tree_cli.py validate trees/*.json
+#   python skill_tree_cli.py normalize trees/*.json --output-dir normalized [--renumber]
+#   python skill_tree_cli.py convert trees/*.json --to stb --output-dir binary
+#   python skill_tree_cli.py merge trees/*.json --output merged.json
+#
+# Files are processed on a process pool (--workers). Every file gets a line with its timing, and
+# --summary writes all results as JSON. Exit code is 1 if any file failed.
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import sys
+import time
+from binary_format import BINARY_EXTENSION, is_binary_file
+from skill_tree_model import SkillTreeModel, TreeSnapshot, iter_saved_nodes, renumbered_by_position, save_tree
+from upgrade import Upgrade
+
+MERGE_SPACING = 600  # horizontal gap between merged trees
+UPGRADE_TYPES = {value for key, value in vars(Upgrade.Upgrade_Type).items() if not key.startswith("_")}
+
+
+def check_saved_nodes(node_datas):
+    # Problems in raw saved node dicts that loading silently repairs or chokes on.
+    # Returns (errors, warnings, the node dicts)
+    errors, warnings, kept = [], [], []
+    seen = set()
+    prerequisite_pairs, postrequisite_pairs = set(), set()
+    for position, node_data in enumerate(node_datas):
+        node_id = node_data.get("node_id")
+        if not isinstance(node_id, int):
+            errors.append(f"node #{position} has no integer node_id")
+            continue
+        if node_id in seen:
+            errors.append(f"node {node_id} appears more than once")
+        seen.add(node_id)
+        missing = [key for key in ("x", "y", "upgrade") if key not in node_data]
+        if missing:
+            errors.append(f"node {node_id} is missing {', '.join(missing)}")
+            continue
+        if not {"name", "description"} <= node_data["upgrade"].keys():
+            errors.append(f"node {node_id} has an incomplete upgrade")
+            continue
+        if "upgrade_type" not in node_data["upgrade"]:
+            warnings.append(f"node {node_id} has no upgrade_type, loads as passive ability")
+        else:
+            upgrade_type = node_data["upgrade"]["upgrade_type"]
+            if upgrade_type is None:
+                warnings.append(f"node {node_id} has a null upgrade_type")
+            elif not isinstance(upgrade_type, str):
+                errors.append(f"node {node_id} has an upgrade_type that isn't a string: {upgrade_type!r}")
+                continue
+            elif upgrade_type not in UPGRADE_TYPES:
+                warnings.append(f"node {node_id} has an unknown upgrade_type {upgrade_type!r}")
+        for src_id in node_data.get("prerequisites", []):
+            prerequisite_pairs.add((src_id, node_id))
+        for dst_id in node_data.get("postrequisites", []):
+            postrequisite_pairs.add((node_id, dst_id))
+        kept.append(node_data)
+
+    for src_id, dst_id in prerequisite_pairs | postrequisite_pairs:
+        if src_id == dst_id:
+            warnings.append(f"node {src_id} requires itself, dropped on load")
+        elif src_id not in seen or dst_id not in seen:
+            warnings.append(f"connection {src_id} -> {dst_id} points to a missing node, dropped on load")
+        elif (src_id, dst_id) not in prerequisite_pairs or (src_id, dst_id) not in postrequisite_pairs:
+            warnings.append(f"connection {src_id} -> {dst_id} is only listed on one side")
+    return errors, warnings, kept
+
+
+def load_checked(filepath):
+    # Loads a tree the way the editor does. Returns (model, errors, warnings)
+    model = SkillTreeModel()
+    if is_binary_file(filepath):
+        model.load(filepath)
+        errors, warnings = [], []
+    else:
+        errors, warnings, node_datas = check_saved_nodes(iter_saved_nodes(filepath))
+        model.load_node_data(node_datas)
+    cycle_node_ids = model.cycle_node_ids()
+    if cycle_node_ids:
+        errors.append(f"{len(cycle_node_ids)} nodes are in or behind prerequisite cycles: {sorted(cycle_node_ids)[:20]}")
+    return model, errors, warnings
+
+
+def output_path(filepath, output_dir, extension=None):
+    name = os.path.basename(filepath)
+    if extension:
+        name = os.path.splitext(name)[0] + extension
+    return os.path.join(output_dir or os.path.dirname(filepath), name)
+
+
+def new_result(filepath):
+    return {"file": filepath, "ok": False, "errors": [], "warnings": []}
+
+
+def run_file(command, filepath, options):
+    # One file of validate / normalize / convert. Runs in a worker process, returns a JSON-able result
+    start = time.perf_counter()
+    result = new_result(filepath)
+    try:
+        model, errors, warnings = load_checked(filepath)
+        result.update(nodes=len(model), edges=model.edge_count(), errors=errors, warnings=warnings)
+        result["ok"] = not errors
+        if command != "validate" and result["ok"]:
+            extension = options.get("extension")
+            destination = output_path(filepath, options.get("output_dir"), extension)
+            tree = model
+            if options.get("renumber"):
+                tree = renumbered_by_position(model)[0]
+            save_tree(destination, tree)
+            result["output"] = destination
+    except Exception as e:
+        result["errors"].append(str(e) or type(e).__name__)
+        result["ok"] = False
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def load_snapshot(filepath):
+    # Worker side of merge. Returns (snapshot, result like run_file's), snapshot is None if the file failed
+    start = time.perf_counter()
+    result = new_result(filepath)
+    snapshot = None
+    try:
+        model, errors, warnings = load_checked(filepath)
+        result.update(nodes=len(model), edges=model.edge_count(), errors=errors, warnings=warnings)
+        result["ok"] = not errors
+        snapshot = model.snapshot()
+    except Exception as e:
+        result["errors"].append(str(e) or type(e).__name__)
+        result["ok"] = False
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return snapshot, result
+
+
+def merge_snapshots(snapshots, spacing=MERGE_SPACING):
+    # Puts the trees side by side in one model, ids renumbered sequentially in file order
+    nodes, prerequisites, postrequisites = {}, {}, {}
+    offset_x = 0
+    for snapshot in snapshots:
+        if not snapshot.nodes:
+            continue
+        min_x = min(record.x for record in snapshot.nodes.values())
+        max_x = max(record.x for record in snapshot.nodes.values())
+        shift = offset_x - min_x
+        remap = {old_id: len(nodes) + index for index, old_id in enumerate(snapshot.nodes)}
+        for old_id, record in snapshot.nodes.items():
+            nodes[remap[old_id]] = record._replace(x=record.x + shift)
+            prerequisites[remap[old_id]] = {remap[src_id]: None for src_id in snapshot.prerequisites[old_id]}
+            postrequisites[remap[old_id]] = {remap[dst_id]: None for dst_id in snapshot.postrequisites[old_id]}
+        offset_x = max_x + shift + spacing
+    return TreeSnapshot(nodes, prerequisites, postrequisites)
+
+
+def run_pool(function, args_list, workers):
+    if workers > 1 and len(args_list) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(function, *zip(*args_list)))
+    return [function(*args) for args in args_list]
+
+
+def print_result(result):
+    status = "ok" if result["ok"] else "FAILED"
+    size = f"{result['nodes']} nodes, {result['edges']} edges, " if "nodes" in result else ""
+    print(f"{status:6} {result['file']} ({size}{result['seconds'] * 1000:.0f} ms)")
+    for error in result["errors"]:
+        print(f"       error: {error}")
+    for warning in result["warnings"][:10]:
+        print(f"       warning: {warning}")
+    if len(result["warnings"]) > 10:
+        print(f"       ... {len(result['warnings']) - 10} more warnings")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate, normalize, convert and merge skill tree files")
+    parser.add_argument("command", choices=["validate", "normalize", "convert", "merge"])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--output-dir", help="where normalize / convert write (default: next to the input)")
+    parser.add_argument("--output", help="merged file (merge only)")
+    parser.add_argument("--to", choices=["json", "stb"], help="target format (convert only)")
+    parser.add_argument("--renumber", action="store_true", help="renumber ids by position (normalize / merge)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--summary", help="write all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert" and not args.to:
+        parser.error("convert needs --to")
+    if args.command == "merge" and not args.output:
+        parser.error("merge needs --output")
+    if args.command in ("normalize", "convert") and not args.output_dir:
+        if args.command == "normalize" or any(output_path(f, None, "." + args.to) == f for f in args.files):
+            parser.error(f"{args.command} needs --output-dir, inputs are never overwritten")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    summary = {"command": args.command}
+    if args.command == "merge":
+        loaded = run_pool(load_snapshot, [(filepath,) for filepath in args.files], args.workers)
+        results = [result for _, result in loaded]
+        if all(result["ok"] for result in results):
+            merged = merge_snapshots([snapshot for snapshot, _ in loaded])
+            if args.renumber:
+                merged = renumbered_by_position(merged)[0]
+            save_tree(args.output, merged)
+            summary["output"] = args.output
+            summary["merged_nodes"] = len(merged.nodes)
+    else:
+        options = {"output_dir": args.output_dir, "renumber": args.renumber,
+                   "extension": {"json": ".json", "stb": BINARY_EXTENSION}.get(args.to)}
+        results = run_pool(run_file, [(args.command, filepath, options) for filepath in args.files], args.workers)
+
+    for result in results:
+        print_result(result)
+    summary["files"] = results
+    summary["failed"] = sum(not result["ok"] for result in results)
+    summary["seconds"] = round(time.perf_counter() - start, 4)
+    print(f"{len(results) - summary['failed']}/{len(results)} files ok in {summary['seconds']:.2f} s")
+    if args.summary:
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=4)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+from collections import namedtuple
+from enum import Enum
+import json
+import os
+import re
+from upgrade import Upgrade
+from binary_format import BINARY_EXTENSION, NO_STRING, BinaryTree, is_binary_file, write_binary
+from topological_order import TopologicalOrder, CycleError
+
+
+class ModelEvent(Enum):
+    # Event args: NODE_ADDED (node_id), NODE_REMOVED (node_id, record), NODE_MOVED (node_id, old_x, old_y),
+    # UPGRADE_CHANGED (node_id, old_upgrade), EDGE_ADDED / EDGE_REMOVED (src_id, dst_id),
+    # RESET (), NODES_MOVED ([node_id], {node_id: (old_x, old_y)})
+    NODE_ADDED = 0
+    NODE_REMOVED = 1
+    NODE_MOVED = 2
+    UPGRADE_CHANGED = 3
+    EDGE_ADDED = 4
+    EDGE_REMOVED = 5
+    RESET = 7
+    NODES_MOVED = 8  # many nodes at once
+
+
+# Compact per-node record. Records are replaced (never mutated) whenever a node changes,
+# so anything holding on to an old record keeps a consistent view of it.
+NodeRecord = namedtuple("NodeRecord", ["x", "y", "upgrade"])
+
+# Frozen copy of a model taken with SkillTreeModel.snapshot(). Safe to read from another thread
+TreeSnapshot = namedtuple("TreeSnapshot", ["nodes", "prerequisites", "postrequisites"])
+
+SNAPSHOT_TOKEN_PATTERN = re.compile(r'"snapshot_token":\s*"([0-9a-f]+)"')
+
+
+def tree_to_dict(tree, snapshot_token=None):
+    # Same layout that has always been written to skill_tree.json. tree is a model or a TreeSnapshot.
+    # The token identifies the saved state for the change journal and is written first so it can be
+    # read back without parsing the whole file
+    save_data = {"snapshot_token": snapshot_token} if snapshot_token else {}
+    nodes = []
+    for node_id, record in tree.nodes.items():
+        node_data = {
+            "node_id": node_id,
+            "x": record.x,
+            "y": record.y,
+            "upgrade": {
+                "name": record.upgrade.name,
+                "description": record.upgrade.description,
+                "upgrade_type": record.upgrade.upgrade_type
+            },
+            "prerequisites": list(tree.prerequisites[node_id]),
+            "postrequisites": list(tree.postrequisites[node_id])
+        }
+        nodes.append(node_data)
+    save_data["nodes"] = nodes
+    return save_data
+
+
+def read_snapshot_token(filepath):
+    # Returns the snapshot_token of a saved tree, or None for files saved without one
+    with open(filepath, "r") as file:
+        match = SNAPSHOT_TOKEN_PATTERN.search(file.read(512))
+    return match.group(1) if match else None
+
+
+def write_json_atomic(filepath, data, indent=None):
+    # Writes to a temp file next to filepath and renames it over, so a crash never leaves a half written file
+    temp_path = filepath + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file, indent=indent)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, filepath)
+
+
+def save_tree(filepath, tree, snapshot_token=None):
+    # Writes a model or TreeSnapshot, binary if the path ends in .stb and json otherwise
+    if filepath.endswith(BINARY_EXTENSION):
+        write_binary(filepath, tree, snapshot_token)
+    else:
+        write_json_atomic(filepath, tree_to_dict(tree, snapshot_token), indent=4)
+
+
+def iter_saved_nodes(filepath, chunk_size=1 << 20):
+    # Streams the node dicts out of a skill_tree.json without loading the whole document.
+    # Reads chunk_size characters at a time and decodes one node object at a time
+    decoder = json.JSONDecoder()
+    with open(filepath, "r") as file:
+        buffer = ""
+        # Skip ahead to the opening bracket of the "nodes" list
+        while True:
+            key = buffer.find('"nodes"')
+            bracket = buffer.find("[", key) if key != -1 else -1
+            if bracket != -1:
+                buffer = buffer[bracket + 1:]
+                break
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"{filepath} has no nodes list")
+            buffer += chunk
+
+        position = 0
+        at_end = False
+        while True:
+            # Skip whitespace and separators between node objects
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                node_data, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if at_end:
+                    raise
+                chunk = file.read(chunk_size)  # object continues in the next chunk
+                at_end = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield node_data
+
+
+def renumbered_by_position(tree):
+    # Copy of a model or TreeSnapshot with sequential ids sorted by y then x (top to bottom, left to
+    # right), plus the {old_id: new_id} remap. One sort, then a single pass over the nodes and edges
+    nodes = tree.nodes
+    order = sorted(nodes, key=lambda node_id: (nodes[node_id].y, nodes[node_id].x))
+    remap = {old_id: new_id for new_id, old_id in enumerate(order)}
+    renumbered = TreeSnapshot(
+        {remap[old_id]: nodes[old_id] for old_id in order},
+        {remap[old_id]: {remap[src_id]: None for src_id in tree.prerequisites[old_id]} for old_id in order},
+        {remap[old_id]: {remap[dst_id]: None for dst_id in tree.postrequisites[old_id]} for old_id in order})
+    return renumbered, remap
+
+
+def fragment(tree, node_ids):
+    # Copy of some nodes of a model or TreeSnapshot with only the edges between them, as a TreeSnapshot
+    # (ids unchanged). What copy and duplicate work on, see SkillTreeModel.paste
+    members = {node_id: None for node_id in node_ids if node_id in tree.nodes}
+    return TreeSnapshot(
+        {node_id: tree.nodes[node_id] for node_id in members},
+        {node_id: {src_id: None for src_id in tree.prerequisites[node_id] if src_id in members} for node_id in members},
+        {node_id: {dst_id: None for dst_id in tree.postrequisites[node_id] if dst_id in members} for node_id in members})
+
+
+def tables_from_node_data(node_datas):
+    # Builds the node and adjacency tables from an iterable of saved node dicts in a single pass, so a
+    # streaming parser can feed it one node at a time. Both lists are stored in the file, so every edge
+    # shows up twice; edges are collected into one deduplicated list and added exactly once
+    nodes = {}
+    edges = {}  # (src_id, dst_id) -> None, insertion ordered
+    for node_data in node_datas:
+        node_id = node_data["node_id"]
+        upgrade_data = node_data["upgrade"]
+        upgrade = Upgrade(
+            upgrade_data["name"],
+            upgrade_data["description"],
+            upgrade_data.get("upgrade_type", Upgrade.Upgrade_Type.PASSIVE_ABILITY)  # Default if missing. needed for first load after changes
+        )
+        nodes[node_id] = NodeRecord(node_data["x"], node_data["y"], upgrade)
+        for prereq_id in node_data.get("prerequisites", []):
+            edges[prereq_id, node_id] = None
+        for postreq_id in node_data.get("postrequisites", []):
+            edges[node_id, postreq_id] = None
+
+    # Reconnect Relationships
+    prerequisites = {node_id: {} for node_id in nodes}
+    postrequisites = {node_id: {} for node_id in nodes}
+    for src_id, dst_id in edges:
+        if src_id != dst_id and src_id in nodes and dst_id in nodes:
+            prerequisites[dst_id][src_id] = None
+            postrequisites[src_id][dst_id] = None
+    return TreeSnapshot(nodes, prerequisites, postrequisites)
+
+
+def export_renumbered(filepath, tree):
+    # Saves a copy of tree renumbered by position. Ids of the tree itself don't change
+    save_tree(filepath, renumbered_by_position(tree)[0])
+
+
+def default_upgrade(node_id):
+    # Each node starts with an empty upgrade
+    return Upgrade(
+        name=f"Upgrade {node_id}",  # Default name based on node ID
+        description="Default Upgrade Description",
+        upgrade_type=Upgrade.Upgrade_Type.PASSIVE_ABILITY,
+    )
+
+
+class SkillTreeModel:
+    # Pure python representation of a skill tree. No Qt in here, so it can be used headless
+    # (pipelines, tests, benchmarks). The scene in MainWindow is just a view that listens to the
+    # events emitted here.
+    def __init__(self):
+        self.nodes = {}  # node_id -> NodeRecord
+        # Adjacency tables. Dicts are used as insertion ordered sets (node_id -> None)
+        self.prerequisites = {}
+        self.postrequisites = {}
+        self.next_id = 0  # id given to the next added node
+        self.listeners = []
+        # Copy-on-write bookkeeping. Once a snapshot shares the adjacency dicts, each one gets copied
+        # the first time it's edited again, so snapshots stay cheap and never see later edits
+        self.snapshot_taken = False
+        self.owned_prerequisites = set()
+        self.owned_postrequisites = set()
+        # Prerequisites can't form cycles. Checked incrementally on every add_edge
+        self.order = TopologicalOrder(self)
+
+    def add_listener(self, listener):
+        # listener(event, *args) gets called for every change to the model
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def emit(self, event, *args):
+        for listener in self.listeners:
+            listener(event, *args)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def node_ids(self):
+        return list(self.nodes)
+
+    def record(self, node_id):
+        return self.nodes[node_id]
+
+    def prerequisite_ids(self, node_id):
+        return list(self.prerequisites[node_id])
+
+    def postrequisite_ids(self, node_id):
+        return list(self.postrequisites[node_id])
+
+    def has_edge(self, src_id, dst_id):
+        # src is a prerequisite of dst
+        return dst_id in self.prerequisites and src_id in self.prerequisites[dst_id]
+
+    def edge_count(self):
+        return sum(len(prereqs) for prereqs in self.prerequisites.values())
+
+    def depth(self, node_id):
+        # Tier of the node: length of the longest chain of prerequisites leading to it
+        return self.order.depth[node_id]
+
+    def ordered_ids(self):
+        # Node ids in topological order (every prerequisite before its postrequisites)
+        return self.order.ordered_ids()
+
+    def cycle_node_ids(self):
+        # Nodes in or behind prerequisite cycles of a file saved before cycles were rejected
+        return set(self.order.cycle_node_ids)
+
+    def edges(self):
+        # Yields every (prerequisite_id, postrequisite_id) pair once
+        for dst_id, prereqs in self.prerequisites.items():
+            for src_id in prereqs:
+                yield src_id, dst_id
+
+    # ---- Mutations ----
+    def add_node(self, x, y, upgrade=None, node_id=None):
+        if node_id is None:
+            node_id = self.next_id
+        elif node_id in self.nodes:
+            raise ValueError(f"Node ID {node_id} already exists")
+        self.next_id = max(self.next_id, node_id + 1)
+        if upgrade is None:
+            upgrade = default_upgrade(node_id)
+        self.nodes[node_id] = NodeRecord(x, y, upgrade)
+        self.prerequisites[node_id] = {}
+        self.postrequisites[node_id] = {}
+        self.order.add_node(node_id)
+        self.emit(ModelEvent.NODE_ADDED, node_id)
+        return node_id
+
+    def remove_node(self, node_id):
+        if node_id not in self.nodes:
+            return False
+        for src_id in list(self.prerequisites[node_id]):
+            self.remove_edge(src_id, node_id)
+        for dst_id in list(self.postrequisites[node_id]):
+            self.remove_edge(node_id, dst_id)
+        record = self.nodes.pop(node_id)
+        del self.prerequisites[node_id]
+        del self.postrequisites[node_id]
+        self.order.remove_node(node_id)
+        self.emit(ModelEvent.NODE_REMOVED, node_id, record)
+        return True
+
+    def move_node(self, node_id, x, y):
+        record = self.nodes[node_id]
+        if record.x == x and record.y == y:
+            return
+        self.nodes[node_id] = record._replace(x=x, y=y)
+        self.emit(ModelEvent.NODE_MOVED, node_id, record.x, record.y)
+
+    def move_nodes(self, positions):
+        # Moves many nodes at once ({node_id: (x, y)}, unknown ids are skipped). Listeners get a single
+        # NODES_MOVED with the ids that actually moved. Returns that list
+        moved = []
+        old_positions = {}
+        for node_id, (x, y) in positions.items():
+            record = self.nodes.get(node_id)
+            if record is None or record.x == x and record.y == y:
+                continue
+            self.nodes[node_id] = record._replace(x=x, y=y)
+            moved.append(node_id)
+            old_positions[node_id] = (record.x, record.y)
+        if moved:
+            self.emit(ModelEvent.NODES_MOVED, moved, old_positions)
+        return moved
+
+    def set_upgrade(self, node_id, name, description, upgrade_type):
+        # Upgrades are swapped for a new object instead of edited in place (see NodeRecord)
+        record = self.nodes[node_id]
+        self.nodes[node_id] = record._replace(upgrade=Upgrade(name, description, upgrade_type))
+        self.emit(ModelEvent.UPGRADE_CHANGED, node_id, record.upgrade)
+
+    def add_edge(self, src_id, dst_id):
+        # Makes src a prerequisite of dst. Returns False if nothing changed.
+        # Raises CycleError (and changes nothing) if dst is already a prerequisite of src, directly or not
+        if src_id == dst_id or src_id not in self.nodes or dst_id not in self.nodes:
+            return False
+        if src_id in self.prerequisites[dst_id]:
+            return False
+        self.order.check_edge(src_id, dst_id)
+        self.writable_prerequisites(dst_id)[src_id] = None
+        self.writable_postrequisites(src_id)[dst_id] = None
+        self.order.update_depths(dst_id)
+        self.emit(ModelEvent.EDGE_ADDED, src_id, dst_id)
+        return True
+
+    def remove_edge(self, src_id, dst_id):
+        if dst_id not in self.prerequisites or src_id not in self.prerequisites[dst_id]:
+            return False
+        del self.writable_prerequisites(dst_id)[src_id]
+        del self.writable_postrequisites(src_id)[dst_id]
+        self.order.update_depths(dst_id)
+        self.emit(ModelEvent.EDGE_REMOVED, src_id, dst_id)
+        return True
+
+    def writable_prerequisites(self, node_id):
+        if self.snapshot_taken and node_id not in self.owned_prerequisites:
+            self.prerequisites[node_id] = dict(self.prerequisites[node_id])
+            self.owned_prerequisites.add(node_id)
+        return self.prerequisites[node_id]
+
+    def writable_postrequisites(self, node_id):
+        if self.snapshot_taken and node_id not in self.owned_postrequisites:
+            self.postrequisites[node_id] = dict(self.postrequisites[node_id])
+            self.owned_postrequisites.add(node_id)
+        return self.postrequisites[node_id]
+
+    def snapshot(self):
+        # Only copies the top level dicts, so this is cheap enough to call on the GUI thread for every save
+        self.snapshot_taken = True
+        self.owned_prerequisites = set()
+        self.owned_postrequisites = set()
+        return TreeSnapshot(dict(self.nodes), dict(self.prerequisites), dict(self.postrequisites))
+
+    def replace_tables(self, nodes, prerequisites, postrequisites):
+        # Swaps in freshly built tables, nothing is shared with a snapshot anymore
+        self.nodes = nodes
+        self.prerequisites = prerequisites
+        self.postrequisites = postrequisites
+        self.snapshot_taken = False
+        self.order.rebuild()
+
+    def clear(self):
+        self.replace_tables({}, {}, {})
+        self.next_id = 0
+        self.emit(ModelEvent.RESET)
+
+    def paste(self, tree_fragment, dx=0, dy=0):
+        # Adds a copy of a fragment (see fragment()) with fresh ids, moved by (dx, dy), including the
+        # edges between its nodes. Upgrades are copied. Nodes go in prerequisites first, so every
+        # add_edge appends to the topological order instead of reordering it. Returns {fragment_id: new_id}
+        nodes, prerequisites = tree_fragment.nodes, tree_fragment.prerequisites
+        missing = {node_id: sum(src_id in nodes for src_id in prerequisites[node_id]) for node_id in nodes}
+        ready = [node_id for node_id, count in missing.items() if not count]
+        order = []
+        while ready:
+            node_id = ready.pop()
+            order.append(node_id)
+            for dst_id in tree_fragment.postrequisites[node_id]:
+                if dst_id in missing:
+                    missing[dst_id] -= 1
+                    if not missing[dst_id]:
+                        ready.append(dst_id)
+        if len(order) < len(nodes):  # cycles copied from a file saved before they were rejected
+            placed = set(order)
+            order.extend(node_id for node_id in nodes if node_id not in placed)
+
+        remap = {}
+        for node_id in order:
+            record = nodes[node_id]
+            upgrade = Upgrade(record.upgrade.name, record.upgrade.description, record.upgrade.upgrade_type)
+            remap[node_id] = self.add_node(record.x + dx, record.y + dy, upgrade)
+        for node_id in order:
+            for src_id in prerequisites[node_id]:
+                if src_id in remap:
+                    try:
+                        self.add_edge(remap[src_id], remap[node_id])
+                    except CycleError:
+                        pass  # the copy of a cycle can't be closed either
+        return remap
+
+    # ---- Serialization ----
+    def to_dict(self):
+        return tree_to_dict(self)
+
+    def load_dict(self, save_data):
+        # Replaces the whole tree with the contents of save_data. Listeners only get a single RESET
+        self.load_node_data(save_data["nodes"])
+
+    def load_node_data(self, node_datas):
+        # Replaces the tree with saved node dicts, see tables_from_node_data
+        nodes, prerequisites, postrequisites = tables_from_node_data(node_datas)
+        self.replace_tables(nodes, prerequisites, postrequisites)
+        # Restore the last highest node_id to prevent ID duplication
+        self.next_id = max(nodes, default=-1) + 1
+        self.emit(ModelEvent.RESET)
+
+    def load_binary(self, filepath):
+        # Builds the tables straight from the memory-mapped arrays of a .stb file
+        with BinaryTree(filepath) as tree:
+            node_ids = tree.node_ids.tolist()
+            positions = tree.positions.tolist()
+            upgrade_strings = tree.upgrades.tolist()
+            edge_ends = tree.edge_ends.tolist()
+            edge_sources = tree.edge_sources.tolist()
+            strings = {index: tree.string(index) for index in range(tree.string_count)}
+            strings[NO_STRING] = None
+
+        nodes = {}
+        prerequisites = {}
+        postrequisites = {}
+        for index, node_id in enumerate(node_ids):
+            name, description, upgrade_type = upgrade_strings[3 * index:3 * index + 3]
+            upgrade = Upgrade(strings[name], strings[description], strings[upgrade_type])
+            nodes[node_id] = NodeRecord(positions[2 * index], positions[2 * index + 1], upgrade)
+            postrequisites[node_id] = {}
+        start = 0
+        for index, node_id in enumerate(node_ids):
+            end = edge_ends[index]
+            prereqs = prerequisites[node_id] = dict.fromkeys(node_ids[src] for src in edge_sources[start:end])
+            for src_id in prereqs:
+                postrequisites[src_id][node_id] = None
+            start = end
+
+        self.replace_tables(nodes, prerequisites, postrequisites)
+        self.next_id = max(nodes, default=-1) + 1
+        self.emit(ModelEvent.RESET)
+
+    def load(self, filepath):
+        # Accepts both skill_tree.json and the binary format
+        if is_binary_file(filepath):
+            self.load_binary(filepath)
+            return
+        self.load_node_data(iter_saved_nodes(filepath))
+
+    def save(self, filepath):
+        save_tree(filepath, self)
@@ -0,0 +1,82 @@
+class SpatialHashGrid:
+    # Node-only spatial index. Items are bucketed by the cell their center falls in, so point picking
+    # and rectangle selection only look at a handful of cells instead of every item in the scene.
+    # Items can be anything hashable (SkillNodes in the scene, node ids in the model).
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> {item: (x, y)}
+        self.item_cells = {}  # item -> (cell_x, cell_y)
+
+    def __len__(self):
+        return len(self.item_cells)
+
+    def __contains__(self, item):
+        return item in self.item_cells
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, item, x, y):
+        cell = self.cell_of(x, y)
+        self.item_cells[item] = cell
+        self.cells.setdefault(cell, {})[item] = (x, y)
+
+    def move(self, item, x, y):
+        old_cell = self.item_cells.get(item)
+        cell = self.cell_of(x, y)
+        if old_cell == cell:
+            self.cells[cell][item] = (x, y)
+            return
+        if old_cell is not None:
+            self.remove(item)
+        self.insert(item, x, y)
+
+    def remove(self, item):
+        cell = self.item_cells.pop(item, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[item]
+        if not bucket:
+            del self.cells[cell]
+
+    def clear(self):
+        self.cells = {}
+        self.item_cells = {}
+
+    def nearest(self, x, y, radius):
+        # The item closest to (x, y) within radius, or None
+        best, best_distance = None, radius * radius
+        left, top = self.cell_of(x - radius, y - radius)
+        right, bottom = self.cell_of(x + radius, y + radius)
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = self.cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for item, (ix, iy) in bucket.items():
+                    distance = (ix - x) ** 2 + (iy - y) ** 2
+                    if distance <= best_distance:
+                        best, best_distance = item, distance
+        return best
+
+    def query_rect(self, left, top, right, bottom):
+        # All items whose center lies inside the rectangle. Cells fully inside are taken whole,
+        # only the cells on the border need a per-item check
+        found = []
+        cell_left, cell_top = self.cell_of(left, top)
+        cell_right, cell_bottom = self.cell_of(right, bottom)
+        if (cell_right - cell_left + 1) * (cell_bottom - cell_top + 1) > len(self.cells):
+            cells = [cell for cell in self.cells
+                     if cell_left <= cell[0] <= cell_right and cell_top <= cell[1] <= cell_bottom]
+        else:
+            cells = [(cx, cy) for cx in range(cell_left, cell_right + 1) for cy in range(cell_top, cell_bottom + 1)]
+        for cx, cy in cells:
+            bucket = self.cells.get((cx, cy))
+            if not bucket:
+                continue
+            if cell_left < cx < cell_right and cell_top < cy < cell_bottom:
+                found.extend(bucket)
+            else:
+                found.extend(item for item, (x, y) in bucket.items() if left <= x <= right and top <= y <= bottom)
+        return found
@@ -0,0 +1,64 @@
+# Seeded generator of synthetic skill trees for benchmarks and tests. Same seed and parameters
+# always give the same tree.
+#     python synthetic_tree.py skill_tree/skill_tree.json --nodes 100000 --seed 1
+import argparse
+import random
+from skill_tree_model import NodeRecord, SkillTreeModel
+from upgrade import Upgrade
+
+UPGRADE_TYPES = [Upgrade.Upgrade_Type.WEAPON_UNLOCK, Upgrade.Upgrade_Type.CLASS_UNLOCK,
+                 Upgrade.Upgrade_Type.ACTIVE_ABILITY, Upgrade.Upgrade_Type.PASSIVE_ABILITY]
+WORDS = ["fire", "ice", "blade", "shield", "arcane", "swift", "heavy", "critical", "mana", "rage", "shadow", "holy"]
+
+
+def generate_tree(nodes, fan_in=1.5, hubs=10, hub_probability=0.1, locality=200, description_length=40,
+                  grid_size=60, row_width=300, seed=0):
+    # Returns a SkillTreeModel with `nodes` nodes laid out row by row on the grid.
+    #  - fan_in: mean number of prerequisites per node (geometric, so a few nodes have many)
+    #  - hubs / hub_probability: each prerequisite is one of the first `hubs` nodes with that
+    #    probability, which gives those a very large fan-out
+    #  - locality: other prerequisites are picked among the `locality` nodes created just before
+    #  - description_length: characters of upgrade description
+    # Prerequisites always come earlier in creation order, so the tree never has cycles
+    rng = random.Random(seed)
+    records = {}
+    prerequisites = {}
+    postrequisites = {}
+    for node_id in range(nodes):
+        description = " ".join(rng.choice(WORDS) for _ in range(description_length // 5 + 1))[:description_length]
+        upgrade = Upgrade(f"{rng.choice(WORDS).title()} {node_id}", description, rng.choice(UPGRADE_TYPES))
+        records[node_id] = NodeRecord((node_id % row_width) * grid_size, (node_id // row_width) * grid_size, upgrade)
+        prerequisites[node_id] = {}
+        postrequisites[node_id] = {}
+        if not node_id:
+            continue
+        count = 0
+        while count < node_id and rng.random() < fan_in / (fan_in + 1):  # geometric with mean fan_in
+            count += 1
+        for _ in range(count):
+            if rng.random() < hub_probability:
+                src_id = rng.randrange(min(hubs, node_id))
+            else:
+                src_id = rng.randrange(max(0, node_id - locality), node_id)
+            prerequisites[node_id][src_id] = None
+            postrequisites[src_id][node_id] = None
+
+    model = SkillTreeModel()
+    model.replace_tables(records, prerequisites, postrequisites)
+    model.next_id = nodes
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic skill tree (.json or .stb)")
+    parser.add_argument("output")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--fan-in", type=float, default=1.5)
+    parser.add_argument("--hubs", type=int, default=10)
+    parser.add_argument("--hub-probability", type=float, default=0.1)
+    parser.add_argument("--locality", type=int, default=200)
+    parser.add_argument("--description-length", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_tree(args.nodes, args.fan_in, args.hubs, args.hub_probability, args.locality,
+                  args.description_length, seed=args.seed).save(args.output)
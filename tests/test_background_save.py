@@ -0,0 +1,45 @@
+import threading
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+import background_save  # noqa: E402 (needs PyQt5)
+from background_save import BackgroundSaver  # noqa: E402
+from change_journal import ChangeJournal  # noqa: E402
+from skill_tree_model import SkillTreeModel  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def test_save_now_reports_the_dropped_queued_save(tmp_path, app, monkeypatch):
+    gate = threading.Event()
+    save_tree = background_save.save_tree
+
+    def gated_save(*args):
+        gate.wait(10)
+        save_tree(*args)
+    monkeypatch.setattr(background_save, "save_tree", gated_save)
+
+    model = SkillTreeModel()
+    journal = ChangeJournal(model, str(tmp_path / "tree.journal"), str(tmp_path / "tree_snapshot.json"), compact_every=3)
+    saver = BackgroundSaver()
+    saver.saved.connect(lambda filepath, token, seconds, error: journal.finish_full_save(token, not error))
+    save_file = str(tmp_path / "tree.json")
+    model.add_node(0, 0)
+    saver.save(save_file, *journal.begin_full_save())  # running, held by the gate
+    model.add_node(60, 0)
+    saver.save(save_file, *journal.begin_full_save())  # queued behind it
+    gate.set()
+    snapshot, token = journal.begin_full_save()
+    seconds, error = saver.save_now(save_file, snapshot, token)
+    journal.finish_full_save(token, not error)
+    saver.wait()
+    assert not journal.full_saves
+
+    for i in range(3):
+        model.add_node(0, 60 * (i + 1))
+    journal.flush()  # compacts, no full save is left to block it
+    assert journal.records_since_compaction == 0
+    journal.wait()
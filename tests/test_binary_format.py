@@ -0,0 +1,36 @@
+import json
+from binary_format import convert
+from skill_tree_model import SkillTreeModel
+from upgrade import Upgrade
+
+
+def saved(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def test_json_to_stb_to_json_is_lossless(tmp_path):
+    nodes = [
+        {"node_id": 0, "x": 0, "y": 0, "prerequisites": [], "postrequisites": [3],
+         "upgrade": {"name": "Hand edited", "description": "", "upgrade_type": None}},
+        {"node_id": 3, "x": 60, "y": -120, "prerequisites": [0], "postrequisites": [],
+         "upgrade": {"name": "Dash", "description": "Quick", "upgrade_type": Upgrade.Upgrade_Type.CLASS_UNLOCK}},
+    ]
+    source = tmp_path / "tree.json"
+    source.write_text(json.dumps({"nodes": nodes}))
+    convert(str(source), str(tmp_path / "tree.stb"))
+    convert(str(tmp_path / "tree.stb"), str(tmp_path / "back.json"))
+
+    back = saved(tmp_path / "back.json")["nodes"]
+    assert back == nodes
+    assert all(type(node["x"]) is int and type(node["y"]) is int for node in back)
+
+
+def test_fractional_positions_stay_floats(tmp_path):
+    model = SkillTreeModel()
+    model.add_node(0, 0)
+    model.add_node(12.5, -3.25)
+    model.save(str(tmp_path / "tree.stb"))
+    loaded = SkillTreeModel()
+    loaded.load(str(tmp_path / "tree.stb"))
+    assert [(record.x, record.y) for record in loaded.nodes.values()] == [(0.0, 0.0), (12.5, -3.25)]
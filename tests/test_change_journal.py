@@ -0,0 +1,76 @@
+import os
+import threading
+import pytest
+import change_journal
+from change_journal import ChangeJournal
+from skill_tree_model import SkillTreeModel, save_tree
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    # Holds every snapshot write of the compaction thread until the test opens the gate
+    gate = threading.Event()
+    write = change_journal.write_json_atomic
+
+    def gated_write(*args, **kwargs):
+        gate.wait(10)
+        write(*args, **kwargs)
+    monkeypatch.setattr(change_journal, "write_json_atomic", gated_write)
+    return gate
+
+
+def make_journal(tmp_path):
+    model = SkillTreeModel()
+    journal = ChangeJournal(model, str(tmp_path / "tree.journal"), str(tmp_path / "tree_snapshot.json"))
+    return model, journal
+
+
+def recovered(tmp_path, save_file):
+    model, journal = make_journal(tmp_path)
+    journal.recover(save_file)
+    journal.wait()
+    return model
+
+
+def test_compaction_queues_behind_a_running_one(tmp_path, gate):
+    model, journal = make_journal(tmp_path)
+    model.add_node(0, 0)
+    journal.compact()
+    model.add_node(60, 0)
+    journal.flush()
+    journal.compact()  # returns right away, the first compaction is still writing
+    assert journal.compaction_thread.is_alive()
+    model.add_node(120, 0)
+    journal.flush()
+    gate.set()
+    journal.wait()
+
+    assert not os.path.exists(journal.compacting_path)
+    assert sorted(recovered(tmp_path, str(tmp_path / "missing.json")).nodes) == [0, 1, 2]
+
+
+def test_full_save_during_a_compaction(tmp_path, gate):
+    save_file = str(tmp_path / "tree.json")
+    model, journal = make_journal(tmp_path)
+    model.add_node(0, 0)
+    journal.compact()
+    model.add_node(60, 0)
+    snapshot, token = journal.begin_full_save()  # doesn't wait for the compaction
+    save_tree(save_file, snapshot, token)
+    journal.finish_full_save(token, True)
+    gate.set()
+    journal.wait()
+
+    # The compaction's snapshot is older than the save, it must not win on the next start
+    assert not os.path.exists(journal.snapshot_path)
+    assert sorted(recovered(tmp_path, save_file).nodes) == [0, 1]
+
+
+def test_discard_during_a_compaction(tmp_path, gate):
+    model, journal = make_journal(tmp_path)
+    model.add_node(0, 0)
+    journal.compact()
+    journal.discard()
+    gate.set()
+    journal.wait()
+    assert not os.listdir(tmp_path)
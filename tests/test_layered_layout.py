@@ -0,0 +1,56 @@
+import pytest
+from layered_layout import layered_layout
+from skill_tree_model import SkillTreeModel
+from synthetic_tree import generate_tree
+
+GRID_SIZE = 60
+
+
+def star(model, x, y, children):
+    root = model.add_node(x, y)
+    for i in range(children):
+        model.add_edge(root, model.add_node(x + i * GRID_SIZE, y + GRID_SIZE))
+    return root
+
+
+def test_subtree_layout_near_the_scene_edge_stays_inside():
+    model = SkillTreeModel()
+    root = star(model, 120, 120, 20)
+    positions = layered_layout(model.snapshot(), GRID_SIZE, [root])
+    assert len(positions) == 21
+    assert min(x for x, _ in positions.values()) >= 0
+    assert min(y for _, y in positions.values()) >= 0
+    assert all(x % GRID_SIZE == 0 and y % GRID_SIZE == 0 for x, y in positions.values())
+
+
+def test_whole_tree_layout_stays_right_of_and_below_the_origin():
+    model = generate_tree(5000, seed=1)
+    positions = layered_layout(model.snapshot(), GRID_SIZE)
+    assert len(positions) == len(model)
+    assert min(x for x, _ in positions.values()) >= 0
+    assert min(y for _, y in positions.values()) >= 0
+
+
+def test_layout_grows_the_scene_rect(tmp_path, monkeypatch):
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    monkeypatch.chdir(tmp_path)  # MainWindow works on skill_tree/ in the working directory
+    (tmp_path / "skill_tree").mkdir()
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from main_window import MainWindow
+    window = MainWindow()
+    root = star(window.model, 120, 120, 400)  # wraps into rows, and is centered left of x = 0
+    last_id = root
+    for i in range(200):  # 200 layers of 2 grid cells run past the bottom of the 20000 x 20000 scene
+        node_id = window.model.add_node(120, 180 + i * GRID_SIZE)
+        window.model.add_edge(last_id, node_id)
+        last_id = node_id
+    positions = layered_layout(window.model.snapshot(), window.GRID_SIZE, [root])
+    window.on_layout_finished(positions, 0.0, "")
+    scene_rect = window.scene.sceneRect()
+    assert scene_rect.bottom() > 20000
+    for node_id, (x, y) in positions.items():
+        assert scene_rect.contains(x, y)
+        assert window.model.record(node_id)[:2] == (x, y)
+    window.journal.discard()
+    window.deleteLater()
+    app.processEvents()
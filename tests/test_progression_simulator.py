@@ -0,0 +1,34 @@
+import math
+import pytest
+from skill_tree_model import SkillTreeModel
+
+np = pytest.importorskip("numpy")
+import progression_simulator  # noqa: E402 (needs numpy)
+
+
+def diamond():
+    # 0 -> 1, 0 -> 2, 1 + 2 -> 3, 4 alone
+    model = SkillTreeModel()
+    node_ids = [model.add_node(i * 60, 0) for i in range(5)]
+    for src_id, dst_id in ((0, 1), (0, 2), (1, 3), (2, 3)):
+        model.add_edge(node_ids[src_id], node_ids[dst_id])
+    return model
+
+
+@pytest.mark.parametrize("points", [1, 2, 3, 10])
+def test_every_player_unlocks_one_node_per_point(points):
+    tree = progression_simulator.compile_tree(diamond(), "uniform", points)
+    result = progression_simulator.simulate(tree, points, players=3000, seed=1, chunk_size=700)
+    assert math.isclose(result.reach_probability.sum(), min(points, 5))
+    reach = dict(zip(result.node_ids.tolist(), result.reach_probability))
+    assert 3 not in reach or reach[3] <= min(reach[1], reach[2])  # needs both
+    if points >= 5:
+        assert all(probability == 1.0 for probability in reach.values())
+
+
+def test_chunking_doesnt_change_the_result():
+    tree = progression_simulator.compile_tree(diamond(), "rush", 3)
+    whole = progression_simulator.simulate(tree, 3, players=1000, seed=4, chunk_size=1000)
+    assert progression_simulator.chunk_players(tree, 3) >= 1000
+    again = progression_simulator.simulate(tree, 3, players=1000, seed=4)
+    assert np.array_equal(whole.reach_probability, again.reach_probability)
@@ -0,0 +1,86 @@
+import pytest
+from search_index import SearchIndex, tokenize
+from skill_tree_model import SkillTreeModel
+from undo_stack import UndoStack
+from upgrade import Upgrade
+
+ACTIVE = Upgrade.Upgrade_Type.ACTIVE_ABILITY
+PASSIVE = Upgrade.Upgrade_Type.PASSIVE_ABILITY
+
+
+@pytest.fixture
+def model():
+    model = SkillTreeModel()
+    for name, description, upgrade_type in [("Fireball", "Hurls a ball of fire", ACTIVE),
+                                            ("Fire Resistance", "Less fire damage taken", PASSIVE),
+                                            ("Firewall", "A wall of fire", ACTIVE),
+                                            ("Frost Nova", "Freezes nearby enemies", ACTIVE)]:
+        model.add_node(0, 0, Upgrade(name, description, upgrade_type))
+    return model
+
+
+@pytest.fixture
+def index(model):
+    index = SearchIndex(model)
+    index.search("fire")  # built now, kept up to date from here on by model events
+    return index
+
+
+def brute_force(model, query, upgrade_type=None):
+    # What search() without prefixes has to return
+    words = tokenize(query)
+    return sorted(node_id for node_id, record in model.nodes.items()
+                  if set(words) <= set(tokenize(f"{record.upgrade.name} {record.upgrade.description}"))
+                  and upgrade_type in (None, record.upgrade.upgrade_type))
+
+
+def test_token_queries_match_whole_words_and_all_of_them(index):
+    assert index.search("fire") == [0, 1, 2]
+    assert index.search("FIRE ball") == [0]
+    assert index.search("fir") == []
+    assert index.search("fire frost") == []
+    assert index.search("") == []
+
+
+def test_prefix_queries(index):
+    assert index.search("fir*") == [0, 1, 2]
+    assert index.search("fire*") == [0, 1, 2]
+    assert index.search("fr* nova") == [3]
+    assert index.search("wall of f", prefix_last=True) == [2]
+    assert index.search("wall of f") == []
+
+
+def test_type_filters(index):
+    assert index.search("fire", ACTIVE) == [0, 2]
+    assert index.search("", PASSIVE) == [1]
+    assert index.search("frost", PASSIVE) == []
+
+
+def test_rename_delete_and_undo_update_the_index(model, index):
+    stack = UndoStack(model)
+    model.set_upgrade(0, "Ice Lance", "A shard of ice", ACTIVE)
+    stack.end_command()
+    assert index.search("fire") == [1, 2]
+    assert index.search("ice") == [0]
+    assert index.search("hurls") == []
+    model.remove_node(2)
+    stack.end_command()
+    assert index.search("wall") == []
+    assert index.search("fire", ACTIVE) == []
+
+    assert stack.undo()
+    assert index.search("wall*", ACTIVE) == [2]
+    assert stack.undo()
+    assert index.search("fire") == [0, 1, 2]
+    assert index.search("ice*") == []
+    for query, upgrade_type in [("fire", None), ("a", None), ("of", ACTIVE), ("fire damage", PASSIVE)]:
+        assert index.search(query, upgrade_type) == brute_force(model, query, upgrade_type)
+
+
+def test_edits_before_the_first_search_are_picked_up(model):
+    index = SearchIndex(model)
+    model.add_node(0, 0, Upgrade("Fire Storm", "", ACTIVE))
+    model.remove_node(0)
+    assert index.search("fire") == [1, 2, 4]
+    model.load_node_data([])  # RESET
+    assert index.search("fire") == []
@@ -0,0 +1,48 @@
+import json
+import skill_tree_cli
+from upgrade import Upgrade
+
+
+def write_tree(path, upgrade_type=Upgrade.Upgrade_Type.PASSIVE_ABILITY):
+    node = {"node_id": 0, "x": 0, "y": 0, "prerequisites": [], "postrequisites": [],
+            "upgrade": {"name": "A", "description": "", "upgrade_type": upgrade_type}}
+    path.write_text(json.dumps({"nodes": [node]}))
+    return str(path)
+
+
+def run(argv, tmp_path):
+    summary_path = str(tmp_path / "summary.json")
+    code = skill_tree_cli.main(argv + ["--workers", "1", "--summary", summary_path])
+    with open(summary_path) as file:
+        return code, json.load(file)
+
+
+def test_validate_flags_null_and_unknown_upgrade_types(tmp_path):
+    files = [write_tree(tmp_path / "null.json", None), write_tree(tmp_path / "unknown.json", "Hat"),
+             write_tree(tmp_path / "number.json", 3)]
+    code, summary = run(["validate"] + files, tmp_path)
+    null, unknown, number = summary["files"]
+    assert null["ok"] and null["warnings"] == ["node 0 has a null upgrade_type"]
+    assert unknown["ok"] and unknown["warnings"] == ["node 0 has an unknown upgrade_type 'Hat'"]
+    assert not number["ok"]
+    assert code == 1
+
+
+def test_merge_reports_unreadable_files(tmp_path):
+    good = write_tree(tmp_path / "good.json")
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"nodes": [{"node_id": 0,')
+    output = tmp_path / "merged.json"
+    code, summary = run(["merge", good, str(bad), "--output", str(output)], tmp_path)
+    assert code == 1
+    assert [result["ok"] for result in summary["files"]] == [True, False]
+    assert summary["files"][1]["errors"]
+    assert not output.exists()
+
+
+def test_merge(tmp_path):
+    files = [write_tree(tmp_path / "a.json"), write_tree(tmp_path / "b.json")]
+    output = tmp_path / "merged.json"
+    code, summary = run(["merge"] + files + ["--output", str(output)], tmp_path)
+    assert code == 0 and summary["merged_nodes"] == 2
+    assert [node["x"] for node in json.loads(output.read_text())["nodes"]] == [0, skill_tree_cli.MERGE_SPACING]
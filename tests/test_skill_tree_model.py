@@ -0,0 +1,161 @@
+import pytest
+from skill_tree_model import SkillTreeModel, ModelEvent, CycleError
+from upgrade import Upgrade
+
+
+@pytest.fixture
+def model():
+    return SkillTreeModel()
+
+
+@pytest.fixture
+def events(model):
+    received = []
+    model.add_listener(lambda event, *args: received.append((event, args)))
+    return received
+
+
+def describe(tree):
+    # Upgrades compare by identity, so compare their values
+    return {node_id: (record.x, record.y, record.upgrade.name, record.upgrade.description, record.upgrade.upgrade_type)
+            for node_id, record in tree.nodes.items()}
+
+
+def chain(model, length):
+    # 0 -> 1 -> ... -> length - 1
+    node_ids = [model.add_node(i * 60, i * 60) for i in range(length)]
+    for src_id, dst_id in zip(node_ids, node_ids[1:]):
+        model.add_edge(src_id, dst_id)
+    return node_ids
+
+
+def test_add_node_gives_sequential_ids_and_a_default_upgrade(model, events):
+    assert [model.add_node(0, 0), model.add_node(10, 20)] == [0, 1]
+    record = model.record(1)
+    assert (record.x, record.y) == (10, 20)
+    assert record.upgrade.name == "Upgrade 1"
+    assert events == [(ModelEvent.NODE_ADDED, (0,)), (ModelEvent.NODE_ADDED, (1,))]
+
+
+def test_add_node_with_an_existing_id_is_rejected(model):
+    model.add_node(0, 0, node_id=5)
+    with pytest.raises(ValueError):
+        model.add_node(0, 0, node_id=5)
+    assert model.add_node(0, 0) == 6
+
+
+def test_connect_and_disconnect(model, events):
+    a, b = model.add_node(0, 0), model.add_node(0, 60)
+    events.clear()
+    assert model.add_edge(a, b)
+    assert not model.add_edge(a, b)  # already connected
+    assert not model.add_edge(a, a)
+    assert model.has_edge(a, b) and not model.has_edge(b, a)
+    assert model.prerequisite_ids(b) == [a]
+    assert model.postrequisite_ids(a) == [b]
+    assert model.remove_edge(a, b)
+    assert not model.remove_edge(a, b)
+    assert model.edge_count() == 0
+    assert events == [(ModelEvent.EDGE_ADDED, (a, b)), (ModelEvent.EDGE_REMOVED, (a, b))]
+
+
+def test_cycles_are_rejected_without_changes(model, events):
+    node_ids = chain(model, 4)
+    events.clear()
+    with pytest.raises(CycleError) as error:
+        model.add_edge(node_ids[3], node_ids[0])
+    assert error.value.path == node_ids
+    with pytest.raises(CycleError):
+        model.add_edge(node_ids[1], node_ids[0])
+    assert not model.has_edge(node_ids[3], node_ids[0])
+    assert model.edge_count() == 3
+    assert events == []
+
+
+def test_depth_and_topological_order_follow_the_edges(model):
+    node_ids = chain(model, 3)
+    extra = model.add_node(0, 0)
+    model.add_edge(extra, node_ids[0])
+    assert [model.depth(node_id) for node_id in node_ids] == [1, 2, 3]
+    order = model.ordered_ids()
+    for src_id, dst_id in model.edges():
+        assert order.index(src_id) < order.index(dst_id)
+
+
+def test_remove_node_cascades_to_its_edges(model, events):
+    a, b, c = chain(model, 3)
+    events.clear()
+    record = model.record(b)
+    assert model.remove_node(b)
+    assert not model.remove_node(b)
+    assert b not in model and len(model) == 2
+    assert model.edge_count() == 0
+    assert model.postrequisite_ids(a) == [] and model.prerequisite_ids(c) == []
+    # Edges go first, so listeners never see an edge to a node that's gone
+    assert events == [(ModelEvent.EDGE_REMOVED, (a, b)), (ModelEvent.EDGE_REMOVED, (b, c)),
+                      (ModelEvent.NODE_REMOVED, (b, record))]
+
+
+def test_moves_and_upgrades_emit_the_old_values(model, events):
+    a, b = model.add_node(0, 0), model.add_node(60, 0)
+    old_upgrade = model.record(a).upgrade
+    events.clear()
+    model.move_node(a, 0, 0)  # no change, no event
+    model.move_node(a, 120, 60)
+    assert model.move_nodes({a: (180, 60), b: (60, 0), 99: (0, 0)}) == [a]
+    model.set_upgrade(a, "Fireball", "Burns", Upgrade.Upgrade_Type.ACTIVE_ABILITY)
+    assert model.record(a).upgrade.name == "Fireball"
+    assert old_upgrade.name == "Upgrade 0"  # records and upgrades are replaced, never edited
+    assert events == [(ModelEvent.NODE_MOVED, (a, 0, 0)),
+                      (ModelEvent.NODES_MOVED, ([a], {a: (120, 60)})),
+                      (ModelEvent.UPGRADE_CHANGED, (a, old_upgrade))]
+
+
+def test_snapshots_never_see_later_edits(model):
+    a, b, c = chain(model, 3)
+    snapshot = model.snapshot()
+    model.remove_edge(a, b)
+    model.add_edge(a, c)
+    model.move_node(a, 500, 500)
+    d = model.add_node(0, 0)
+    assert list(snapshot.prerequisites[b]) == [a]
+    assert list(snapshot.postrequisites[a]) == [b]
+    assert list(snapshot.prerequisites[c]) == [b]
+    assert snapshot.nodes[a].x == 0
+    assert d not in snapshot.nodes
+    assert list(model.prerequisites[c]) == [b, a]
+
+
+def test_remove_listener(model, events):
+    listener = model.listeners[0]
+    model.remove_listener(listener)
+    model.add_node(0, 0)
+    assert events == []
+
+
+def test_clear_resets_ids(model, events):
+    chain(model, 3)
+    events.clear()
+    model.clear()
+    assert len(model) == 0
+    assert model.add_node(0, 0) == 0
+    assert events[0] == (ModelEvent.RESET, ())
+
+
+@pytest.mark.parametrize("filename", ["tree.json", "tree.stb"])
+def test_save_and_load_round_trip(model, tmp_path, filename):
+    a, b, c = chain(model, 3)
+    model.add_edge(a, c)
+    model.set_upgrade(b, "Dash", "Quick", Upgrade.Upgrade_Type.CLASS_UNLOCK)
+    path = str(tmp_path / filename)
+    model.save(path)
+
+    loaded = SkillTreeModel()
+    events = []
+    loaded.add_listener(lambda event, *args: events.append(event))
+    loaded.load(path)
+    assert events == [ModelEvent.RESET]
+    assert describe(loaded) == describe(model)
+    assert sorted(loaded.edges()) == sorted(model.edges())
+    assert loaded.add_node(0, 0) == c + 1  # ids continue after the highest saved one
+
@@ -0,0 +1,67 @@
+import random
+from spatial_index import SpatialHashGrid
+
+CELL_SIZE = 100
+
+
+def brute_force(points, left, top, right, bottom):
+    return sorted(item for item, (x, y) in points.items() if left <= x <= right and top <= y <= bottom)
+
+
+def test_rect_queries_across_cell_boundaries():
+    grid = SpatialHashGrid(CELL_SIZE)
+    points = {"a": (99, 99), "b": (100, 100), "c": (-1, -1), "d": (0, 0), "e": (250, -150), "f": (1000, 1000)}
+    for item, (x, y) in points.items():
+        grid.insert(item, x, y)
+    assert sorted(grid.query_rect(-1, -1, 100, 100)) == ["a", "b", "c", "d"]
+    assert sorted(grid.query_rect(0, 0, 99.5, 99.5)) == ["a", "d"]
+    assert sorted(grid.query_rect(-200, -200, 300, 0)) == ["c", "d", "e"]
+    assert grid.query_rect(300, 300, 900, 900) == []
+
+
+def test_rect_queries_match_a_scan():
+    # Small rects walk their cells, huge ones go through the occupied cells instead
+    rng = random.Random(11)
+    grid = SpatialHashGrid(CELL_SIZE)
+    points = {}
+    for item in range(500):
+        points[item] = (rng.uniform(-1000, 1000), rng.uniform(-1000, 1000))
+        grid.insert(item, *points[item])
+    for _ in range(200):
+        x1, x2 = sorted(rng.uniform(-1200, 1200) for _ in range(2))
+        y1, y2 = sorted(rng.uniform(-1200, 1200) for _ in range(2))
+        assert sorted(grid.query_rect(x1, y1, x2, y2)) == brute_force(points, x1, y1, x2, y2)
+    assert sorted(grid.query_rect(-1e6, -1e6, 1e6, 1e6)) == sorted(points)
+
+
+def test_nearest_picks_the_closest_within_the_radius():
+    grid = SpatialHashGrid(CELL_SIZE)
+    grid.insert("left", 95, 50)
+    grid.insert("right", 110, 50)  # next cell
+    assert grid.nearest(104, 50, 20) == "right"
+    assert grid.nearest(101, 50, 20) == "left"
+    assert grid.nearest(50, 50, 20) is None
+    assert grid.nearest(75, 50, 20) == "left"  # exactly on the radius
+    assert SpatialHashGrid(CELL_SIZE).nearest(0, 0, 20) is None
+
+
+def test_move_and_remove_update_the_cells():
+    grid = SpatialHashGrid(CELL_SIZE)
+    grid.insert("a", 10, 10)
+    grid.insert("b", 20, 20)
+    grid.move("a", 30, 30)  # same cell
+    assert grid.nearest(30, 30, 5) == "a"
+    grid.move("a", 510, 10)  # another cell
+    assert sorted(grid.query_rect(0, 0, 99, 99)) == ["b"]
+    assert grid.query_rect(500, 0, 599, 99) == ["a"]
+    grid.move("c", 0, 0)  # unknown items are inserted
+    assert "c" in grid and len(grid) == 3
+
+    grid.remove("b")
+    grid.remove("b")  # already gone
+    assert "b" not in grid
+    assert grid.query_rect(0, 0, 99, 99) == ["c"]
+    grid.remove("a")
+    assert (5, 0) not in grid.cells  # empty cells are dropped
+    grid.clear()
+    assert len(grid) == 0 and grid.query_rect(-1e6, -1e6, 1e6, 1e6) == []
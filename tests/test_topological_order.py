@@ -0,0 +1,91 @@
+import random
+import pytest
+from skill_tree_model import SkillTreeModel
+from topological_order import CycleError
+
+
+def check_order(model):
+    # Every edge agrees with the order and every depth is the longest chain of prerequisites
+    rank = {node_id: index for index, node_id in enumerate(model.ordered_ids())}
+    assert sorted(rank) == sorted(model.nodes)
+    for src_id, dst_id in model.edges():
+        assert rank[src_id] < rank[dst_id]
+    depth = {}
+    for node_id in model.ordered_ids():
+        depth[node_id] = max((depth[src_id] + 1 for src_id in model.prerequisites[node_id]), default=0)
+    assert {node_id: model.depth(node_id) for node_id in model.nodes} == depth
+
+
+def test_an_edge_against_the_order_reorders():
+    model = SkillTreeModel()
+    a, b, c, d = (model.add_node(0, 0) for _ in range(4))
+    model.add_edge(c, d)
+    assert model.ordered_ids() == [a, b, c, d]
+    model.add_edge(d, a)  # a has to move behind c -> d
+    model.add_edge(b, c)
+    order = model.ordered_ids()
+    assert order.index(b) < order.index(c) < order.index(d) < order.index(a)
+    assert [model.depth(node_id) for node_id in (b, c, d, a)] == [0, 1, 2, 3]
+    check_order(model)
+
+
+def test_a_cycle_is_rejected_with_its_path():
+    model = SkillTreeModel()
+    a, b, c, d = (model.add_node(0, 0) for _ in range(4))
+    model.add_edge(a, b)
+    model.add_edge(b, c)
+    model.add_edge(c, d)
+    order = model.ordered_ids()
+    with pytest.raises(CycleError) as error:
+        model.add_edge(d, b)
+    # b -> c -> d already exists, d -> b would close it
+    assert error.value.path == [b, c, d]
+    assert (error.value.src_id, error.value.dst_id) == (d, b)
+    assert "cycle" in str(error.value)
+    assert model.ordered_ids() == order
+    assert not model.has_edge(d, b)
+    check_order(model)
+
+
+def test_order_and_depths_stay_valid_after_edge_removal():
+    model = SkillTreeModel()
+    a, b, c, d = (model.add_node(0, 0) for _ in range(4))
+    for src_id, dst_id in ((a, b), (b, c), (c, d), (a, d)):
+        model.add_edge(src_id, dst_id)
+    assert model.depth(d) == 3
+    model.remove_edge(b, c)
+    assert model.depth(c) == 0 and model.depth(d) == 1
+    check_order(model)
+    model.add_edge(d, b)  # allowed now that b no longer leads to d
+    assert model.depth(b) == 2
+    check_order(model)
+
+
+def test_random_edits_keep_the_order_valid():
+    rng = random.Random(3)
+    model = SkillTreeModel()
+    node_ids = [model.add_node(0, 0) for _ in range(60)]
+    for step in range(600):
+        src_id, dst_id = rng.sample(node_ids, 2)
+        if model.has_edge(src_id, dst_id) and rng.random() < 0.5:
+            model.remove_edge(src_id, dst_id)
+        else:
+            try:
+                model.add_edge(src_id, dst_id)
+            except CycleError as error:
+                # The path is a real chain dst -> ... -> src
+                assert error.path[0] == dst_id and error.path[-1] == src_id
+                assert all(model.has_edge(x, y) for x, y in zip(error.path, error.path[1:]))
+        if step % 50 == 0:
+            check_order(model)
+    check_order(model)
+
+
+def test_cycles_of_old_files_are_ranked_last():
+    model = SkillTreeModel()
+    nodes = [{"node_id": node_id, "x": 0, "y": 0, "upgrade": {"name": "", "description": ""},
+              "prerequisites": prereqs, "postrequisites": []}
+             for node_id, prereqs in ((0, []), (1, [2]), (2, [1]), (3, [0, 2]))]
+    model.load_node_data(nodes)
+    assert model.cycle_node_ids() == {1, 2, 3}
+    assert model.ordered_ids()[0] == 0
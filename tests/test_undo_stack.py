@@ -0,0 +1,88 @@
+import pytest
+from skill_tree_model import SkillTreeModel, fragment
+from undo_stack import RECORD_BYTES, UndoStack
+
+
+@pytest.fixture
+def model():
+    return SkillTreeModel()
+
+
+def state(model):
+    return ({node_id: (record.x, record.y, record.upgrade.name) for node_id, record in model.nodes.items()},
+            sorted(model.edges()))
+
+
+def star(model):
+    # center 1 with a prerequisite and two postrequisites
+    node_ids = [model.add_node(i * 60, 0) for i in range(4)]
+    model.add_edge(node_ids[0], node_ids[1])
+    model.add_edge(node_ids[1], node_ids[2])
+    model.add_edge(node_ids[1], node_ids[3])
+    return node_ids
+
+
+def test_undo_and_redo_of_a_node_delete_restores_its_edges(model):
+    star(model)
+    stack = UndoStack(model)
+    stack.end_command()  # building the tree is one command
+    before = state(model)
+    model.remove_node(1)
+    after = state(model)
+    assert stack.can_undo() and not stack.can_redo()
+
+    assert stack.undo()
+    assert state(model) == before
+    assert model.prerequisite_ids(1) == [0] and model.postrequisite_ids(1) == [2, 3]
+    assert stack.can_redo()
+    assert stack.redo()
+    assert state(model) == after
+    assert stack.undo()
+    assert state(model) == before
+
+
+def test_undo_of_paste(model):
+    star(model)
+    stack = UndoStack(model)
+    stack.end_command()
+    before = state(model)
+    remap = model.paste(fragment(model, [0, 1, 2]), 0, 120)
+    stack.end_command()
+    assert len(model) == 7 and model.has_edge(remap[0], remap[1])
+
+    assert stack.undo()
+    assert state(model) == before
+    assert stack.redo()
+    assert sorted(model.nodes) == [0, 1, 2, 3] + sorted(remap.values())
+    assert model.has_edge(remap[0], remap[1]) and model.has_edge(remap[1], remap[2])
+
+
+def test_moves_inside_a_command_undo_to_the_first_position(model):
+    node_id = model.add_node(0, 0)
+    stack = UndoStack(model)
+    stack.end_command()
+    for x in range(10, 100, 10):
+        model.move_node(node_id, x, 0)
+    model.move_nodes({node_id: (500, 500)})
+    assert stack.undo()
+    assert (model.record(node_id).x, model.record(node_id).y) == (0, 0)
+    assert not stack.undo()  # the add happened before the stack existed
+
+
+def test_oldest_commands_are_dropped_over_the_budget(model):
+    stack = UndoStack(model, budget_bytes=3 * RECORD_BYTES)
+    for i in range(5):
+        model.add_node(i * 60, 0)
+        stack.end_command()
+    assert len(stack.undo_commands) == 3
+    assert stack.size == 3 * RECORD_BYTES
+    while stack.undo():
+        pass
+    assert sorted(model.nodes) == [0, 1]  # the first two adds can't be undone anymore
+
+    # A command bigger than the whole budget is still kept
+    model.paste(fragment(model, [0, 1]), 0, 60)
+    stack.end_command()
+    assert len(stack.undo_commands) == 1 and not stack.can_redo()
+    assert stack.undo()
+    assert sorted(model.nodes) == [0, 1]
@@ -10,6 +10,7 @@ class Tooltip(QGraphicsTextItem):
         self.scene = scene
         self.setDefaultTextColor(Qt.white)
         self.setFont(QFont("Arial", 10, QFont.Bold))
+        self.current_text = None  # text currently laid out
 
         self.bg_rect = QGraphicsRectItem()
         self.bg_rect.setBrush(QBrush(QColor(0, 0, 0, 200)))  # Semi-transparent black
@@ -23,14 +24,16 @@ class Tooltip(QGraphicsTextItem):
         self.bg_rect.setVisible(False)
 
     def update_tooltip(self, text, position):
-        self.setPlainText(text)
         self.setVisible(True)
         self.bg_rect.setVisible(True)
 
-        # Adjust background size dynamically
-        text_rect = self.boundingRect()
-        padding = 10  # Space around text
-        self.bg_rect.setRect(QRectF(0, 0, text_rect.width() + padding * 2, text_rect.height() + padding * 2))
+        # Re-layout the text and resize the background only if the text changed
+        if text != self.current_text:
+            self.current_text = text
+            self.setPlainText(text)
+            text_rect = self.boundingRect()
+            padding = 10  # Space around text
+            self.bg_rect.setRect(QRectF(0, 0, text_rect.width() + padding * 2, text_rect.height() + padding * 2))
 
         # Make Background stays behind text
         self.bg_rect.setPos(position.x() + 10, position.y() + 10)
@@ -0,0 +1,130 @@
+import heapq
+
+
+class CycleError(ValueError):
+    # Raised when a connection would make a node (indirectly) its own prerequisite.
+    # path is the chain of node ids dst -> ... -> src, following existing postrequisite links,
+    # that the new src -> dst connection would have closed into a loop
+    def __init__(self, src_id, dst_id, path):
+        loop = " -> ".join(str(node_id) for node_id in path + [path[0]])
+        super().__init__(f"Making {src_id} a prerequisite of {dst_id} would create a cycle: {loop}")
+        self.src_id = src_id
+        self.dst_id = dst_id
+        self.path = path
+
+
+class TopologicalOrder:
+    # Keeps every node of a SkillTreeModel ranked so prerequisites always rank lower than their
+    # postrequisites (Pearce-Kelly dynamic topological order). An edge that already agrees with the
+    # ranks costs O(1); otherwise only the nodes ranked between its two ends are searched and
+    # re-ranked, which is also where a cycle would have to be. Nothing is ever rechecked from scratch.
+    # The depth (tier) of every node, the longest chain of prerequisites above it, is kept up to
+    # date the same way.
+    def __init__(self, graph):
+        self.graph = graph  # anything with prerequisites / postrequisites tables (the model)
+        self.rank = {}  # node_id -> int, unique
+        self.depth = {}  # node_id -> tier, 0 for nodes without prerequisites
+        self.next_rank = 0
+        self.cycle_node_ids = set()  # nodes in or behind cycles found by rebuild() (old save files)
+
+    def add_node(self, node_id):
+        self.rank[node_id] = self.next_rank
+        self.next_rank += 1
+        self.depth[node_id] = 0
+
+    def remove_node(self, node_id):
+        # The node's edges have to be removed first
+        del self.rank[node_id]
+        del self.depth[node_id]
+        self.cycle_node_ids.discard(node_id)
+
+    def check_edge(self, src_id, dst_id):
+        # Re-ranks so src comes before dst. Raises CycleError, without changing anything, if dst
+        # already leads to src
+        rank = self.rank
+        lower, upper = rank[dst_id], rank[src_id]
+        if upper < lower:
+            return
+        # Forward from dst, only through nodes ranked below src
+        postrequisites = self.graph.postrequisites
+        parents = {dst_id: None}
+        stack = [dst_id]
+        while stack:
+            node_id = stack.pop()
+            for next_id in postrequisites[node_id]:
+                if next_id == src_id:
+                    path = [node_id]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    path.reverse()
+                    raise CycleError(src_id, dst_id, path + [src_id])
+                if next_id not in parents and rank[next_id] < upper:
+                    parents[next_id] = node_id
+                    stack.append(next_id)
+        # Backward from src, only through nodes ranked above dst
+        prerequisites = self.graph.prerequisites
+        backward = {src_id}
+        stack = [src_id]
+        while stack:
+            for prev_id in prerequisites[stack.pop()]:
+                if prev_id not in backward and rank[prev_id] > lower:
+                    backward.add(prev_id)
+                    stack.append(prev_id)
+        # Hand the same ranks back out, everything that leads to src first
+        moved = sorted(backward, key=rank.__getitem__) + sorted(parents, key=rank.__getitem__)
+        for node_id, value in zip(moved, sorted(rank[node_id] for node_id in moved)):
+            rank[node_id] = value
+
+    def update_depths(self, node_id):
+        # Recomputes the depth of node_id after one of its prerequisites changed and passes any
+        # change on, in rank order so every node is only settled once
+        rank, depth = self.rank, self.depth
+        prerequisites, postrequisites = self.graph.prerequisites, self.graph.postrequisites
+        queue = [(rank[node_id], node_id)]
+        queued = {node_id}
+        while queue:
+            node_rank, node_id = heapq.heappop(queue)
+            queued.discard(node_id)
+            # Edges against the ranks only exist inside cycles of old files, they don't count
+            new_depth = max((depth[prev_id] + 1 for prev_id in prerequisites[node_id] if rank[prev_id] < node_rank),
+                            default=0)
+            if new_depth == depth[node_id]:
+                continue
+            depth[node_id] = new_depth
+            for next_id in postrequisites[node_id]:
+                if next_id not in queued and rank[next_id] > node_rank:
+                    queued.add(next_id)
+                    heapq.heappush(queue, (rank[next_id], next_id))
+
+    def rebuild(self):
+        # Ranks and depths from scratch (Kahn's algorithm), O(nodes + edges). Used when the whole
+        # tree is replaced. Files written before cycles were rejected may contain some; the nodes
+        # that can't be ordered are ranked last in table order and listed in cycle_node_ids
+        prerequisites, postrequisites = self.graph.prerequisites, self.graph.postrequisites
+        missing = {node_id: len(prereqs) for node_id, prereqs in prerequisites.items()}
+        ordered = [node_id for node_id, count in missing.items() if not count]
+        depth = dict.fromkeys(prerequisites, 0)
+        for node_id in ordered:  # grows while iterating
+            next_depth = depth[node_id] + 1
+            for next_id in postrequisites[node_id]:
+                if depth[next_id] < next_depth:
+                    depth[next_id] = next_depth
+                count = missing[next_id] = missing[next_id] - 1
+                if not count:
+                    ordered.append(next_id)
+
+        self.cycle_node_ids = set()
+        if len(ordered) < len(prerequisites):
+            placed = set(ordered)
+            self.cycle_node_ids = {node_id for node_id in prerequisites if node_id not in placed}
+            ordered.extend(node_id for node_id in prerequisites if node_id not in placed)
+        self.rank = {node_id: index for index, node_id in enumerate(ordered)}
+        self.next_rank = len(ordered)
+        for node_id in ordered[len(ordered) - len(self.cycle_node_ids):]:
+            depth[node_id] = max((depth[prev_id] + 1 for prev_id in prerequisites[node_id]
+                                  if self.rank[prev_id] < self.rank[node_id]), default=0)
+        self.depth = depth
+
+    def ordered_ids(self):
+        # Node ids with every prerequisite before its postrequisites
+        return sorted(self.rank, key=self.rank.__getitem__)
@@ -0,0 +1,157 @@
+from collections import deque
+from skill_tree_model import ModelEvent
+
+RECORD_BYTES = 120  # rough memory of one record tuple, its ints and its slot in the list
+UNDO_BUDGET_BYTES = 32 * 1024 * 1024
+
+
+class UndoStack:
+    # Undo/redo for a SkillTreeModel built from its events. Every event is stored as a small record
+    # of how to revert it (a moved node's old position, a deleted node's record, an edge), so undoing
+    # costs as much as the edit did, whatever the size of the tree.
+    # Records collect into one command until end_command(), which MainWindow calls with every
+    # autosave, i.e. once per user action. Moves of the same node inside a command only keep the first
+    # old position, so a whole drag is one small command. Undoing records the events it causes the
+    # same way, which gives the redo command. The oldest commands are dropped once the stored
+    # records outgrow budget_bytes (the newest command is always kept).
+    def __init__(self, model, budget_bytes=UNDO_BUDGET_BYTES):
+        self.model = model
+        self.budget_bytes = budget_bytes
+        self.undo_commands = deque()  # (records, size), oldest first
+        self.redo_commands = []  # (records, size), next redo last
+        self.records = []  # command being recorded
+        self.record_moves = {}  # node_id -> True once the command has its old position
+        self.size = 0  # estimated bytes of all stored commands
+        self.model.add_listener(self.on_model_event)
+
+    def on_model_event(self, event, *args):
+        if event == ModelEvent.NODE_ADDED:
+            self.records.append(("add_node", args[0]))
+        elif event == ModelEvent.NODE_REMOVED:
+            self.records.append(("remove_node", args[0], args[1]))  # edges were removed (and recorded) before
+        elif event == ModelEvent.NODE_MOVED:
+            self.record_move(args[0], args[1], args[2])
+        elif event == ModelEvent.NODES_MOVED:
+            old_positions = args[1]
+            for node_id in args[0]:
+                self.record_move(node_id, *old_positions[node_id])
+        elif event == ModelEvent.UPGRADE_CHANGED:
+            self.records.append(("upgrade", args[0], args[1]))
+        elif event == ModelEvent.EDGE_ADDED:
+            self.records.append(("add_edge", args[0], args[1]))
+        elif event == ModelEvent.EDGE_REMOVED:
+            self.records.append(("remove_edge", args[0], args[1]))
+        elif event == ModelEvent.RESET:
+            self.clear()  # every stored id is stale
+
+    def record_move(self, node_id, old_x, old_y):
+        if node_id not in self.record_moves:
+            self.record_moves[node_id] = True
+            self.records.append(("move", node_id, old_x, old_y))
+
+    def take_command(self):
+        records = self.records
+        size = sum(record_size(record) for record in records)
+        self.records = []
+        self.record_moves = {}
+        return records, size
+
+    def end_command(self):
+        # Closes the command being recorded. A new edit makes the redo stack meaningless
+        if not self.records:
+            return
+        self.push_undo(self.take_command())
+        for _, size in self.redo_commands:
+            self.size -= size
+        self.redo_commands.clear()
+
+    def push_undo(self, command):
+        self.undo_commands.append(command)
+        self.size += command[1]
+        while self.size > self.budget_bytes and len(self.undo_commands) > 1:
+            self.size -= self.undo_commands.popleft()[1]
+
+    def can_undo(self):
+        return bool(self.undo_commands or self.records)
+
+    def can_redo(self):
+        return bool(self.redo_commands)
+
+    def undo(self):
+        # Reverts the last command. Returns False if there was nothing to undo
+        self.end_command()
+        if not self.undo_commands:
+            return False
+        records, size = self.undo_commands.pop()
+        self.size -= size
+        self.revert(records)
+        command = self.take_command()
+        self.redo_commands.append(command)
+        self.size += command[1]
+        return True
+
+    def redo(self):
+        # Re-applies the last undone command. Returns False if there was nothing to redo
+        self.end_command()
+        if not self.redo_commands:
+            return False
+        records, size = self.redo_commands.pop()
+        self.size -= size
+        self.revert(records)
+        self.push_undo(self.take_command())
+        return True
+
+    def revert(self, records):
+        # Applies the inverse of every record, newest first. Consecutive moves go to the model as one
+        # batch (a single NODES_MOVED, e.g. when undoing an auto layout). Consecutive removed edges are
+        # added back oldest first, so a deleted node gets its prerequisites and postrequisites back in order
+        model = self.model
+        moves = {}
+        removed_edges = []
+        for record in reversed(records):
+            op = record[0]
+            if op == "move":
+                moves[record[1]] = (record[2], record[3])
+                continue
+            if moves:
+                model.move_nodes(moves)
+                moves = {}
+            if op == "remove_edge":
+                removed_edges.append(record)
+                continue
+            self.add_edges_back(removed_edges)
+            if op == "add_node":
+                model.remove_node(record[1])
+            elif op == "remove_node":
+                node_record = record[2]
+                model.add_node(node_record.x, node_record.y, node_record.upgrade, node_id=record[1])
+            elif op == "upgrade":
+                upgrade = record[2]
+                model.set_upgrade(record[1], upgrade.name, upgrade.description, upgrade.upgrade_type)
+            elif op == "add_edge":
+                model.remove_edge(record[1], record[2])
+        self.add_edges_back(removed_edges)
+        if moves:
+            model.move_nodes(moves)
+
+    def add_edges_back(self, removed_edges):
+        # removed_edges: remove_edge records collected newest first, emptied
+        for record in reversed(removed_edges):
+            self.model.add_edge(record[1], record[2])
+        removed_edges.clear()
+
+    def clear(self):
+        self.undo_commands.clear()
+        self.redo_commands.clear()
+        self.records = []
+        self.record_moves = {}
+        self.size = 0
+
+
+def record_size(record):
+    if record[0] == "remove_node":
+        upgrade = record[2].upgrade
+        return RECORD_BYTES + len(upgrade.name) + len(upgrade.description)
+    if record[0] == "upgrade":
+        return RECORD_BYTES + len(record[2].name) + len(record[2].description)
+    return RECORD_BYTES
@@ -1,5 +1,11 @@
+import sys
+
+
 class Upgrade:
-    # Base upgrade that can contain various upgrade types
+    # Base upgrade that can contain various upgrade types.
+    # Slotted, there is one per node. Type strings are interned so every node of a type shares one
+    __slots__ = ("name", "description", "upgrade_type")
+
     class Upgrade_Type:
         WEAPON_UNLOCK = "Weapon Unlock"
         CLASS_UNLOCK = "Class Unlock"
@@ -8,7 +14,8 @@ class Upgrade:
     def __init__(self, name, description, upgrade_type):
         self.name = name
         self.description = description
-        self.upgrade_type = upgrade_type
+        # Anything else (None from hand-edited files, ...) is kept as is, like before interning
+        self.upgrade_type = sys.intern(upgrade_type) if type(upgrade_type) is str else upgrade_type
 
     def set_description(self, new_description):
         self.description = new_description